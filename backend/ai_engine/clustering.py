@@ -1,15 +1,21 @@
-from sklearn.cluster import KMeans
-from sklearn.feature_extraction.text import TfidfVectorizer
 import numpy as np
-from typing import List, Dict
+from typing import List, Dict, Optional, Sequence
+from config.settings import settings
 from middleware.logger import logger
 
-# Using simple K-Means + TF-IDF for MVP stability instead of heavy BERTopic
-# BERTopic handles dependencies and UMAP/HDBSCAN which can be tricky in some envs
+# MiniBatchKMeans over sentence embeddings (TF-IDF when no embeddings are
+# available), keywords from class-based TF-IDF as popularised by BERTopic,
+# without pulling in BERTopic's UMAP/HDBSCAN dependencies. sklearn/scipy are
+# imported on first use so the API process starts without them
 
-def cluster_posts(texts: List[str], n_clusters: int = 5) -> Dict[int, Dict]:
+def cluster_posts(texts: List[str], n_clusters: Optional[int] = None,
+                  sample_weight: Optional[Sequence[float]] = None,
+                  embeddings: Optional[np.ndarray] = None) -> Dict[int, Dict]:
     """
-    Cluster texts into n_clusters.
+    Cluster texts into n_clusters (picked automatically when None).
+    `embeddings` (one row per text) are reused when the caller already has
+    them; otherwise texts are vectorized with TF-IDF.
+    sample_weight lets deduplicated texts count as often as they occurred.
     Returns: {
         cluster_id: {
             'keywords': ['word1', 'word2'],
@@ -20,41 +26,117 @@ def cluster_posts(texts: List[str], n_clusters: int = 5) -> Dict[int, Dict]:
     try:
         if not texts:
             return {}
-            
-        # 1. Vectorize
-        vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
-        X = vectorizer.fit_transform(texts)
-        
+
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.preprocessing import normalize
+
+        weights = np.ones(len(texts)) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+
+        # 1. Vectorize (unit length, so euclidean k-means ranks like cosine)
+        if embeddings is not None and len(embeddings) == len(texts):
+            X = normalize(np.asarray(embeddings, dtype=np.float32))
+        else:
+            X = TfidfVectorizer(max_features=1000, stop_words='english').fit_transform(texts)
+
         # 2. Cluster
-        kmeans = KMeans(n_clusters=min(n_clusters, len(texts)), random_state=42)
-        kmeans.fit(X)
+        if n_clusters is None:
+            n_clusters = choose_k(X, weights)
+        n_clusters = max(1, min(n_clusters, len(texts)))
+        kmeans = MiniBatchKMeans(
+            n_clusters=n_clusters,
+            batch_size=settings.CLUSTER_BATCH_SIZE,
+            n_init=3,
+            random_state=42,
+        )
+        kmeans.fit(X, sample_weight=weights)
         labels = kmeans.labels_
-        
+
         # 3. Extract keywords per cluster
-        # Get centroids -> inverse transform to find top words?
-        # Simpler: For each cluster, get top TF-IDF terms
-        feature_names = vectorizer.get_feature_names_out()
-        
+        keywords = ctfidf_keywords(texts, labels, n_clusters, weights)
+
         clusters = {}
-        for i in range(n_clusters):
-            indices = np.where(labels == i)[0].tolist()
-            if not indices:
-                continue
-                
-            # Get centroid for this cluster
-            centroid = kmeans.cluster_centers_[i]
-            # Top 5 words
-            top_indices = centroid.argsort()[-5:][::-1]
-            keywords = [feature_names[ind] for ind in top_indices]
-            
+        for i in np.unique(labels).tolist():
+            indices = np.flatnonzero(labels == i).tolist()
             clusters[i] = {
-                "keywords": keywords,
+                "keywords": keywords.get(i, []),
                 "indices": indices,
                 "count": len(indices)
             }
-            
+
         return clusters
 
     except Exception as e:
         logger.error(f"Clustering failed: {e}")
         return {}
+
+def choose_k(X, weights: np.ndarray, k_min: Optional[int] = None, k_max: Optional[int] = None) -> int:
+    """
+    Pick k by silhouette score on a weighted random sample, so the search
+    costs the same for ten thousand or ten million posts.
+    """
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.metrics import silhouette_score
+
+    k_min = k_min or settings.CLUSTER_MIN_K
+    k_max = k_max or settings.CLUSTER_MAX_K
+    n = X.shape[0]
+    rng = np.random.default_rng(42)
+    sample_size = min(n, settings.CLUSTER_SAMPLE_SIZE)
+    sample = rng.choice(n, size=sample_size, replace=False, p=weights / weights.sum()) if sample_size < n else np.arange(n)
+    X_sample = X[sample]
+
+    k_max = min(k_max, sample_size - 1)
+    if k_max < max(k_min, 2):
+        return max(1, min(k_min, n))
+
+    best_k, best_score = k_min, -1.0
+    for k in range(max(k_min, 2), k_max + 1):
+        labels = MiniBatchKMeans(n_clusters=k, batch_size=settings.CLUSTER_BATCH_SIZE, n_init=3,
+                                 random_state=42).fit_predict(X_sample)
+        if len(np.unique(labels)) < 2:
+            continue
+        score = silhouette_score(X_sample, labels, sample_size=min(sample_size, 2000), random_state=42)
+        if score > best_score:
+            best_k, best_score = k, score
+    logger.info(f"Chose k={best_k} (silhouette {best_score:.3f}) on a sample of {sample_size}")
+    return best_k
+
+def ctfidf_keywords(texts: List[str], labels: np.ndarray, n_clusters: int, weights: np.ndarray,
+                    top_n: int = 5) -> Dict[int, List[str]]:
+    """
+    Class-based TF-IDF: term counts are summed per cluster with one sparse
+    product, then each term is scored by its in-cluster frequency against
+    how common it is across all clusters.
+    """
+    import scipy.sparse as sp
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    try:
+        vectorizer = CountVectorizer(max_features=10000, stop_words='english')
+        counts = vectorizer.fit_transform(texts)
+    except ValueError:
+        # Only stop words / empty texts
+        return {}
+
+    membership = sp.csr_matrix(
+        (weights, (labels, np.arange(len(labels)))), shape=(n_clusters, len(labels))
+    )
+    class_terms = (membership @ counts).tocsr()
+
+    term_totals = np.asarray(class_terms.sum(axis=0)).ravel()
+    class_totals = np.asarray(class_terms.sum(axis=1)).ravel()
+    avg_words = class_totals.mean()
+    idf = np.log1p(avg_words / np.maximum(term_totals, 1e-12))
+    tf = sp.diags(1.0 / np.maximum(class_totals, 1e-12)) @ class_terms
+    scores = (tf @ sp.diags(idf)).tocsr()
+
+    feature_names = vectorizer.get_feature_names_out()
+    keywords = {}
+    for i in range(n_clusters):
+        row = scores.getrow(i)
+        if row.nnz == 0:
+            continue
+        top = row.indices[np.argsort(row.data)[::-1][:top_n]]
+        keywords[i] = [feature_names[j] for j in top]
+    return keywords
@@ -0,0 +1,176 @@
+import os
+import re
+import threading
+from dataclasses import dataclass
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+from config.settings import settings
+from middleware.logger import logger
+from utils.file_utils import append_log_lines, exclusive_file_lock, file_version, read_log_lines, write_atomic
+
+@dataclass
+class _Snapshot:
+    # What a read sees, swapped in as one object after each append. `rows`
+    # is shared between snapshots and only ever grows; rows >= count belong
+    # to a later snapshot
+    rows: Dict[str, int]
+    count: int
+    matrix: np.ndarray
+
+class EmbeddingStore:
+    """
+    Local embedding cache for one model, keyed by post content_hash.
+
+    Vectors live in an append-only float32 file that is memory-mapped for
+    reads; the id map (content_hash -> row) is an append-only log with one
+    hash per line, in row order. Vectors are written before their hashes,
+    so a crash mid-append only leaves unreferenced trailing rows (or a torn
+    last line) behind, cut off by the next append. An append writes only
+    the new rows and hashes, and other processes catch up by reading the
+    log from where they left off. Appends hold an exclusive file lock, so
+    several processes can share one store.
+    """
+
+    def __init__(self, directory: str, model_name: str, dimension: int = 384):
+        self.model_name = model_name
+        self.dimension = dimension
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, f"{safe_name}.f32")
+        self.ids_path = os.path.join(directory, f"{safe_name}.ids")
+        self.legacy_ids_path = os.path.join(directory, f"{safe_name}.ids.npy")
+        self.lock_path = os.path.join(directory, f"{safe_name}.lock")
+        self._lock = threading.Lock()
+        with self._lock, exclusive_file_lock(self.lock_path):
+            self._migrate_legacy_ids()
+            self._load()
+
+    def _migrate_legacy_ids(self):
+        # Stores written before the id log kept one .npy array of hashes
+        if not os.path.exists(self.legacy_ids_path):
+            return
+        if not os.path.exists(self.ids_path):
+            hashes = np.load(self.legacy_ids_path).tolist()
+            write_atomic(self.ids_path, lambda f: f.write("".join(h + "\n" for h in hashes).encode("utf-8")))
+        os.remove(self.legacy_ids_path)
+
+    def _load(self):
+        # Stat before reading: lines appended meanwhile are read again on
+        # the next catch-up, never skipped
+        self._ids_version = file_version(self.ids_path)
+        hashes, self._ids_offset = read_log_lines(self.ids_path)
+        self._publish({h: i for i, h in enumerate(hashes)}, len(hashes))
+
+    def _publish(self, rows: Dict[str, int], count: int):
+        if count:
+            matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.dimension))
+        else:
+            matrix = np.empty((0, self.dimension), dtype=np.float32)
+        self._snapshot = _Snapshot(rows=rows, count=count, matrix=matrix)
+
+    def refresh(self):
+        """Catch up if another process has appended to the store since we loaded it."""
+        with self._lock:
+            self._reload_if_changed()
+
+    def _reload_if_changed(self):
+        version = file_version(self.ids_path)
+        if version == self._ids_version:
+            return
+        if version is None or self._ids_version is None or version[0] != self._ids_version[0] \
+                or version[2] < self._ids_offset:
+            # Cleared or replaced: start over
+            self._load()
+            return
+        hashes, self._ids_offset = read_log_lines(self.ids_path, self._ids_offset)
+        self._ids_version = version
+        self._append_rows(hashes)
+
+    def _append_rows(self, hashes: List[str]):
+        snapshot = self._snapshot
+        for offset, h in enumerate(hashes):
+            snapshot.rows[h] = snapshot.count + offset
+        self._publish(snapshot.rows, snapshot.count + len(hashes))
+
+    def __len__(self) -> int:
+        return self._snapshot.count
+
+    def lookup(self, content_hashes: Sequence[str]) -> np.ndarray:
+        """Row index for each hash, -1 where no vector is cached."""
+        return _lookup(self._snapshot, content_hashes)
+
+    def missing(self, content_hashes: Sequence[str]) -> List[int]:
+        """Positions in `content_hashes` that have no cached vector."""
+        return np.flatnonzero(self.lookup(content_hashes) < 0).tolist()
+
+    def get(self, content_hashes: Sequence[str]) -> np.ndarray:
+        """
+        Vectors for the given hashes as an (n, dimension) float32 array.
+        Raises KeyError if any hash is not cached.
+        """
+        snapshot = self._snapshot
+        rows = _lookup(snapshot, content_hashes)
+        if (rows < 0).any():
+            raise KeyError(f"{int((rows < 0).sum())} embeddings not cached for {self.model_name}")
+        return np.asarray(snapshot.matrix[rows])
+
+    def add(self, content_hashes: Sequence[str], vectors: np.ndarray) -> int:
+        """Append vectors for hashes not cached yet. Returns the number added."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        if len(vectors) != len(content_hashes):
+            raise ValueError(f"Got {len(vectors)} vectors for {len(content_hashes)} hashes")
+
+        with self._lock, exclusive_file_lock(self.lock_path):
+            # Never truncate away rows another process appended meanwhile
+            self._reload_if_changed()
+            snapshot = self._snapshot
+            new_positions = []
+            seen = set()
+            for i, h in enumerate(content_hashes):
+                if h not in snapshot.rows and h not in seen:
+                    seen.add(h)
+                    new_positions.append(i)
+            if not new_positions:
+                return 0
+
+            # Drop unreferenced rows left by an interrupted append before writing
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(snapshot.count * self.dimension * 4)
+                f.write(np.ascontiguousarray(vectors[new_positions]).tobytes())
+
+            hashes = [content_hashes[i] for i in new_positions]
+            self._ids_offset = append_log_lines(self.ids_path, hashes, self._ids_offset)
+            self._ids_version = file_version(self.ids_path)
+            self._append_rows(hashes)
+
+        return len(new_positions)
+
+    def clear(self):
+        with self._lock, exclusive_file_lock(self.lock_path):
+            for path in (self.vectors_path, self.ids_path, self.legacy_ids_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._load()
+        logger.info(f"Embedding store for {self.model_name} cleared.")
+
+def _lookup(snapshot: _Snapshot, content_hashes: Sequence[str]) -> np.ndarray:
+    rows = snapshot.rows
+    found = np.fromiter((rows.get(h, -1) for h in content_hashes), dtype=np.int64, count=len(content_hashes))
+    found[found >= snapshot.count] = -1
+    return found
+
+_stores: Dict[Tuple[str, int], EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+def get_embedding_store(model_name: str, dimension: int = 384) -> EmbeddingStore:
+    """
+    One shared store per (model, dimension) in this process, refreshed from
+    disk in case a worker process has added vectors meanwhile.
+    """
+    with _stores_lock:
+        key = (model_name, dimension)
+        if key not in _stores:
+            _stores[key] = EmbeddingStore(settings.EMBEDDING_STORE_DIR, model_name, dimension)
+        store = _stores[key]
+    store.refresh()
+    return store
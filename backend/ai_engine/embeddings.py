@@ -1,36 +1,139 @@
-from sentence_transformers import SentenceTransformer
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
 import numpy as np
-from typing import List
+from typing import List, Optional
+from config.settings import settings
 from middleware.logger import logger
+from ai_engine.model_registry import model_registry
+from ai_engine.onnx_backend import get_backend, backend_tag, load_onnx_sentence_transformer, apply_torch_threads
 
-_embedding_model = None
+MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_DIMENSION = 384
+# Cached vectors and Pinecone sync state are keyed by this, so switching
+# inference backend re-encodes instead of mixing vectors
+MODEL_VERSION = f"{MODEL_NAME}{backend_tag()}"
+
+# Loaded through the model registry, which may unload it again when idle;
+# sentence_transformers (and torch) are only imported when it is built
+def _load_default_model():
+    try:
+        apply_torch_threads()
+        # MiniLM is fast and good enough for semantic search
+        return load_model(get_backend())
+    except Exception as e:
+        logger.error(f"Failed to load embedding model: {e}")
+        raise e
+
+model_registry.register("embeddings", _load_default_model, size_hint_mb=100)
+
+def is_loaded() -> bool:
+    return model_registry.is_loaded("embeddings")
 
 def get_model():
-    global _embedding_model
-    if _embedding_model is None:
-        try:
-            logger.info("Loading embedding model...")
-            # MiniLM is fast and good enough for semantic search
-            _embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        except Exception as e:
-            logger.error(f"Failed to load embedding model: {e}")
-            raise e
-    return _embedding_model
+    """Load the shared model (if needed) without holding it; see model_registry.use()."""
+    with model_registry.use("embeddings") as model:
+        return model
+
+def load_model(backend: str, quantize: bool = None):
+    """Build the embedding model on the given inference backend."""
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        return load_onnx_sentence_transformer(MODEL_NAME, quantize=quantize)
+    return SentenceTransformer(MODEL_NAME)
 
 def generate_embeddings(texts: List[str]) -> np.ndarray:
     """
     Generate embeddings for a list of texts.
     Returns a numpy array of shape (n_texts, 384)
     """
-    model = get_model()
-    try:
-        embeddings = model.encode(texts)
-        return embeddings
-    except Exception as e:
-        logger.error(f"Error generating embeddings: {e}")
-        return np.array([])
+    with model_registry.use("embeddings") as model:
+        try:
+            embeddings = model.encode(texts)
+            return embeddings
+        except Exception as e:
+            logger.error(f"Error generating embeddings: {e}")
+            return np.array([])
+
+class EncodeBatcher:
+    """
+    Micro-batcher for single-text encodes (chat queries). Requests from
+    concurrent callers are queued; a background thread takes the first one,
+    and when other requests are in flight waits up to `max_wait_ms` for
+    more (or until `max_batch_size`), then encodes them with one
+    model.encode call, so a burst of N queries costs
+    about one forward pass instead of N. Requests that arrive while a batch
+    is running are picked up together by the next one.
+
+    The thread is started on first submit, and again in a forked worker
+    (threads do not survive a fork).
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float, model_name: str = "embeddings"):
+        self.model_name = model_name
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.batches = self.encoded = 0
+
+    def submit(self, text: str) -> Future:
+        """Queue `text`; the future resolves to its vector as a list of floats."""
+        future: Future = Future()
+        self._ensure_running()
+        self._queue.put((text, future))
+        return future
+
+    def _ensure_running(self):
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def _run(self):
+        requests = self._queue
+        last_batch_size = 0
+        while True:
+            batch = [requests.get()]
+            # A lone request on an idle server is encoded straight away; the
+            # wait only applies under concurrent load, where it fills batches
+            busy = last_batch_size > 1 or not requests.empty()
+            deadline = time.monotonic() + (self.max_wait if busy else 0)
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(requests.get(timeout=timeout) if timeout > 0 else requests.get_nowait())
+                except queue.Empty:
+                    break
+            self._encode(batch)
+            last_batch_size = len(batch)
+
+    def _encode(self, batch: List[tuple]):
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            with model_registry.use(self.model_name) as model:
+                vectors = model.encode([text for text, _ in batch], batch_size=len(batch))
+        except Exception as e:
+            logger.error(f"Error encoding a batch of {len(batch)} queries: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.encoded += len(batch)
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector.tolist())
+
+query_batcher = EncodeBatcher(settings.EMBED_BATCH_MAX_SIZE, settings.EMBED_BATCH_MAX_WAIT_MS)
 
 def encode_text(text: str) -> List[float]:
-    """Encode a single text string."""
-    model = get_model()
-    return model.encode(text).tolist()
+    """Encode a single text string (batched with concurrent callers)."""
+    return query_batcher.submit(text).result()
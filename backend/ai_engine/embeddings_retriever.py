@@ -1,11 +1,11 @@
-from typing import List, Dict, Any
-from ai_engine.pinecone_client import pinecone_client
+from typing import List, Dict, Any, Optional
+from ai_engine.vector_index import get_vector_index
 from ai_engine.embeddings import encode_text
 from middleware.logger import logger
 
-def search_relevant_posts(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+def search_relevant_posts(query: str, top_k: int = 5, namespace: Optional[str] = None) -> List[Dict[str, Any]]:
     """
-    Search Pinecone for posts relevant to the query.
+    Search the vector index (Pinecone or local) for posts relevant to the query.
     """
     try:
         # 1. Encode query
@@ -13,8 +13,8 @@ def search_relevant_posts(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         if not vector:
             return []
             
-        # 2. Search Pinecone
-        matches = pinecone_client.query(vector, top_k=top_k)
+        # 2. Search the index
+        matches = get_vector_index().query(vector, top_k=top_k, namespace=namespace)
         
         # 3. Format results
         results = []
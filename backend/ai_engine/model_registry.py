@@ -0,0 +1,246 @@
+import ctypes
+import gc
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+from config.settings import settings
+from middleware.logger import logger
+
+@dataclass
+class _Entry:
+    name: str
+    loader: Callable[[], Any]
+    size_hint: int = 0
+    model: Any = None
+    refcount: int = 0
+    size_bytes: int = 0
+    rss_delta_bytes: int = 0
+    load_seconds: float = 0.0
+    last_used: float = 0.0
+    loads: int = 0
+    evictions: int = 0
+    pinned: bool = False
+
+class ModelRegistry:
+    """
+    Every local model (sentiment, embeddings, Whisper, F5-TTS) is loaded
+    through here instead of through its own module-level singleton.
+
+    Models are loaded on first acquire and kept while there is room in the
+    memory budget. Callers hold a model with `use()` (or acquire/release)
+    for as long as they run inference on it; when a load would exceed the
+    budget, idle models (refcount 0) are unloaded least recently used
+    first. Models in use are never evicted, so a burst that needs all of
+    them at once goes over budget (with a warning) rather than failing.
+
+    The budget is per process. Pinned models do not count against it:
+    they were loaded before the fork and their pages are shared by every
+    worker, not this worker's to free.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        # Loads are serialized so the RSS delta around one is its own
+        self._load_lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any], size_hint_mb: int = 0):
+        """
+        Add a model. `size_hint_mb` is used to make room before its first
+        load; afterwards the measured size is used.
+        """
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = _Entry(name=name, loader=loader, size_hint=size_hint_mb * 1024 ** 2)
+
+    def is_loaded(self, name: str) -> bool:
+        return self._entry(name).model is not None
+
+    def acquire(self, name: str) -> Any:
+        """Load the model if needed and hold a reference; pair with release()."""
+        entry = self._entry(name)
+        with self._lock:
+            if entry.model is not None:
+                return self._hold(entry)
+
+        with self._load_lock:
+            with self._lock:
+                if entry.model is not None:
+                    return self._hold(entry)
+                evicted = self._make_room(entry.size_bytes or entry.size_hint, keep=name)
+            self._reclaim(evicted)
+
+            logger.info(f"Loading model '{name}'...")
+            rss_before = _rss_bytes()
+            start = time.perf_counter()
+            model = entry.loader()
+            seconds = time.perf_counter() - start
+            rss_delta = max(_rss_bytes() - rss_before, 0)
+            size = _model_nbytes(model) or rss_delta
+
+            with self._lock:
+                entry.model = model
+                entry.size_bytes = size
+                entry.rss_delta_bytes = rss_delta
+                entry.load_seconds = round(seconds, 2)
+                entry.loads += 1
+                held = self._hold(entry)
+                # The measured size can be larger than the hint
+                evicted = self._make_room(0, keep=name)
+            self._reclaim(evicted)
+            logger.info(f"Model '{name}' loaded in {seconds:.1f}s ({size / 1024 ** 2:.0f} MB, "
+                        f"{self.budgeted_bytes() / 1024 ** 2:.0f}/{self._budget_mb()} MB of budget in use)")
+            return held
+
+    def pin(self, name: str):
+        """
+        Load the model and exclude it from eviction. Used for models
+        preloaded before forking workers: their pages are shared
+        copy-on-write, so unloading one in a worker frees nothing and a
+        reload would make a private copy.
+        """
+        with self.use(name):
+            pass
+        with self._lock:
+            self._entry(name).pinned = True
+
+    def release(self, name: str):
+        entry = self._entry(name)
+        with self._lock:
+            entry.refcount = max(entry.refcount - 1, 0)
+            entry.last_used = time.monotonic()
+
+    @contextmanager
+    def use(self, name: str):
+        """`with model_registry.use("sentiment") as analyzer: ...`"""
+        model = self.acquire(name)
+        try:
+            yield model
+        finally:
+            self.release(name)
+
+    def unload(self, name: str) -> bool:
+        """Unload an idle model. Returns False if it is in use, pinned or not loaded."""
+        entry = self._entry(name)
+        with self._lock:
+            if entry.model is None or entry.refcount > 0 or entry.pinned:
+                return False
+            self._evict(entry)
+        self._reclaim([name])
+        return True
+
+    def used_bytes(self) -> int:
+        return sum(e.size_bytes for e in self._entries.values() if e.model is not None)
+
+    def budgeted_bytes(self) -> int:
+        """Bytes counted against the budget: loaded models that are not pinned."""
+        return sum(e.size_bytes for e in self._entries.values() if e.model is not None and not e.pinned)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {
+                e.name: {
+                    "loaded": e.model is not None,
+                    "refcount": e.refcount,
+                    "pinned": e.pinned,
+                    "size_mb": round(e.size_bytes / 1024 ** 2, 1),
+                    "rss_delta_mb": round(e.rss_delta_bytes / 1024 ** 2, 1),
+                    "load_seconds": e.load_seconds,
+                    "idle_seconds": round(time.monotonic() - e.last_used, 1) if e.model is not None and e.refcount == 0 else None,
+                    "loads": e.loads,
+                    "evictions": e.evictions,
+                }
+                for e in self._entries.values()
+            }
+        return {
+            "budget_mb": self._budget_mb(),
+            "used_mb": round(self.used_bytes() / 1024 ** 2, 1),
+            "budgeted_mb": round(self.budgeted_bytes() / 1024 ** 2, 1),
+            "rss_mb": round(_rss_bytes() / 1024 ** 2, 1),
+            "models": models,
+        }
+
+    def _entry(self, name: str) -> _Entry:
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise KeyError(f"Model '{name}' is not registered") from None
+
+    def _hold(self, entry: _Entry) -> Any:
+        entry.refcount += 1
+        entry.last_used = time.monotonic()
+        return entry.model
+
+    def _make_room(self, incoming: int, keep: str) -> List[str]:
+        # Caller holds self._lock
+        if self.budget_bytes <= 0:
+            return []
+        evicted = []
+        while self.budgeted_bytes() + incoming > self.budget_bytes:
+            idle = [e for e in self._entries.values()
+                    if e.model is not None and e.refcount == 0 and not e.pinned and e.name != keep]
+            if not idle:
+                logger.warning(f"Model memory over budget ({(self.budgeted_bytes() + incoming) / 1024 ** 2:.0f} MB "
+                               f"> {self._budget_mb()} MB) but every other loaded model is in use or pinned")
+                break
+            victim = min(idle, key=lambda e: e.last_used)
+            self._evict(victim)
+            evicted.append(victim.name)
+        return evicted
+
+    def _evict(self, entry: _Entry):
+        logger.info(f"Unloading model '{entry.name}' ({entry.size_bytes / 1024 ** 2:.0f} MB)")
+        entry.model = None
+        entry.evictions += 1
+
+    def _reclaim(self, evicted: List[str]):
+        if evicted:
+            gc.collect()
+            _malloc_trim()
+
+    def _budget_mb(self) -> Optional[int]:
+        return self.budget_bytes // 1024 ** 2 if self.budget_bytes > 0 else None
+
+def _model_nbytes(model: Any) -> int:
+    """Parameter + buffer bytes of a torch model (or a pipeline wrapping one); 0 if unknown."""
+    module = model if hasattr(model, "parameters") else getattr(model, "model", None)
+    if not hasattr(module, "parameters"):
+        return 0
+    try:
+        tensors = list(module.parameters()) + list(module.buffers())
+    except Exception:
+        return 0
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+def _malloc_trim():
+    # Give freed model memory back to the OS instead of leaving it in glibc's heap
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+def _default_budget_bytes() -> int:
+    if settings.MODEL_MEMORY_BUDGET_MB > 0:
+        return settings.MODEL_MEMORY_BUDGET_MB * 1024 ** 2
+    if settings.MODEL_MEMORY_BUDGET_MB < 0:
+        return 0 # no limit
+    try:
+        # Unset: half of physical memory, shared by the worker processes
+        ram = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+        return ram // 2 // max(settings.WEB_CONCURRENCY, 1)
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+# Singleton instance
+model_registry = ModelRegistry(budget_bytes=_default_budget_bytes())
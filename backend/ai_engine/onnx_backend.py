@@ -0,0 +1,130 @@
+import os
+import re
+from typing import Optional, Tuple
+from config.settings import settings
+from middleware.logger import logger
+
+# CPU inference backends for the local models:
+#   torch - full precision PyTorch (default)
+#   onnx  - exported once to ONNX and run with onnxruntime, optionally with
+#           dynamic int8 quantization (ONNX_QUANTIZE)
+INFERENCE_BACKENDS = ("torch", "onnx")
+
+def get_backend() -> str:
+    backend = settings.INFERENCE_BACKEND
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"INFERENCE_BACKEND must be one of {INFERENCE_BACKENDS}, got '{backend}'")
+    return backend
+
+def apply_torch_threads():
+    """
+    Apply TORCH_NUM_THREADS. torch has one intra-op thread pool per process,
+    so this is a global setting rather than a per-model one; it is applied
+    by each model loader because torch is only imported there.
+    """
+    if settings.TORCH_NUM_THREADS <= 0:
+        return
+    try:
+        import torch
+    except ImportError:
+        return
+    if torch.get_num_threads() != settings.TORCH_NUM_THREADS:
+        torch.set_num_threads(settings.TORCH_NUM_THREADS)
+
+def torch_num_threads() -> Optional[int]:
+    """torch's intra-op thread count, or None without torch."""
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch.get_num_threads()
+
+def backend_tag(backend: str = None, quantize: bool = None) -> str:
+    """
+    Suffix for model version strings, so scores and vectors produced by a
+    different backend are never mixed with cached ones.
+    """
+    backend = backend or get_backend()
+    quantize = settings.ONNX_QUANTIZE if quantize is None else quantize
+    if backend == "torch":
+        return ""
+    return ":onnx-int8" if quantize else ":onnx"
+
+def _cache_dir(model_name: str, kind: str) -> str:
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+    return os.path.join(settings.ONNX_CACHE_DIR, kind, safe_name)
+
+def _quantization_config():
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    targets = {
+        "arm64": AutoQuantizationConfig.arm64,
+        "avx2": AutoQuantizationConfig.avx2,
+        "avx512": AutoQuantizationConfig.avx512,
+        "avx512_vnni": AutoQuantizationConfig.avx512_vnni,
+    }
+    if settings.ONNX_QUANT_TARGET not in targets:
+        raise ValueError(f"ONNX_QUANT_TARGET must be one of {sorted(targets)}, got '{settings.ONNX_QUANT_TARGET}'")
+    return targets[settings.ONNX_QUANT_TARGET](is_static=False, per_channel=False)
+
+def load_onnx_sequence_classifier(model_name: str, quantize: bool = None) -> Tuple[object, object]:
+    """
+    ONNX Runtime version of a HF sequence classifier plus its tokenizer.
+    The export (and int8 quantization) happens once; later loads come
+    straight from ONNX_CACHE_DIR.
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+        from transformers import AutoTokenizer
+    except ImportError as e:
+        raise ImportError("INFERENCE_BACKEND=onnx needs 'optimum[onnxruntime]' installed") from e
+
+    quantize = settings.ONNX_QUANTIZE if quantize is None else quantize
+    export_dir = _cache_dir(model_name, "classifier")
+    if not os.path.exists(os.path.join(export_dir, "model.onnx")):
+        logger.info(f"Exporting {model_name} to ONNX ({export_dir})...")
+        model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+        model.save_pretrained(export_dir)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(export_dir)
+
+    file_name = "model.onnx"
+    if quantize:
+        file_name = "model_quantized.onnx"
+        if not os.path.exists(os.path.join(export_dir, file_name)):
+            logger.info(f"Quantizing {model_name} to int8 ({settings.ONNX_QUANT_TARGET})...")
+            quantizer = ORTQuantizer.from_pretrained(export_dir, file_name="model.onnx")
+            quantizer.quantize(save_dir=export_dir, quantization_config=_quantization_config())
+
+    model = ORTModelForSequenceClassification.from_pretrained(export_dir, file_name=file_name)
+    tokenizer = AutoTokenizer.from_pretrained(export_dir)
+    return model, tokenizer
+
+def load_onnx_sentence_transformer(model_name: str, quantize: bool = None):
+    """
+    SentenceTransformer running on ONNX Runtime (sentence-transformers'
+    backend="onnx"), exported and optionally int8-quantized once into
+    ONNX_CACHE_DIR.
+    """
+    try:
+        from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+    except ImportError as e:
+        raise ImportError("INFERENCE_BACKEND=onnx needs sentence-transformers>=3.2 and 'optimum[onnxruntime]'") from e
+
+    quantize = settings.ONNX_QUANTIZE if quantize is None else quantize
+    export_dir = _cache_dir(model_name, "sentence_transformer")
+    if not os.path.exists(os.path.join(export_dir, "onnx", "model.onnx")):
+        logger.info(f"Exporting {model_name} to ONNX ({export_dir})...")
+        SentenceTransformer(model_name, backend="onnx").save_pretrained(export_dir)
+
+    file_name = os.path.join("onnx", "model.onnx")
+    if quantize:
+        file_name = os.path.join("onnx", f"model_qint8_{settings.ONNX_QUANT_TARGET}.onnx")
+        if not os.path.exists(os.path.join(export_dir, file_name)):
+            logger.info(f"Quantizing {model_name} to int8 ({settings.ONNX_QUANT_TARGET})...")
+            export_dynamic_quantized_onnx_model(
+                SentenceTransformer(export_dir, backend="onnx"),
+                quantization_config=settings.ONNX_QUANT_TARGET,
+                model_name_or_path=export_dir,
+            )
+
+    return SentenceTransformer(export_dir, backend="onnx", model_kwargs={"file_name": file_name})
@@ -1,81 +1,170 @@
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from config.settings import settings
 from middleware.logger import logger
-from typing import List, Dict, Any
+from ai_engine.vector_index import UpsertResult
+from typing import List, Dict, Any, Optional
 
 class PineconeClient:
+    """
+    Pinecone index wrapper. Connecting (and creating the index if needed)
+    takes several network round trips, so it happens on first use of
+    `index` rather than at import. A failed attempt is retried on a use at
+    least PINECONE_RECONNECT_SECONDS later; until then `index` is None.
+    """
+
     def __init__(self):
         self.api_key = settings.PINECONE_API_KEY
         self.index_name = "youtube-avatar-index"
         self.pc = None
-        self.index = None
-        
-        if self.api_key:
-            try:
-                from pinecone import Pinecone, ServerlessSpec
-            except ImportError:
-                logger.warning("pinecone package not available, Pinecone features disabled.")
-                return
-            try:
-                self.pc = Pinecone(api_key=self.api_key)
-                # Check if index exists, if not create (for MVP simplicity)
-                # Note: creating index takes time, ideally should be pre-created
-                existing_indexes = [i.name for i in self.pc.list_indexes()]
-                if self.index_name not in existing_indexes:
-                    logger.info(f"Creating Pinecone index: {self.index_name}")
-                    self.pc.create_index(
-                        name=self.index_name,
-                        dimension=384, # Matches all-MiniLM-L6-v2
-                        metric="cosine",
-                        spec=ServerlessSpec(
-                            cloud="aws",
-                            region="us-east-1"
-                        )
-                    )
-                self.index = self.pc.Index(self.index_name)
-            except Exception as e:
-                logger.error(f"Failed to initialize Pinecone: {e}")
+        self._index = None
+        self._connected = False
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def index(self):
+        if not self._connected and time.monotonic() >= self._retry_at:
+            with self._lock:
+                if not self._connected and time.monotonic() >= self._retry_at:
+                    self._connected = self._connect()
+                    if not self._connected:
+                        self._retry_at = time.monotonic() + settings.PINECONE_RECONNECT_SECONDS
+        return self._index
 
-    def upsert_vectors(self, vectors: List[tuple]):
+    def is_connected(self) -> bool:
+        return self._index is not None
+
+    def _connect(self) -> bool:
         """
-        vectors format: [(id, embedding_list, metadata_dict), ...]
+        Returns False if the attempt failed and is worth repeating. With no
+        API key or no pinecone package Pinecone stays disabled (True).
         """
-        if not self.index:
-            logger.warning("Pinecone index not initialized, skipping upsert.")
-            return False
-        
+        if not self.api_key:
+            return True
         try:
-            # Upsert in batches of 100
-            batch_size = 100
-            for i in range(0, len(vectors), batch_size):
-                batch = vectors[i:i+batch_size]
-                self.index.upsert(vectors=batch)
+            from pinecone import Pinecone, ServerlessSpec
+        except ImportError:
+            logger.warning("pinecone package not available, Pinecone features disabled.")
+            return True
+        try:
+            self.pc = Pinecone(api_key=self.api_key)
+            # Check if index exists, if not create (for MVP simplicity)
+            # Note: creating index takes time, ideally should be pre-created
+            existing_indexes = [i.name for i in self.pc.list_indexes()]
+            if self.index_name not in existing_indexes:
+                logger.info(f"Creating Pinecone index: {self.index_name}")
+                self.pc.create_index(
+                    name=self.index_name,
+                    dimension=384, # Matches all-MiniLM-L6-v2
+                    metric="cosine",
+                    spec=ServerlessSpec(
+                        cloud="aws",
+                        region="us-east-1"
+                    )
+                )
+            self._index = self.pc.Index(self.index_name)
+            logger.info(f"Connected to Pinecone index {self.index_name}")
             return True
         except Exception as e:
-            logger.error(f"Pinecone upsert failed: {e}")
+            logger.error(f"Failed to initialize Pinecone, retrying in {settings.PINECONE_RECONNECT_SECONDS:g}s: {e}")
+            self.pc = None
+            self._index = None
             return False
 
-    def query(self, vector: List[float], top_k: int = 5) -> List[Any]:
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=settings.PINECONE_UPSERT_CONCURRENCY,
+                                                    thread_name_prefix="pinecone")
+            return self._executor
+
+    def upsert_vectors(self, vectors: List[tuple], namespace: Optional[str] = None) -> UpsertResult:
+        """
+        vectors format: [(id, embedding_list, metadata_dict), ...]
+
+        Batches of PINECONE_UPSERT_BATCH_SIZE are sent PINECONE_UPSERT_CONCURRENCY
+        at a time, each retried with exponential backoff. A batch that still
+        fails only fails its own vectors: they are listed in the result's
+        failed_ids and the rest count as upserted.
+        """
+        if not self.index:
+            logger.warning("Pinecone index not initialized, skipping upsert.")
+            return UpsertResult(failed_ids=[str(v[0]) for v in vectors])
+
+        batch_size = settings.PINECONE_UPSERT_BATCH_SIZE
+        batches = [vectors[i:i + batch_size] for i in range(0, len(vectors), batch_size)]
+        executor = self._get_executor()
+        futures = {executor.submit(self._upsert_batch, batch, namespace): batch for batch in batches}
+
+        result = UpsertResult()
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                future.result()
+                result.upserted += len(batch)
+            except Exception as e:
+                logger.error(f"Pinecone upsert of {len(batch)} vectors failed after retries: {e}")
+                result.failed_ids.extend(str(v[0]) for v in batch)
+        if result.failed_ids:
+            logger.warning(f"Pinecone upsert: {result.upserted} upserted, {len(result.failed_ids)} failed")
+        return result
+
+    def _upsert_batch(self, batch: List[tuple], namespace: Optional[str]):
+        attempts = settings.PINECONE_UPSERT_RETRIES + 1
+        for attempt in range(attempts):
+            try:
+                self.index.upsert(vectors=batch, namespace=namespace or "")
+                return
+            except Exception as e:
+                if attempt == attempts - 1 or not _is_retryable(e):
+                    raise
+                delay = settings.PINECONE_RETRY_BACKOFF_SECONDS * 2 ** attempt * (0.5 + random.random())
+                logger.warning(f"Pinecone upsert failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def query(self, vector: List[float], top_k: int = 5, namespace: Optional[str] = None) -> List[Any]:
         if not self.index:
             return []
         try:
-            results = self.index.query(vector=vector, top_k=top_k, include_metadata=True)
+            results = self.index.query(vector=vector, top_k=top_k, include_metadata=True, namespace=namespace or "")
             return results.matches
         except Exception as e:
             logger.error(f"Pinecone query failed: {e}")
             return []
 
-    def clear_index(self):
-        """Delete all vectors in the index"""
+    def delete_namespace(self, namespace: str) -> bool:
+        """Delete every vector in one namespace."""
         if not self.index:
             return False
         try:
-            self.index.delete(delete_all=True)
-            logger.info("Pinecone index cleared.")
+            self.index.delete(delete_all=True, namespace=namespace)
+            logger.info(f"Pinecone namespace '{namespace}' deleted.")
             return True
         except Exception as e:
-            logger.error(f"Pinecone clear failed: {e}")
+            if getattr(e, "status", None) == 404:
+                # Never written to, nothing to delete
+                return True
+            logger.error(f"Pinecone namespace delete failed: {e}")
             return False
 
-# Singleton instance
+def _is_retryable(error: Exception) -> bool:
+    # Rate limits, server errors, timeouts and dropped connections are worth
+    # retrying; other 4xx and client-side errors (a bad payload) are not
+    status = getattr(error, "status", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        from urllib3.exceptions import HTTPError as TransportError
+    except ImportError:
+        return False
+    return isinstance(error, TransportError)
+
+# Singleton instance (cheap: nothing connects until first use)
 pinecone_client = PineconeClient()
@@ -1,35 +1,126 @@
-from transformers import pipeline
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+from config.settings import settings
 from middleware.logger import logger
-import datetime
+from ai_engine.model_registry import model_registry
+from ai_engine.onnx_backend import (get_backend, backend_tag, load_onnx_sequence_classifier,
+                                    apply_torch_threads, torch_num_threads)
+import numpy as np
+import time
 
-# Singleton to avoid reloading model
-_sentiment_analyzer = None
+SENTIMENT_MODEL = "distilbert-base-uncased-finetuned-sst-2-english"
+# DistilBERT's position embeddings cap inputs at 512 tokens
+MAX_TOKENS = 512
+# Stored with every cached score; changes whenever the model, truncation or
+# inference backend does
+MODEL_VERSION = f"{SENTIMENT_MODEL}:tok{MAX_TOKENS}{backend_tag()}"
+
+# Loaded through the model registry, which may unload it again when idle;
+# transformers/torch are only imported when it is built, so importing this
+# module stays cheap
+def _load_default_analyzer():
+    try:
+        apply_torch_threads()
+        # using a smaller, faster model for MVP
+        return load_analyzer(get_backend())
+    except Exception as e:
+        logger.error(f"Failed to load sentiment model: {e}")
+        raise e
+
+model_registry.register("sentiment", _load_default_analyzer, size_hint_mb=260)
+
+def is_loaded() -> bool:
+    return model_registry.is_loaded("sentiment")
 
 def get_analyzer():
-    global _sentiment_analyzer
-    if _sentiment_analyzer is None:
-        try:
-            logger.info("Loading sentiment analysis model...")
-            # using a smaller, faster model for MVP
-            _sentiment_analyzer = pipeline("sentiment-analysis", model="distilbert-base-uncased-finetuned-sst-2-english")
-        except Exception as e:
-            logger.error(f"Failed to load sentiment model: {e}")
-            raise e
-    return _sentiment_analyzer
+    """Load the shared pipeline (if needed) without holding it; see model_registry.use()."""
+    with model_registry.use("sentiment") as analyzer:
+        return analyzer
+
+def load_analyzer(backend: str, quantize: bool = None):
+    """Build the sentiment pipeline on the given inference backend."""
+    from transformers import pipeline
+
+    if backend == "onnx":
+        model, tokenizer = load_onnx_sequence_classifier(SENTIMENT_MODEL, quantize=quantize)
+        return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+    return pipeline("sentiment-analysis", model=SENTIMENT_MODEL)
 
 def analyze_sentiment(texts: List[str]) -> List[Dict[str, Any]]:
     """
     Analyze sentiment for a batch of texts.
     Returns: [{'label': 'POSITIVE', 'score': 0.99}, ...]
     """
-    analyzer = get_analyzer()
-    # Truncate texts to 512 tokens (simple char limit for now) to avoid errors
-    truncated_texts = [t[:512] for t in texts]
+    results, _ = analyze_sentiment_batched(texts)
+    return results
+
+def analyze_sentiment_batched(texts: List[str], batch_size: Optional[int] = None,
+                              analyzer=None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Length-bucketed inference: texts are tokenized once (truncated at
+    MAX_TOKENS tokens), sorted by token length and scored in fixed-size
+    batches, so each batch only pads to its own longest text and peak memory
+    is bounded by batch_size * longest-in-batch.
+    Returns (results in input order, throughput stats). stats['fallback']
+    is True when the model failed and neutral placeholders were returned.
+    `analyzer` overrides the shared pipeline (used by the backend benchmark).
+    """
+    batch_size = batch_size or settings.SENTIMENT_BATCH_SIZE
+    start = time.perf_counter()
+    fallback = False
+
     try:
-        results = analyzer(truncated_texts)
-        return results
+        if not texts:
+            results = []
+        elif analyzer is not None:
+            results = _score_batches(texts, batch_size, analyzer)
+        else:
+            # Held for the whole run so the registry cannot unload it midway
+            with model_registry.use("sentiment") as shared:
+                results = _score_batches(texts, batch_size, shared)
     except Exception as e:
         logger.error(f"Error during sentiment analysis: {e}")
         # Return neutral fallback
-        return [{"label": "NEUTRAL", "score": 0.5} for _ in texts]
+        results = [{"label": "NEUTRAL", "score": 0.5} for _ in texts]
+        fallback = True
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "texts": len(texts),
+        "batch_size": batch_size,
+        "num_threads": torch_num_threads(),
+        "seconds": round(elapsed, 3),
+        "texts_per_second": round(len(texts) / elapsed, 1) if elapsed > 0 else 0.0,
+        "fallback": fallback,
+    }
+    logger.info(f"Sentiment scored {stats['texts']} texts in {stats['seconds']}s "
+                f"({stats['texts_per_second']} texts/s, batch {batch_size}, {stats['num_threads']} threads)")
+    return results, stats
+
+def _score_batches(texts: List[str], batch_size: int, analyzer) -> List[Dict[str, Any]]:
+    import torch
+
+    tokenizer, model = analyzer.tokenizer, analyzer.model
+    id2label = model.config.id2label
+
+    encoded = tokenizer([t or "" for t in texts], truncation=True, max_length=MAX_TOKENS)
+    input_ids = encoded["input_ids"]
+    attention_mask = encoded["attention_mask"]
+    order = np.argsort(np.fromiter((len(ids) for ids in input_ids), dtype=np.int64, count=len(texts)), kind="stable")
+
+    results: List[Dict[str, Any]] = [None] * len(texts)
+    with torch.inference_mode():
+        for offset in range(0, len(order), batch_size):
+            indices = order[offset:offset + batch_size]
+            batch = tokenizer.pad(
+                {
+                    "input_ids": [input_ids[i] for i in indices],
+                    "attention_mask": [attention_mask[i] for i in indices],
+                },
+                return_tensors="pt",
+            )
+            batch = {key: value.to(model.device) for key, value in batch.items()}
+            probs = torch.softmax(model(**batch).logits, dim=-1)
+            scores, labels = probs.max(dim=-1)
+            for i, label, score in zip(indices.tolist(), labels.tolist(), scores.tolist()):
+                results[i] = {"label": id2label[label], "score": score}
+    return results
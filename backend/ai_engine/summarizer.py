@@ -1,13 +1,35 @@
-from groq import Groq
+import threading
 from config.settings import settings
 from middleware.logger import logger
 from typing import Optional
 
-client = None
-if settings.GROQ_API_KEY:
-    client = Groq(api_key=settings.GROQ_API_KEY)
+# Built on first use: importing groq (httpx, pydantic models) is slow and
+# the API should come up without it
+_client = None
+_client_lock = threading.Lock()
 
-def generate_summary(prompt: str, system_prompt: str = "You are a helpful AI analyst.") -> Optional[str]:
+def get_client():
+    """Shared Groq client, or None when GROQ_API_KEY is not set."""
+    global _client
+    if _client is None and settings.GROQ_API_KEY:
+        with _client_lock:
+            if _client is None:
+                from groq import Groq
+                _client = Groq(api_key=settings.GROQ_API_KEY)
+    return _client
+
+class LLMError(Exception):
+    """A Groq completion failed (network, rate limit, API error)."""
+
+def generate_summary(prompt: str, system_prompt: str = "You are a helpful AI analyst.",
+                     raise_errors: bool = False) -> Optional[str]:
+    """
+    Complete `prompt` with the Groq model. API errors come back as an error
+    string for the chat path; with `raise_errors` they raise LLMError
+    instead, so analysis stages fail (and can be retried) rather than
+    storing the error text as their result.
+    """
+    client = get_client()
     if not client:
         logger.warning("Groq client not initialized (missing key). Returning mock response.")
         return "Analysis unavailable: Groq API Key missing."
@@ -25,12 +47,14 @@ def generate_summary(prompt: str, system_prompt: str = "You are a helpful AI ana
         return response.choices[0].message.content
     except Exception as e:
         logger.error(f"Groq API error: {e}")
+        if raise_errors:
+            raise LLMError(f"Groq API error: {e}") from e
         return f"Error generating summary: {str(e)}"
 
 def generate_error_fallback_summary():
     return "The user is interested in technology, coding, and self-improvement. They watch a lot of tutorials and educational content."
 
-def generate_avatar_persona(user_summary: str) -> str:
+def generate_avatar_persona(user_summary: str, raise_errors: bool = False) -> str:
     """
     Generate the 'System Prompt' logic for the Avatar based on the user's profile.
     """
@@ -43,4 +67,4 @@ def generate_avatar_persona(user_summary: str) -> str:
     
     Output a system prompt description for this Avatar.
     """
-    return generate_summary(prompt, system_prompt="You are an expert character creator.")
+    return generate_summary(prompt, system_prompt="You are an expert character creator.", raise_errors=raise_errors)
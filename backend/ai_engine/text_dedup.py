@@ -0,0 +1,96 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence
+
+def normalize_text(text: str) -> str:
+    """Key used to decide that two texts are 'the same' for model purposes."""
+    return " ".join((text or "").split()).casefold()
+
+@dataclass
+class DedupedTexts:
+    """
+    Unique texts plus the mapping needed to fan per-unique results back out
+    to the original (post) order.
+    """
+    unique_texts: List[str]  # first occurrence of each normalized text
+    inverse: np.ndarray      # original position -> index into unique_texts
+    counts: np.ndarray       # occurrences of each unique text
+
+    @property
+    def total(self) -> int:
+        return len(self.inverse)
+
+    @property
+    def unique_count(self) -> int:
+        return len(self.unique_texts)
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Fraction of model calls saved by deduplication."""
+        return 1.0 - self.unique_count / self.total if self.total else 0.0
+
+    def fan_out_array(self, unique_results: np.ndarray) -> np.ndarray:
+        """Expand one result per unique text to one result per original text."""
+        if len(unique_results) == 0:
+            # Upstream model failed and returned nothing; keep that visible
+            return unique_results
+        return unique_results[self.inverse]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "total_texts": self.total,
+            "unique_texts": self.unique_count,
+            "dedup_ratio": round(self.dedup_ratio, 4),
+        }
+
+def dedupe_texts(texts: Sequence[str]) -> DedupedTexts:
+    """Collapse `texts` to unique normalized texts."""
+    if len(texts) == 0:
+        empty = np.array([], dtype=np.int64)
+        return DedupedTexts(unique_texts=[], inverse=empty, counts=empty)
+
+    keys = np.array([normalize_text(t) for t in texts], dtype=object)
+    _, first_index, inverse, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+    return DedupedTexts(
+        unique_texts=[texts[i] for i in first_index],
+        inverse=inverse.reshape(-1),
+        counts=counts,
+    )
+
+class TextDeduplicator:
+    """
+    Incremental dedupe_texts for streamed input: feed chunks to add() and
+    read unique_texts / counts once the stream is exhausted.
+    """
+
+    def __init__(self):
+        self.unique_texts: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._counts: List[int] = []
+
+    def add(self, texts: Sequence[str]) -> np.ndarray:
+        """Index into unique_texts for each text in the chunk."""
+        out = np.empty(len(texts), dtype=np.int64)
+        for i, text in enumerate(texts):
+            key = normalize_text(text)
+            idx = self._index.get(key)
+            if idx is None:
+                idx = self._index[key] = len(self.unique_texts)
+                self.unique_texts.append(text)
+                self._counts.append(0)
+            self._counts[idx] += 1
+            out[i] = idx
+        return out
+
+    @property
+    def counts(self) -> np.ndarray:
+        return np.array(self._counts, dtype=np.int64)
+
+    def stats(self) -> Dict[str, Any]:
+        total = sum(self._counts)
+        unique = len(self.unique_texts)
+        return {
+            "total_texts": total,
+            "unique_texts": unique,
+            "dedup_ratio": round(1.0 - unique / total, 4) if total else 0.0,
+        }
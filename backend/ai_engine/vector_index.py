@@ -0,0 +1,510 @@
+import json
+import os
+import re
+import shutil
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import numpy as np
+from config.settings import settings
+from middleware.logger import logger
+from utils.file_utils import append_log_lines, exclusive_file_lock, file_version, read_log_lines, write_atomic
+
+# Where post vectors are indexed for retrieval, chosen by VECTOR_BACKEND:
+#   pinecone - the hosted Pinecone index
+#   local    - LocalVectorIndex below, in-process and persisted on disk
+#   auto     - pinecone when PINECONE_API_KEY is set, local otherwise
+VECTOR_BACKENDS = ("auto", "pinecone", "local")
+
+@dataclass
+class VectorMatch:
+    """One query result; same fields the retriever reads off Pinecone matches."""
+    id: str
+    score: float
+    metadata: Dict[str, Any]
+
+@dataclass
+class UpsertResult:
+    """Outcome of an upsert; vectors in failed_ids were not written."""
+    upserted: int = 0
+    failed_ids: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return not self.failed_ids
+
+@dataclass
+class _Snapshot:
+    # Everything a query reads, swapped in as one object after each write.
+    # ids and metadata are shared with later snapshots and only grow; rows
+    # >= count belong to a later one
+    count: int
+    ids: List[str]
+    metadata: List[Dict[str, Any]]
+    matrix: np.ndarray
+    centroids: Optional[np.ndarray] = None
+    # IVF lists as of the last rebuild: row numbers grouped by list (list i
+    # is list_rows[list_bounds[i]:list_bounds[i + 1]]) and matrix[list_rows],
+    # so each list is one contiguous block
+    list_rows: Optional[np.ndarray] = None
+    list_bounds: Optional[np.ndarray] = None
+    list_matrix: Optional[np.ndarray] = None
+    # Rows upserted since then, scanned from the memmap, with their lists;
+    # overwritten rows still in the blocks are masked out by listed_stale
+    tail_rows: Optional[np.ndarray] = None
+    tail_lists: Optional[np.ndarray] = None
+    listed_stale: Optional[np.ndarray] = None
+
+# The list blocks are rebuilt once the tail outgrows this fraction of them,
+# so each row is copied a bounded number of times however the index is built
+_TAIL_REBUILD_FRACTION = 0.25
+
+class LocalVectorIndex:
+    """
+    In-process cosine-similarity index over one namespace (see
+    LocalVectorBackend for the PineconeClient-compatible wrapper).
+
+    Vectors are L2-normalized float32 rows in a flat file that is memory-
+    mapped on load, so scores are plain dot products. Up to
+    VECTOR_INDEX_EXACT_MAX vectors every query scans them all; above that an
+    IVF index (k-means centroids, one inverted list per centroid) is trained
+    and a query only scans the VECTOR_INDEX_NPROBE lists nearest to it. The
+    IVF index keeps an in-RAM copy of the vectors ordered by list, so each
+    probed list is a contiguous block rather than a gather from the memmap.
+    Rows upserted after that copy was made are kept in a tail, grouped by
+    list too, until it has grown by _TAIL_REBUILD_FRACTION; an upsert only
+    writes and assigns its own rows. The centroids are retrained when the
+    index has grown 4x since training.
+
+    Writers (upserts, reloads that rebuild a stale IVF index, clears) hold
+    an exclusive lock on index.lock, so worker processes sharing a
+    namespace do not truncate or overwrite each other's rows. Other
+    processes catch up by reading the logs from where they left off.
+
+    Files, in write order (appending to ids.txt commits an upsert, so a
+    crash mid-upsert leaves only unreferenced rows behind, cut off by the
+    next upsert):
+      vectors.f32      rows in insertion order; an upsert of a known id
+                       overwrites its row in place
+      centroids.npy    IVF centroids, replaced when retrained
+      assignments.i32  IVF list of each row, appended like vectors.f32
+      metadata.jsonl   {"id", "metadata"} per upsert, last one wins
+      ids.txt          id of each row, one per line
+    """
+
+    def __init__(self, directory: str, dimension: int = 384):
+        self.directory = directory
+        self.dimension = dimension
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.metadata_path = os.path.join(directory, "metadata.jsonl")
+        self.centroids_path = os.path.join(directory, "centroids.npy")
+        self.assignments_path = os.path.join(directory, "assignments.i32")
+        self.ids_path = os.path.join(directory, "ids.txt")
+        # Written by versions that rewrote them whole on every upsert
+        self.legacy_ids_path = os.path.join(directory, "ids.npy")
+        self.legacy_assignments_path = os.path.join(directory, "assignments.npy")
+        self.lock_path = os.path.join(directory, "index.lock")
+        self._lock = threading.Lock()
+        with self._lock, exclusive_file_lock(self.lock_path):
+            self._load()
+
+    def _migrate_legacy_files(self):
+        if os.path.exists(self.legacy_ids_path):
+            if not os.path.exists(self.ids_path):
+                ids = np.load(self.legacy_ids_path).tolist()
+                write_atomic(self.ids_path, lambda f: f.write("".join(vid + "\n" for vid in ids).encode("utf-8")))
+            os.remove(self.legacy_ids_path)
+        if os.path.exists(self.legacy_assignments_path):
+            if not os.path.exists(self.assignments_path):
+                assignments = np.load(self.legacy_assignments_path).astype(np.int32)
+                write_atomic(self.assignments_path, lambda f: f.write(assignments.tobytes()))
+            os.remove(self.legacy_assignments_path)
+
+    def _load(self):
+        self._migrate_legacy_files()
+        # Stat before reading: lines appended meanwhile are read again on
+        # the next catch-up, never skipped
+        self._ids_version = file_version(self.ids_path)
+        self._centroids_version = file_version(self.centroids_path)
+        ids, self._ids_offset = read_log_lines(self.ids_path)
+        self._ids: List[str] = ids
+        self._rows: Dict[str, int] = {vid: i for i, vid in enumerate(ids)}
+        self._metadata: List[Dict[str, Any]] = [{} for _ in ids]
+        entries, self._metadata_offset = read_log_lines(self.metadata_path)
+        self._apply_metadata(entries)
+
+        n = len(ids)
+        self._centroids = np.load(self.centroids_path) if n and os.path.exists(self.centroids_path) else None
+        self._trained_size = n
+        if n > settings.VECTOR_INDEX_EXACT_MAX and (self._centroids is None or _read_assignments(self.assignments_path, n) is None):
+            # Missing or stale after an interrupted upsert
+            self._retrain(n)
+        elif n <= settings.VECTOR_INDEX_EXACT_MAX:
+            self._drop_ivf()
+        self._snapshot = None
+        self._publish(n, rebuild=True)
+
+    def _apply_metadata(self, lines: List[str]) -> List[int]:
+        """Apply metadata log lines; returns the rows they belong to."""
+        rows = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            row = self._rows.get(entry["id"])
+            if row is not None:
+                self._metadata[row] = entry["metadata"]
+                rows.append(row)
+        return rows
+
+    def _matrix(self, n: int) -> np.ndarray:
+        if not n:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(n, self.dimension))
+
+    def _publish(self, count: int, changed_rows: Optional[np.ndarray] = None, rebuild: bool = False):
+        previous = self._snapshot
+        snapshot = _Snapshot(count=count, ids=self._ids, metadata=self._metadata, matrix=self._matrix(count))
+        if self._centroids is not None:
+            snapshot.centroids = self._centroids
+            if rebuild or previous is None or previous.list_rows is None:
+                self._build_lists(snapshot)
+            else:
+                self._extend_tail(snapshot, previous, changed_rows)
+        self._snapshot = snapshot
+
+    def _build_lists(self, snapshot: _Snapshot):
+        assignments = _read_assignments(self.assignments_path, snapshot.count)
+        order = np.argsort(assignments, kind="stable")
+        snapshot.list_rows = order
+        snapshot.list_bounds = np.searchsorted(assignments[order], np.arange(len(snapshot.centroids) + 1))
+        snapshot.list_matrix = np.ascontiguousarray(snapshot.matrix[order])
+        snapshot.tail_rows = np.empty(0, dtype=np.int64)
+        snapshot.tail_lists = np.empty(0, dtype=np.int32)
+        snapshot.listed_stale = None
+
+    def _extend_tail(self, snapshot: _Snapshot, previous: _Snapshot, changed_rows: Optional[np.ndarray]):
+        changed = np.unique(changed_rows) if changed_rows is not None else np.empty(0, dtype=np.int64)
+        listed = len(previous.list_rows)
+        kept = ~np.isin(previous.tail_rows, changed)
+        tail_rows = np.concatenate([previous.tail_rows[kept], changed])
+        if len(tail_rows) > max(_TAIL_REBUILD_FRACTION * listed, 1):
+            self._build_lists(snapshot)
+            return
+        # Only the changed rows' lists are read back, not the whole file
+        changed_lists = _read_assignments(self.assignments_path, snapshot.count)[changed]
+        tail_lists = np.concatenate([previous.tail_lists[kept], changed_lists])
+        order = np.argsort(tail_rows) # memmap locality
+        snapshot.tail_rows = tail_rows[order]
+        snapshot.tail_lists = tail_lists[order]
+        snapshot.list_rows = previous.list_rows
+        snapshot.list_bounds = previous.list_bounds
+        snapshot.list_matrix = previous.list_matrix
+        snapshot.listed_stale = previous.listed_stale
+        overwritten = changed[changed < listed]
+        if len(overwritten):
+            stale = previous.listed_stale.copy() if previous.listed_stale is not None else np.zeros(listed, dtype=bool)
+            stale[overwritten] = True
+            snapshot.listed_stale = stale
+
+    def _reload_if_changed(self):
+        # Another worker process may have upserted since we loaded; callers
+        # hold the file lock
+        version = file_version(self.ids_path)
+        if version == self._ids_version:
+            return
+        if version is None or self._ids_version is None or version[0] != self._ids_version[0] \
+                or version[2] < self._ids_offset or file_version(self.centroids_path) != self._centroids_version:
+            # Cleared, replaced or retrained: start over
+            self._load()
+            return
+        ids, self._ids_offset = read_log_lines(self.ids_path, self._ids_offset)
+        self._ids_version = version
+        self._append_ids(ids)
+        entries, self._metadata_offset = read_log_lines(self.metadata_path, self._metadata_offset)
+        changed = self._apply_metadata(entries)
+        count = len(self._ids)
+        if self._centroids is not None and _read_assignments(self.assignments_path, count) is None:
+            self._load()
+            return
+        self._publish(count, np.asarray(changed, dtype=np.int64))
+
+    def _append_ids(self, ids: List[str]):
+        for vid in ids:
+            self._rows[vid] = len(self._ids)
+            self._ids.append(vid)
+            self._metadata.append({})
+
+    def __len__(self) -> int:
+        return self._snapshot.count
+
+    def upsert_vectors(self, vectors: List[tuple]) -> UpsertResult:
+        """
+        vectors format: [(id, embedding_list, metadata_dict), ...]
+        """
+        if not vectors:
+            return UpsertResult()
+        try:
+            with self._lock, exclusive_file_lock(self.lock_path):
+                self._reload_if_changed()
+                try:
+                    self._upsert(vectors)
+                except Exception:
+                    # Back to what is committed on disk
+                    self._load()
+                    raise
+            return UpsertResult(upserted=len(vectors))
+        except Exception as e:
+            logger.error(f"Local vector index upsert failed: {e}")
+            return UpsertResult(failed_ids=[str(v[0]) for v in vectors])
+
+    def _upsert(self, vectors: List[tuple]):
+        latest = {str(vid): (values, metadata) for vid, values, metadata in vectors}
+        new_ids = [vid for vid in latest if vid not in self._rows]
+        known_ids = [vid for vid in latest if vid in self._rows]
+        matrix = _normalize(np.asarray([latest[vid][0] for vid in known_ids + new_ids], dtype=np.float32)
+                            .reshape(-1, self.dimension))
+
+        n = len(self._ids)
+        total = n + len(new_ids)
+        with open(self.vectors_path, "ab") as f:
+            # Drop unreferenced rows left by an interrupted upsert first
+            f.truncate(n * self.dimension * 4)
+            f.write(np.ascontiguousarray(matrix[len(known_ids):]).tobytes())
+        known_rows = np.fromiter((self._rows[vid] for vid in known_ids), dtype=np.int64, count=len(known_ids))
+        if known_ids:
+            with open(self.vectors_path, "r+b") as f:
+                for row, values in zip(known_rows.tolist(), matrix[:len(known_ids)]):
+                    f.seek(row * self.dimension * 4)
+                    f.write(values.tobytes())
+
+        changed = np.concatenate([known_rows, np.arange(n, total)])
+        rebuild = self._update_ivf(n, total, changed)
+
+        self._metadata_offset = append_log_lines(
+            self.metadata_path,
+            [json.dumps({"id": vid, "metadata": latest[vid][1] or {}}, default=str) for vid in known_ids + new_ids],
+            self._metadata_offset,
+        )
+        self._ids_offset = append_log_lines(self.ids_path, new_ids, self._ids_offset)
+        self._ids_version = file_version(self.ids_path)
+
+        for vid in known_ids:
+            self._metadata[self._rows[vid]] = latest[vid][1] or {}
+        self._append_ids(new_ids)
+        for vid in new_ids:
+            self._metadata[self._rows[vid]] = latest[vid][1] or {}
+        self._publish(total, changed, rebuild=rebuild)
+
+    def _update_ivf(self, n: int, total: int, changed_rows: np.ndarray) -> bool:
+        """
+        (Re)train the centroids when needed, otherwise assign just
+        `changed_rows` to lists. Returns True if every row was reassigned.
+        """
+        if total <= settings.VECTOR_INDEX_EXACT_MAX:
+            self._drop_ivf()
+            return False
+        if self._centroids is None or total > 4 * self._trained_size:
+            self._retrain(total)
+            return True
+
+        lists = _assign(self._matrix(total), changed_rows, self._centroids)
+        known = changed_rows < n
+        with open(self.assignments_path, "ab") as f:
+            f.truncate(n * 4)
+            f.write(lists[~known].astype(np.int32).tobytes())
+        if known.any():
+            with open(self.assignments_path, "r+b") as f:
+                for row, assigned in zip(changed_rows[known].tolist(), lists[known].astype(np.int32)):
+                    f.seek(row * 4)
+                    f.write(assigned.tobytes())
+        return False
+
+    def _retrain(self, n: int):
+        matrix = self._matrix(n)
+        self._centroids = _train_centroids(matrix)
+        self._trained_size = n
+        assignments = _assign(matrix, np.arange(n), self._centroids).astype(np.int32)
+        write_atomic(self.assignments_path, lambda f: f.write(assignments.tobytes()))
+        _save_atomic(self.centroids_path, self._centroids)
+        self._centroids_version = file_version(self.centroids_path)
+
+    def _drop_ivf(self):
+        self._centroids = None
+        for path in (self.centroids_path, self.assignments_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._centroids_version = None
+
+    def query(self, vector: List[float], top_k: int = 5) -> List[VectorMatch]:
+        try:
+            if file_version(self.ids_path) != self._ids_version:
+                with self._lock, exclusive_file_lock(self.lock_path):
+                    self._reload_if_changed()
+            snapshot = self._snapshot
+            if not snapshot.count or top_k <= 0:
+                return []
+
+            q = _normalize(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+            if snapshot.centroids is not None:
+                nprobe = min(settings.VECTOR_INDEX_NPROBE, len(snapshot.centroids))
+                probe = np.argpartition(-(snapshot.centroids @ q), nprobe - 1)[:nprobe]
+                bounds = snapshot.list_bounds
+                scores = np.concatenate([snapshot.list_matrix[bounds[i]:bounds[i + 1]] @ q for i in probe])
+                rows = np.concatenate([snapshot.list_rows[bounds[i]:bounds[i + 1]] for i in probe])
+                if snapshot.listed_stale is not None:
+                    current = ~snapshot.listed_stale[rows]
+                    scores, rows = scores[current], rows[current]
+                tail = snapshot.tail_rows[np.isin(snapshot.tail_lists, probe)]
+                if len(tail):
+                    scores = np.concatenate([scores, np.asarray(snapshot.matrix[tail]) @ q])
+                    rows = np.concatenate([rows, tail])
+            else:
+                rows = None
+                scores = snapshot.matrix @ q
+
+            k = min(top_k, len(scores))
+            if k == 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                VectorMatch(id=snapshot.ids[row], score=float(scores[i]), metadata=snapshot.metadata[row])
+                for i, row in zip(top.tolist(), (rows[top] if rows is not None else top).tolist())
+            ]
+        except Exception as e:
+            logger.error(f"Local vector index query failed: {e}")
+            return []
+
+    def clear_index(self) -> bool:
+        """Delete all vectors in the index"""
+        with self._lock, exclusive_file_lock(self.lock_path):
+            for path in (self.vectors_path, self.metadata_path, self.centroids_path, self.assignments_path,
+                         self.ids_path, self.legacy_ids_path, self.legacy_assignments_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._load()
+        logger.info("Local vector index cleared.")
+        return True
+
+def _read_assignments(path: str, n: int) -> Optional[np.ndarray]:
+    """IVF list of the first n rows (memory-mapped); None if the file does not cover them."""
+    if not n:
+        return np.empty(0, dtype=np.int32)
+    if not os.path.exists(path) or os.path.getsize(path) < n * 4:
+        return None
+    return np.memmap(path, dtype=np.int32, mode="r", shape=(n,))
+
+def _save_atomic(path: str, array: np.ndarray):
+    write_atomic(path, lambda f: np.save(f, array))
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+def _train_centroids(matrix: np.ndarray) -> np.ndarray:
+    from sklearn.cluster import MiniBatchKMeans
+
+    n = len(matrix)
+    n_lists = max(1, int(2 * np.sqrt(n)))
+    rng = np.random.default_rng(42)
+    sample = np.sort(rng.choice(n, size=min(n, max(50 * n_lists, 20000)), replace=False))
+    # Random init: k-means++ seeding of hundreds of lists took most of the
+    # build time, and recall held up without it (benchmarks/vector_index.py)
+    kmeans = MiniBatchKMeans(n_clusters=n_lists, init="random", batch_size=settings.CLUSTER_BATCH_SIZE, n_init=1, random_state=42)
+    kmeans.fit(np.asarray(matrix[sample]))
+    logger.info(f"Trained IVF index with {n_lists} lists on {len(sample)} of {n} vectors")
+    return _normalize(kmeans.cluster_centers_.astype(np.float32))
+
+def _assign(matrix: np.ndarray, rows: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+    out = np.empty(len(rows), dtype=np.int32)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        out[start:start + chunk_size] = np.argmax(np.asarray(matrix[chunk]) @ centroids.T, axis=1)
+    return out
+
+class LocalVectorBackend:
+    """
+    Local counterpart of PineconeClient: one LocalVectorIndex per namespace,
+    each in its own subdirectory, except the default ("") namespace, which
+    is the directory itself (where the index lived before namespaces).
+    """
+
+    def __init__(self, directory: str, dimension: int = 384):
+        self.directory = directory
+        self.dimension = dimension
+        self._indexes: Dict[str, LocalVectorIndex] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, namespace: Optional[str]) -> str:
+        if not namespace:
+            return self.directory
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]", "_", namespace))
+
+    def namespace_index(self, namespace: Optional[str] = None) -> LocalVectorIndex:
+        with self._lock:
+            path = self._path(namespace)
+            if path not in self._indexes:
+                self._indexes[path] = LocalVectorIndex(path, self.dimension)
+            return self._indexes[path]
+
+    def upsert_vectors(self, vectors: List[tuple], namespace: Optional[str] = None) -> UpsertResult:
+        return self.namespace_index(namespace).upsert_vectors(vectors)
+
+    def query(self, vector: List[float], top_k: int = 5, namespace: Optional[str] = None) -> List[VectorMatch]:
+        if not os.path.exists(self._path(namespace)):
+            return []
+        return self.namespace_index(namespace).query(vector, top_k=top_k)
+
+    def delete_namespace(self, namespace: str) -> bool:
+        """Delete every vector in one namespace."""
+        if not namespace:
+            # Only the default namespace's own files, not the other namespaces under it
+            return self.namespace_index(namespace).clear_index()
+        with self._lock:
+            path = self._path(namespace)
+            self._indexes.pop(path, None)
+            shutil.rmtree(path, ignore_errors=True)
+        logger.info(f"Local vector namespace '{namespace}' deleted.")
+        return True
+
+_local_backend: Optional[LocalVectorBackend] = None
+_local_backend_lock = threading.Lock()
+
+def vector_backend() -> str:
+    backend = settings.VECTOR_BACKEND
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"VECTOR_BACKEND must be one of {VECTOR_BACKENDS}, got '{backend}'")
+    if backend == "auto":
+        return "pinecone" if settings.PINECONE_API_KEY else "local"
+    return backend
+
+def get_local_backend() -> LocalVectorBackend:
+    global _local_backend
+    with _local_backend_lock:
+        if _local_backend is None:
+            from ai_engine.embeddings import EMBEDDING_DIMENSION
+            _local_backend = LocalVectorBackend(os.path.join(settings.VECTOR_INDEX_DIR, "youtube-avatar-index"),
+                                                EMBEDDING_DIMENSION)
+        return _local_backend
+
+def get_vector_index():
+    """
+    The index posts are upserted to and queried from: PineconeClient or
+    LocalVectorBackend, both with upsert_vectors / query / delete_namespace
+    taking a namespace.
+    """
+    if vector_backend() == "pinecone":
+        from ai_engine.pinecone_client import pinecone_client
+        return pinecone_client
+    return get_local_backend()
+
+def vector_sync_key(model_version: str, namespace: str) -> str:
+    """
+    Key the per-post sync state is stored under (PineconeVector.embedding_model),
+    so switching VECTOR_BACKEND or namespace re-upserts everything. The
+    default namespace keeps the key it had before namespaces existed.
+    """
+    backend = "" if vector_backend() == "pinecone" else "@local"
+    return f"{model_version}{backend}#{namespace}" if namespace else f"{model_version}{backend}"
@@ -0,0 +1,91 @@
+"""
+Parity check and throughput benchmark: PyTorch vs ONNX Runtime (fp32 and
+dynamic int8) for the sentiment and embedding models.
+
+Run from backend/:
+    python -m benchmarks.inference_backends --n 2000
+    python -m benchmarks.inference_backends --input path/to/watch-history.json
+
+Parity is reported as sentiment label agreement / max score difference and
+embedding cosine similarity against the PyTorch outputs.
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from ai_engine import sentiment, embeddings
+
+_WORDS = (
+    "official music video live reaction review tutorial how to build python guitar cover "
+    "highlights full match funny moments cooking recipe easy best worst ever trailer "
+    "explained history documentary podcast episode interview amazing terrible beginner"
+).split()
+
+def load_titles(path: str, n: int):
+    if path:
+        with open(path, encoding="utf-8") as f:
+            titles = [item["title"].replace("Watched ", "", 1) for item in json.load(f) if "title" in item]
+    else:
+        rng = random.Random(42)
+        titles = [" ".join(rng.choices(_WORDS, k=rng.randint(3, 14))) for _ in range(n)]
+    return (titles * (n // max(len(titles), 1) + 1))[:n]
+
+def bench_sentiment(titles, variants, batch_size):
+    print("\nSentiment (%s)" % sentiment.SENTIMENT_MODEL)
+    reference = None
+    for name, backend, quantize in variants:
+        analyzer = sentiment.load_analyzer(backend, quantize=quantize)
+        sentiment.analyze_sentiment_batched(titles[:batch_size], batch_size, analyzer=analyzer)  # warm up
+        start = time.perf_counter()
+        results, stats = sentiment.analyze_sentiment_batched(titles, batch_size, analyzer=analyzer)
+        elapsed = time.perf_counter() - start
+        if stats["fallback"]:
+            # Neutral placeholders would time an exception and "agree" with each other
+            raise SystemExit(f"{name}: sentiment inference failed (see the log above)")
+        line = f"  {name:<10} {len(titles) / elapsed:8.1f} texts/s"
+        if reference is None:
+            reference, base = results, elapsed
+        else:
+            agree = np.mean([a["label"] == b["label"] for a, b in zip(reference, results)])
+            diff = max(abs(a["score"] - b["score"]) for a, b in zip(reference, results))
+            line += f"  speedup x{base / elapsed:4.2f}  label agreement {agree:.2%}  max score diff {diff:.4f}"
+        print(line)
+
+def bench_embeddings(titles, variants, batch_size):
+    print("\nEmbeddings (%s)" % embeddings.MODEL_NAME)
+    reference = None
+    for name, backend, quantize in variants:
+        model = embeddings.load_model(backend, quantize=quantize)
+        model.encode(titles[:batch_size], batch_size=batch_size)  # warm up
+        start = time.perf_counter()
+        vectors = model.encode(titles, batch_size=batch_size, normalize_embeddings=True)
+        elapsed = time.perf_counter() - start
+        line = f"  {name:<10} {len(titles) / elapsed:8.1f} texts/s"
+        if reference is None:
+            reference, base = vectors, elapsed
+        else:
+            cosine = np.sum(reference * vectors, axis=1)
+            line += f"  speedup x{base / elapsed:4.2f}  cosine mean {cosine.mean():.4f} min {cosine.min():.4f}"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=2000, help="number of titles")
+    parser.add_argument("--input", help="Takeout watch-history.json to take titles from")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--skip-int8", action="store_true")
+    args = parser.parse_args()
+
+    titles = load_titles(args.input, args.n)
+    variants = [("torch", "torch", False), ("onnx", "onnx", False)]
+    if not args.skip_int8:
+        variants.append(("onnx-int8", "onnx", True))
+
+    bench_sentiment(titles, variants, args.batch_size)
+    bench_embeddings(titles, variants, args.batch_size)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Pinecone upsert throughput by concurrency, and how throttled or failing
+batches are retried and accounted for.
+
+By default the client talks to a simulated index: every request takes
+--latency-ms (plus jitter) and fails with a 429 with probability
+--throttle-rate, or with a 400 (not retried) with probability
+--error-rate. With --real it upserts into a throwaway namespace of the
+configured index and deletes it afterwards.
+
+Run from backend/:
+    python -m benchmarks.pinecone_upsert --n 20000 --concurrency 1 2 4 8
+    python -m benchmarks.pinecone_upsert --throttle-rate 0.2 --error-rate 0.01
+    python -m benchmarks.pinecone_upsert --real --n 2000
+"""
+import argparse
+import random
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from config.settings import settings
+from ai_engine.pinecone_client import PineconeClient
+
+class SimulatedError(Exception):
+    def __init__(self, status: int):
+        super().__init__(f"simulated HTTP {status}")
+        self.status = status
+
+class SimulatedIndex:
+    """Stands in for a pinecone Index: sleeps per request, sometimes fails."""
+
+    def __init__(self, latency_ms: float, throttle_rate: float, error_rate: float, seed: int = 0):
+        self.latency = latency_ms / 1000
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = self.throttled = self.errors = 0
+        self.stored = set()
+
+    def upsert(self, vectors, namespace=""):
+        with self.lock:
+            self.requests += 1
+            roll = self.rng.random()
+        time.sleep(self.latency * (0.8 + 0.4 * random.random()))
+        if roll < self.throttle_rate:
+            with self.lock:
+                self.throttled += 1
+            raise SimulatedError(429)
+        if roll < self.throttle_rate + self.error_rate:
+            with self.lock:
+                self.errors += 1
+            raise SimulatedError(400)
+        with self.lock:
+            self.stored.update(v[0] for v in vectors)
+
+def make_vectors(n: int, dimension: int):
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((n, dimension)).astype(np.float32)
+    return [(f"bench-{i}", data[i].tolist(), {"title": f"post {i}"}) for i in range(n)]
+
+def run(client: PineconeClient, vectors, chunk_size: int, namespace: str):
+    """Upsert in chunks the way the embeddings stage does; return (seconds, upserted, failed)."""
+    upserted = failed = 0
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), chunk_size):
+        result = client.upsert_vectors(vectors[offset:offset + chunk_size], namespace=namespace)
+        upserted += result.upserted
+        failed += len(result.failed_ids)
+    return time.perf_counter() - start, upserted, failed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--chunk-size", type=int, default=settings.POST_FETCH_CHUNK_SIZE,
+                        help="vectors per upsert_vectors call, as the embeddings stage sends them")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--latency-ms", type=float, default=60.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--real", action="store_true", help="upsert into a throwaway namespace of the real index")
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.n, args.dimension)
+    # Keep simulated retries short; the real index uses the configured backoff
+    if not args.real:
+        settings.PINECONE_RETRY_BACKOFF_SECONDS = min(settings.PINECONE_RETRY_BACKOFF_SECONDS, 0.05)
+
+    print(f"{args.n} vectors x {args.dimension}, {settings.PINECONE_UPSERT_BATCH_SIZE} per request, "
+          f"{settings.PINECONE_UPSERT_RETRIES} retries, "
+          + ("real index" if args.real else f"simulated {args.latency_ms:.0f} ms/request, "
+             f"{args.throttle_rate:.0%} throttled, {args.error_rate:.0%} rejected"))
+    print(f"  {'concurrency':>11} {'seconds':>8} {'vectors/s':>10} {'upserted':>9} {'failed':>7} {'requests':>9} {'429s':>6}")
+
+    baseline = None
+    for concurrency in args.concurrency:
+        settings.PINECONE_UPSERT_CONCURRENCY = concurrency
+        client = PineconeClient()
+        namespace = f"bench-{uuid.uuid4().hex[:8]}"
+        index = None
+        if not args.real:
+            index = SimulatedIndex(args.latency_ms, args.throttle_rate, args.error_rate)
+            client._index, client._connected = index, True
+        elif not client.index:
+            raise SystemExit("Pinecone is not configured (PINECONE_API_KEY)")
+        try:
+            seconds, upserted, failed = run(client, vectors, args.chunk_size, namespace)
+        finally:
+            if args.real:
+                client.delete_namespace(namespace)
+        rate = args.n / seconds
+        baseline = baseline or rate
+        requests = f"{index.requests:>9} {index.throttled:>6}" if index else f"{'-':>9} {'-':>6}"
+        print(f"  {concurrency:>11} {seconds:8.2f} {rate:10.0f} {upserted:>9} {failed:>7} {requests}"
+              f"   x{rate / baseline:.1f}")
+        if index and len(index.stored) != upserted:
+            raise SystemExit(f"accounting mismatch: {len(index.stored)} stored, {upserted} reported upserted")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Memory per API worker with and without loading the models before fork.
+
+Each mode runs in a fresh interpreter that starts N worker processes the
+way gunicorn does and, once every worker has run inference, reads
+/proc/<pid>/smaps_rollup for each of them:
+
+  preload   models loaded and pinned in the parent, gc.freeze(), then fork
+            (what gunicorn.conf.py does)
+  separate  workers forked from a bare parent, each loading its own models
+            (one uvicorn process per worker)
+
+Per worker it reports RSS, PSS (shared pages split between the processes
+sharing them) and USS (private pages: what one more worker really costs).
+
+Run from backend/ (Linux only):
+    python -m benchmarks.preload_memory --workers 4
+    python -m benchmarks.preload_memory --models sentiment,embeddings,whisper
+    python -m benchmarks.preload_memory --synthetic-mb 500   # no model weights needed
+"""
+import argparse
+import gc
+import json
+import os
+import signal
+import subprocess
+import sys
+
+from ai_engine.model_registry import model_registry
+
+_TITLES = [
+    "official music video", "how to build a python web app", "funny moments compilation",
+    "full match highlights", "easy pasta recipe", "history documentary explained",
+] * 20
+
+def register_synthetic(size_mb: int):
+    import numpy as np
+
+    # Stand-in "model": a few large read-only arrays, like a model's weights
+    def load():
+        rng = np.random.default_rng(0)
+        return [rng.random(size_mb * 1024 ** 2 // 8 // 4) for _ in range(4)]
+    model_registry.register("synthetic", load)
+
+def exercise(names):
+    """Run some inference (or at least a read of the weights) on each model."""
+    for name in names:
+        if name == "sentiment":
+            from ai_engine import sentiment
+            sentiment.analyze_sentiment_batched(_TITLES)
+        elif name == "embeddings":
+            from ai_engine import embeddings
+            embeddings.generate_embeddings(_TITLES)
+        else:
+            with model_registry.use(name) as model:
+                if name == "synthetic":
+                    sum(float(part.sum()) for part in model)
+
+def smaps_rollup(pid: int) -> dict:
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss": fields.get("Rss", 0.0),
+        "pss": fields.get("Pss", 0.0),
+        "uss": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+def run_mode(mode: str, names, workers: int) -> dict:
+    """Fork `workers` children in this process and measure them (runs in a child interpreter)."""
+    if mode == "preload":
+        for name in names:
+            model_registry.pin(name)
+        gc.freeze()
+
+    children = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            try:
+                exercise(names)
+                os.write(write_fd, b"1")
+            finally:
+                os.close(write_fd)
+            signal.pause()
+            os._exit(0)
+        os.close(write_fd)
+        children.append((pid, read_fd))
+
+    try:
+        for pid, read_fd in children:
+            if os.read(read_fd, 1) != b"1":
+                raise RuntimeError(f"worker {pid} failed")
+        return {
+            "mode": mode,
+            "parent": smaps_rollup(os.getpid()),
+            "workers": [smaps_rollup(pid) for pid, _ in children],
+        }
+    finally:
+        for pid, read_fd in children:
+            os.close(read_fd)
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--models", default="sentiment,embeddings")
+    parser.add_argument("--synthetic-mb", type=int, default=0,
+                        help="benchmark a synthetic model of this size instead of --models")
+    parser.add_argument("--mode", choices=("preload", "separate"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.models.split(",") if name.strip()]
+    if args.synthetic_mb:
+        register_synthetic(args.synthetic_mb)
+        names = ["synthetic"]
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, names, args.workers)))
+        return
+
+    print(f"{args.workers} workers, models: {', '.join(names)}"
+          + (f" ({args.synthetic_mb} MB)" if args.synthetic_mb else ""))
+    print(f"  {'mode':<9} {'parent RSS':>10} {'worker RSS':>10} {'PSS':>8} {'USS':>8} {'total PSS':>10}")
+    uss = {}
+    for mode in ("separate", "preload"):
+        out = subprocess.run([sys.executable, "-m", "benchmarks.preload_memory", *sys.argv[1:], "--mode", mode],
+                             capture_output=True, text=True)
+        if out.returncode != 0:
+            raise SystemExit(f"{mode} run failed:\n{out.stderr}")
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        per_worker = {key: sum(w[key] for w in result["workers"]) / len(result["workers"]) for key in ("rss", "pss", "uss")}
+        total_pss = result["parent"]["pss"] + sum(w["pss"] for w in result["workers"])
+        uss[mode] = per_worker["uss"]
+        print(f"  {mode:<9} {result['parent']['rss']:8.0f}MB {per_worker['rss']:8.0f}MB "
+              f"{per_worker['pss']:6.0f}MB {per_worker['uss']:6.0f}MB {total_pss:8.0f}MB")
+    if uss["separate"] > 0:
+        print(f"\nEach extra worker costs {uss['preload']:.0f} MB private memory with preload "
+              f"vs {uss['separate']:.0f} MB without ({uss['preload'] / uss['separate']:.0%}).")
+
+if __name__ == "__main__":
+    main()
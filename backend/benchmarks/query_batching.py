@@ -0,0 +1,120 @@
+"""
+Query encoding under concurrent chat load: one model.encode per query (as
+before micro-batching) vs the EncodeBatcher behind embeddings.encode_text.
+
+Each of C client threads sends --requests queries back to back, like C
+users chatting at once; throughput and per-query latency are reported for
+each concurrency level and mode.
+
+Run from backend/:
+    python -m benchmarks.query_batching --concurrency 1 4 16 32
+    python -m benchmarks.query_batching --max-wait-ms 0 2 5
+    python -m benchmarks.query_batching --synthetic   # no model weights needed
+
+--synthetic replaces the model with a numpy MLP of similar size (6 layers
+of 384x1536) over one pooled token per text, so, like a small transformer
+on a short query, a call's cost is mostly reading the weights.
+"""
+import argparse
+import random
+import threading
+import time
+
+import numpy as np
+
+from config.settings import settings
+from ai_engine import embeddings
+from ai_engine.model_registry import model_registry
+
+_WORDS = (
+    "what do i watch most why do i like music videos which channels changed my mood "
+    "when did i start cooking videos am i watching more football than last year"
+).split()
+
+class SyntheticEncoder:
+    def __init__(self, dimension: int = embeddings.EMBEDDING_DIMENSION, layers: int = 6, tokens: int = 1):
+        rng = np.random.default_rng(0)
+        self.tokens = tokens
+        self.dimension = dimension
+        self.layers = [(rng.standard_normal((dimension, dimension * 4), dtype=np.float32) * 0.05,
+                        rng.standard_normal((dimension * 4, dimension), dtype=np.float32) * 0.05)
+                       for _ in range(layers)]
+
+    def encode(self, texts, batch_size: int = 32):
+        single = isinstance(texts, str)
+        texts = [texts] if single else texts
+        seed = np.array([hash(t) % 1000 for t in texts], dtype=np.float32)
+        h = np.tile(seed[:, None, None] / 1000, (1, self.tokens, self.dimension))
+        for up, down in self.layers:
+            h = h + np.maximum(h @ up, 0) @ down
+        vectors = h.mean(axis=1)
+        return vectors[0] if single else vectors
+
+def make_queries(n: int):
+    rng = random.Random(7)
+    return [" ".join(rng.choices(_WORDS, k=rng.randint(4, 12))) for _ in range(n)]
+
+def run_load(encode, concurrency: int, queries):
+    """C threads each encoding its share of `queries` sequentially; returns (seconds, latencies)."""
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency + 1)
+
+    def client(share):
+        barrier.wait()
+        mine = []
+        for text in share:
+            start = time.perf_counter()
+            encode(text)
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(queries[i::concurrency],)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--requests", type=int, default=50, help="queries per client thread")
+    parser.add_argument("--max-batch-size", type=int, default=settings.EMBED_BATCH_MAX_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, nargs="+", default=[settings.EMBED_BATCH_MAX_WAIT_MS])
+    parser.add_argument("--synthetic", action="store_true", help="use a synthetic model instead of %s" % embeddings.MODEL_NAME)
+    args = parser.parse_args()
+
+    model_name = "embeddings"
+    if args.synthetic:
+        model_name = "synthetic_embeddings"
+        model_registry.register(model_name, SyntheticEncoder)
+
+    with model_registry.use(model_name) as model:
+        model.encode(make_queries(8))  # warm up
+
+        def unbatched(text):
+            return model.encode(text)
+
+        print(f"{'synthetic model' if args.synthetic else embeddings.MODEL_VERSION}, "
+              f"max batch {args.max_batch_size}, {args.requests} queries per client")
+        print(f"  {'clients':>7} {'mode':<16} {'queries/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'avg batch':>9}")
+        for concurrency in args.concurrency:
+            queries = make_queries(concurrency * args.requests)
+            seconds, latencies = run_load(unbatched, concurrency, queries)
+            base = len(queries) / seconds
+            print(f"  {concurrency:>7} {'one per query':<16} {base:10.0f} "
+                  f"{np.percentile(latencies, 50) * 1000:8.2f} {np.percentile(latencies, 99) * 1000:8.2f} {1:9.1f}")
+            for max_wait_ms in args.max_wait_ms:
+                batcher = embeddings.EncodeBatcher(args.max_batch_size, max_wait_ms, model_name=model_name)
+                seconds, latencies = run_load(lambda text: batcher.submit(text).result(), concurrency, queries)
+                rate = len(queries) / seconds
+                print(f"  {concurrency:>7} {'batched %gms' % max_wait_ms:<16} {rate:10.0f} "
+                      f"{np.percentile(latencies, 50) * 1000:8.2f} {np.percentile(latencies, 99) * 1000:8.2f} "
+                      f"{batcher.encoded / max(batcher.batches, 1):9.1f}   x{rate / base:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Cold-start benchmark: how long a fresh interpreter takes to import the API
+(`import main`, which builds the app) and which heavy libraries that pulls
+in. Every run is a new subprocess, so nothing is cached in-process.
+
+Run from backend/:
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --top 15   # slowest imports via -X importtime
+
+Heavy modules listed as imported at startup mean something is no longer
+lazy; they should only load on first use or in the background warm-up.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("torch", "transformers", "sentence_transformers", "whisper", "sklearn",
+                 "scipy", "groq", "pinecone", "soundfile", "onnxruntime", "optimum")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+heavy = sorted(m for m in %r if m in sys.modules)
+print(json.dumps({"seconds": elapsed, "heavy": heavy, "modules": len(sys.modules)}))
+""" % (HEAVY_MODULES,)
+
+def probe() -> dict:
+    proc = subprocess.run([sys.executable, "-c", _PROBE], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"import main failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def slowest_imports(top: int):
+    """Parse `-X importtime` output and return the top cumulative entries."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:   self_us |   cumulative_us | name"
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest imports")
+    args = parser.parse_args()
+
+    results = [probe() for _ in range(args.runs)]
+    times = [r["seconds"] for r in results]
+    print(f"import main: median {statistics.median(times):.3f}s  min {min(times):.3f}s  "
+          f"max {max(times):.3f}s  over {args.runs} runs  ({results[-1]['modules']} modules)")
+    heavy = results[-1]["heavy"]
+    print("heavy modules imported at startup: " + (", ".join(heavy) if heavy else "none"))
+
+    if args.top:
+        print("\nSlowest imports (cumulative):")
+        for cumulative_us, self_us, name in slowest_imports(args.top):
+            print(f"  {cumulative_us / 1e6:7.3f}s  {name}")
+
+if __name__ == "__main__":
+    main()
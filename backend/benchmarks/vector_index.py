@@ -0,0 +1,110 @@
+"""
+Local vector index benchmark: build time, reload time, top-k query latency
+and recall of the IVF index against exact search.
+
+Vectors are synthetic (noisy copies of random topic centres, roughly how
+title embeddings cluster), so no model is needed.
+
+Run from backend/:
+    python -m benchmarks.vector_index --n 100000
+    python -m benchmarks.vector_index --n 100000 --nprobe 4 16
+
+Measured with --n 100000 --nprobe 4 8 16 (384 dimensions, 5000 vectors
+per upsert, 509 IVF lists) on a 1 vCPU Xeon VM with numpy 2.4. Build took
+8.3-8.5 s; upserts without retraining took about 0.1 s each. Reload took
+0.7 s and an exact scan 19-20 ms/query. p99 varied 2x between runs on
+this machine:
+    nprobe  4: p50 0.51 ms  p99 1.1-2.7 ms  recall@10 0.936
+    nprobe  8: p50 0.73 ms  p99 1.4-2.4 ms  recall@10 0.949
+    nprobe 16: p50 1.13 ms  p99 1.8-2.8 ms  recall@10 0.964
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from config.settings import settings
+from ai_engine.vector_index import LocalVectorIndex
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def synthetic_vectors(n: int, dimension: int, topics: int, seed: int = 0) -> np.ndarray:
+    """
+    Topics, each with a spread of sub-topics, each with noisy members. The
+    topic structure is fixed and only the sampling depends on `seed`, so
+    queries come from the same distribution as the indexed vectors.
+    """
+    structure = np.random.default_rng(12345)
+    centres = _normalize(structure.standard_normal((topics, dimension)).astype(np.float32))
+    subtopics = topics * 10
+    sub_centres = _normalize(centres[structure.integers(0, topics, subtopics)]
+                             + 0.08 * structure.standard_normal((subtopics, dimension)).astype(np.float32))
+    rng = np.random.default_rng(seed)
+    return _normalize(sub_centres[rng.integers(0, subtopics, n)]
+                      + 0.04 * rng.standard_normal((n, dimension)).astype(np.float32))
+
+def percentile_ms(samples, q):
+    return np.percentile(samples, q) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--chunk-size", type=int, default=settings.POST_FETCH_CHUNK_SIZE,
+                        help="vectors per upsert, as the embeddings stage sends them")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[settings.VECTOR_INDEX_NPROBE])
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.n, args.dimension, args.topics)
+    queries = synthetic_vectors(args.queries, args.dimension, args.topics, seed=1)
+    ids = [f"post-{i}" for i in range(args.n)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = LocalVectorIndex(directory, args.dimension)
+        start = time.perf_counter()
+        upserts = []
+        for offset in range(0, args.n, args.chunk_size):
+            batch = [(ids[i], vectors[i], {"title": ids[i]}) for i in range(offset, min(offset + args.chunk_size, args.n))]
+            upsert_start = time.perf_counter()
+            if not index.upsert_vectors(batch):
+                raise SystemExit("upsert failed")
+            upserts.append(time.perf_counter() - upsert_start)
+        print(f"{args.n} vectors x {args.dimension}: built in {time.perf_counter() - start:.1f}s "
+              f"({args.chunk_size} per upsert; median {np.median(upserts):.2f}s, last {upserts[-1]:.2f}s, "
+              f"slowest {max(upserts):.2f}s)")
+
+        start = time.perf_counter()
+        index = LocalVectorIndex(directory, args.dimension)
+        print(f"reloaded from disk in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        exact = [np.argsort(-(vectors @ q))[:args.top_k] for q in queries]
+        exact_ids = [{ids[i] for i in rows} for rows in exact]
+
+        start = time.perf_counter()
+        for q in queries[:100]:
+            np.argpartition(-(vectors @ q), args.top_k)[:args.top_k]
+        print(f"\nexact scan (numpy, in RAM): {(time.perf_counter() - start) * 10:.2f} ms/query")
+
+        ivf = index._snapshot.centroids is not None
+        print(f"index: {'IVF, %d lists' % len(index._snapshot.centroids) if ivf else 'exact'}")
+        for nprobe in args.nprobe:
+            settings.VECTOR_INDEX_NPROBE = nprobe
+            for q in queries[:20]:
+                index.query(q, args.top_k) # warm up
+            latencies, hits = [], 0
+            for q, expected in zip(queries, exact_ids):
+                start = time.perf_counter()
+                matches = index.query(q, args.top_k)
+                latencies.append(time.perf_counter() - start)
+                hits += len(expected & {m.id for m in matches})
+            print(f"  nprobe {nprobe:>3}: p50 {percentile_ms(latencies, 50):.3f} ms  "
+                  f"p99 {percentile_ms(latencies, 99):.3f} ms  "
+                  f"recall@{args.top_k} {hits / (args.top_k * len(queries)):.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -9,9 +9,15 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 def init_db():
-    """Create all tables if they don't exist."""
+    """Create all tables if they don't exist and upgrade older ones."""
     from database import models  # noqa: F401 – ensure models are imported so Base knows about them
-    Base.metadata.create_all(bind=engine)
+    from database.locks import lock_schema
+    from database.migrations import upgrade_schema
+    # One transaction, so workers starting together run it one at a time
+    with engine.begin() as conn:
+        lock_schema(conn)
+        Base.metadata.create_all(bind=conn)
+        upgrade_schema(conn)
 
 def get_db():
     db = SessionLocal()
@@ -13,6 +13,46 @@ class Settings(BaseSettings):
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:3000")
     BACKEND_URL: str = os.getenv("BACKEND_URL", "http://localhost:8000")
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    UPLOAD_WORKERS: int = int(os.getenv("UPLOAD_WORKERS", "2"))
+    UPLOAD_BATCH_SIZE: int = int(os.getenv("UPLOAD_BATCH_SIZE", "1000"))
+    PARSE_WORKERS: int = int(os.getenv("PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PARSE_PARALLEL_MIN_BYTES: int = int(os.getenv("PARSE_PARALLEL_MIN_BYTES", str(8 * 1024 ** 2)))
+    POST_FETCH_CHUNK_SIZE: int = int(os.getenv("POST_FETCH_CHUNK_SIZE", "5000"))
+    POST_INSERT_BATCH_SIZE: int = int(os.getenv("POST_INSERT_BATCH_SIZE", "5000"))
+    MAX_ARCHIVE_MEMBER_BYTES: int = int(os.getenv("MAX_ARCHIVE_MEMBER_BYTES", str(2 * 1024 ** 3)))
+    MAX_ARCHIVE_TOTAL_BYTES: int = int(os.getenv("MAX_ARCHIVE_TOTAL_BYTES", str(4 * 1024 ** 3)))
+    SENTIMENT_BATCH_SIZE: int = int(os.getenv("SENTIMENT_BATCH_SIZE", "32"))
+    TORCH_NUM_THREADS: int = int(os.getenv("TORCH_NUM_THREADS", "0")) # process-wide, shared by every torch model; 0 = torch default
+    INFERENCE_BACKEND: str = os.getenv("INFERENCE_BACKEND", "torch") # torch, onnx
+    ONNX_QUANTIZE: bool = os.getenv("ONNX_QUANTIZE", "True").lower() == "true" # dynamic int8 (onnx backend only)
+    ONNX_QUANT_TARGET: str = os.getenv("ONNX_QUANT_TARGET", "avx2") # arm64, avx2, avx512, avx512_vnni
+    ONNX_CACHE_DIR: str = os.getenv("ONNX_CACHE_DIR", os.path.join("data", "onnx"))
+    EMBED_BATCH_MAX_SIZE: int = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32")) # chat queries encoded together
+    EMBED_BATCH_MAX_WAIT_MS: float = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "2")) # wait for more queries before encoding
+    EMBEDDING_STORE_DIR: str = os.getenv("EMBEDDING_STORE_DIR", os.path.join("data", "embeddings"))
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "auto") # auto, pinecone, local
+    VECTOR_INDEX_DIR: str = os.getenv("VECTOR_INDEX_DIR", os.path.join("data", "vector_index"))
+    VECTOR_INDEX_EXACT_MAX: int = int(os.getenv("VECTOR_INDEX_EXACT_MAX", "10000")) # above this, search an IVF index
+    VECTOR_INDEX_NPROBE: int = int(os.getenv("VECTOR_INDEX_NPROBE", "8")) # IVF lists scanned per query
+    PINECONE_UPSERT_BATCH_SIZE: int = int(os.getenv("PINECONE_UPSERT_BATCH_SIZE", "100")) # vectors per upsert request
+    PINECONE_UPSERT_CONCURRENCY: int = int(os.getenv("PINECONE_UPSERT_CONCURRENCY", "4")) # upsert requests in flight
+    PINECONE_UPSERT_RETRIES: int = int(os.getenv("PINECONE_UPSERT_RETRIES", "3")) # retries of a throttled or failed batch
+    PINECONE_RETRY_BACKOFF_SECONDS: float = float(os.getenv("PINECONE_RETRY_BACKOFF_SECONDS", "0.5")) # first retry delay, doubled each time
+    PINECONE_RECONNECT_SECONDS: float = float(os.getenv("PINECONE_RECONNECT_SECONDS", "30")) # wait before retrying a failed connect
+    CLUSTER_MIN_K: int = int(os.getenv("CLUSTER_MIN_K", "3"))
+    CLUSTER_MAX_K: int = int(os.getenv("CLUSTER_MAX_K", "12"))
+    CLUSTER_SAMPLE_SIZE: int = int(os.getenv("CLUSTER_SAMPLE_SIZE", "5000")) # texts used to pick k
+    CLUSTER_BATCH_SIZE: int = int(os.getenv("CLUSTER_BATCH_SIZE", "4096"))
+    ANALYSIS_STAGE_WORKERS: int = int(os.getenv("ANALYSIS_STAGE_WORKERS", "3"))
+    ANALYSIS_EXECUTOR: str = os.getenv("ANALYSIS_EXECUTOR", "thread") # thread, process
+    ANALYSIS_MAX_CONCURRENT_JOBS: int = int(os.getenv("ANALYSIS_MAX_CONCURRENT_JOBS", "1"))
+    ANALYSIS_POLL_SECONDS: float = float(os.getenv("ANALYSIS_POLL_SECONDS", "2")) # how often workers look for jobs queued elsewhere
+    MODEL_MEMORY_BUDGET_MB: int = int(os.getenv("MODEL_MEMORY_BUDGET_MB", "0")) # per worker process; 0 = half of RAM split across WEB_CONCURRENCY, -1 = no limit
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", "1")) # API worker processes (set by gunicorn.conf.py)
+    WARMUP_MODELS: str = os.getenv("WARMUP_MODELS", "sentiment,embeddings") # also: whisper, f5_tts, pinecone; empty = load on first use
+    PRELOAD_MODELS: str = os.getenv("PRELOAD_MODELS", "sentiment,embeddings") # loaded before forking (gunicorn.conf.py)
+    RESUME_INTERRUPTED_JOBS: bool = os.getenv("RESUME_INTERRUPTED_JOBS", "True").lower() == "true" # pick up jobs whose worker died mid-run
+    IO_WORKERS: int = int(os.getenv("IO_WORKERS", "8"))
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
 
     class Config:
@@ -1,14 +1,23 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Optional
-from uuid import UUID
+from sqlalchemy import func, select, tuple_
+from collections import namedtuple
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import List, Optional, Dict, Any, Tuple, Union, Iterator
+from uuid import UUID, uuid4
 from datetime import datetime
+from config.settings import settings
 from database import models
-from database.models import UploadMetadata, Post, AnalysisJob, AnalysisResult, Topic, Conversation
+from database.models import (
+    UploadMetadata, Post, AnalysisJob, AnalysisResult, Topic, TopicPost, Conversation, SentimentTimeseries, PineconeVector,
+    VectorNamespace
+)
+from database import locks
+from parsers.columnar import PostColumns
 
 # --- Upload Metadata ---
-def create_upload_metadata(db: Session, file_name: str, file_size: int) -> UploadMetadata:
-    db_obj = UploadMetadata(file_name=file_name, file_size=file_size)
+def create_upload_metadata(db: Session, file_name: str, file_size: int, upload_mode: str = 'replace',
+                           upload_id: Optional[UUID] = None) -> UploadMetadata:
+    db_obj = UploadMetadata(id=upload_id or uuid4(), file_name=file_name, file_size=file_size, upload_mode=upload_mode)
     db.add(db_obj)
     db.commit()
     db.refresh(db_obj)
@@ -23,6 +32,33 @@ def update_upload_metadata(db: Session, upload_id: UUID, **kwargs) -> UploadMeta
         db.refresh(db_obj)
     return db_obj
 
+def get_latest_upload_metadata(db: Session) -> Optional[UploadMetadata]:
+    return db.query(UploadMetadata).order_by(UploadMetadata.uploaded_at.desc()).first()
+
+def get_data_version(db: Session) -> Optional[datetime]:
+    """When the posts last changed: the latest upload's parse (or start) time, None before any upload."""
+    upload = get_latest_upload_metadata(db)
+    return (upload.parsed_at or upload.uploaded_at) if upload else None
+
+def get_active_uploads(db: Session) -> List[UploadMetadata]:
+    """
+    Uploads a live worker is still ingesting: 'parsing' and locked by the
+    ingest job (see database/locks.py). 'parsing' rows nobody holds were
+    left by a worker that died mid-ingest and are marked failed.
+    """
+    parsing = db.query(UploadMetadata).filter(UploadMetadata.upload_status == 'parsing').all()
+    if not parsing:
+        return []
+    held = locks.held_record_keys(db)
+    active = [upload for upload in parsing if locks.record_key(upload.id) in held]
+    for upload in parsing:
+        if upload not in active:
+            upload.upload_status = 'failed'
+            upload.error_message = 'Ingest interrupted'
+    if len(active) < len(parsing):
+        db.flush()
+    return active
+
 # --- Posts ---
 def get_post_by_hash(db: Session, content_hash: str) -> Optional[Post]:
     return db.query(Post).filter(Post.content_hash == content_hash).first()
@@ -34,9 +70,226 @@ def create_post(db: Session, post_data: dict) -> Post:
     db.refresh(db_obj)
     return db_obj
 
+def bulk_insert_posts(db: Session, posts: Union[List[Dict[str, Any]], PostColumns], upload_id: Optional[UUID] = None,
+                      batch_size: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Insert posts in large multi-row batches, letting the unique content_hash
+    index skip rows that already exist (ON CONFLICT DO NOTHING).
+    Accepts either post dicts or a columnar batch straight from the parser.
+    Newly inserted rows are tagged with `upload_id`, so the posts an upload
+    actually added can be found later; skipped rows keep their original tag.
+    Returns (new_count, skipped_count).
+    """
+    batch_size = batch_size or settings.POST_INSERT_BATCH_SIZE
+    stmt = (
+        pg_insert(Post)
+        .on_conflict_do_nothing(index_elements=[Post.content_hash])
+        .returning(Post.id)
+    )
+    total = len(posts)
+    new_count = 0
+    try:
+        for start in range(0, total, batch_size):
+            chunk = posts[start:start + batch_size] if isinstance(posts, list) else posts.filter(slice(start, start + batch_size))
+            n = len(chunk)
+            now = datetime.utcnow()
+            extra = {
+                "id": [uuid4() for _ in range(n)],
+                "uploaded_at": [now] * n,
+                "upload_id": [upload_id] * n,
+                "is_deleted": [False] * n,
+            }
+            if isinstance(chunk, PostColumns):
+                rows = chunk.to_rows(extra)
+            else:
+                rows = [dict(post_data, **{k: v[i] for k, v in extra.items()}) for i, post_data in enumerate(chunk)]
+            new_count += len(db.execute(stmt, rows).all())
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise e
+    return new_count, total - new_count
+
 def get_all_posts(db: Session, skip: int = 0, limit: int = 10000) -> List[Post]:
     return db.query(Post).filter(Post.is_deleted == False).offset(skip).limit(limit).all()
 
+def count_posts(db: Session) -> int:
+    return db.query(func.count(Post.id)).filter(Post.is_deleted == False).scalar()
+
+# The post fields the analysis pipeline reads; plain tuples, not ORM objects
+PostRecord = namedtuple("PostRecord", ["id", "title", "channel_name", "watch_date", "content_hash"])
+
+def iter_post_records(db: Session, chunk_size: Optional[int] = None) -> Iterator[List[PostRecord]]:
+    """
+    Stream every live post as chunks of PostRecord, in (uploaded_at, id)
+    order. Keyset pagination: each page is a fresh indexed range query
+    starting after the last row seen, so memory stays at one chunk, there
+    is no row cap, and callers may commit on the same session between
+    chunks.
+    """
+    chunk_size = chunk_size or settings.POST_FETCH_CHUNK_SIZE
+    base = select(
+        Post.id, Post.title, Post.channel_name, Post.watch_date, Post.content_hash, Post.uploaded_at
+    ).where(Post.is_deleted == False).order_by(Post.uploaded_at, Post.id).limit(chunk_size)
+
+    last_key = None
+    while True:
+        stmt = base if last_key is None else base.where(tuple_(Post.uploaded_at, Post.id) > last_key)
+        rows = db.execute(stmt).all()
+        if not rows:
+            return
+        yield [PostRecord(row.id, row.title, row.channel_name, row.watch_date, row.content_hash) for row in rows]
+        if len(rows) < chunk_size:
+            return
+        last_key = (rows[-1].uploaded_at, rows[-1].id)
+
+# --- Sentiment ---
+def get_post_sentiments(db: Session, model_version: str,
+                        post_ids: Optional[List[UUID]] = None) -> Dict[UUID, Dict[str, Any]]:
+    """
+    Cached per-post sentiment for one model version: {post_id: {'label', 'score'}}.
+    Restricted to `post_ids` when given.
+    """
+    query = db.query(
+        SentimentTimeseries.post_id, SentimentTimeseries.sentiment_label, SentimentTimeseries.sentiment_score
+    ).filter(SentimentTimeseries.model_version == model_version)
+    if post_ids is not None:
+        query = query.filter(SentimentTimeseries.post_id.in_(post_ids))
+    rows = query.all()
+    return {row.post_id: {"label": row.sentiment_label, "score": row.sentiment_score} for row in rows}
+
+def bulk_insert_sentiments(db: Session, scored: List[Tuple[Post, Dict[str, Any]]], model_version: str,
+                           batch_size: Optional[int] = None) -> int:
+    """
+    Persist (post, {'label', 'score'}) pairs for `model_version` with the
+    time-of-day fields used by the mood charts. Posts that already have a
+    score for this version are left untouched. Returns the inserted count.
+    """
+    batch_size = batch_size or settings.POST_INSERT_BATCH_SIZE
+    stmt = (
+        pg_insert(SentimentTimeseries)
+        .on_conflict_do_nothing(index_elements=[SentimentTimeseries.post_id, SentimentTimeseries.model_version])
+        .returning(SentimentTimeseries.id)
+    )
+    rows = []
+    for post, result in scored:
+        watched = post.watch_date
+        rows.append({
+            "id": uuid4(),
+            "post_id": post.id,
+            "model_version": model_version,
+            "sentiment_score": float(result["score"]),
+            "sentiment_label": result["label"],
+            "date_bucket": watched.replace(hour=0, minute=0, second=0, microsecond=0) if watched else None,
+            "day_of_week": watched.strftime("%A") if watched else None,
+            "hour_of_day": watched.hour if watched else None,
+        })
+    try:
+        inserted = 0
+        for start in range(0, len(rows), batch_size):
+            inserted += len(db.execute(stmt, rows[start:start + batch_size]).all())
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise e
+    return inserted
+
+# --- Vector Sync ---
+def get_synced_post_ids(db: Session, embedding_model: str, post_ids: Optional[List[UUID]] = None) -> set:
+    """Posts (among `post_ids`, if given) whose vector for `embedding_model` is already in the vector index."""
+    query = db.query(PineconeVector.post_id).filter(
+        PineconeVector.embedding_model == embedding_model, PineconeVector.is_synced == True
+    )
+    if post_ids is not None:
+        query = query.filter(PineconeVector.post_id.in_(post_ids))
+    rows = query.all()
+    return {row.post_id for row in rows}
+
+def mark_vectors_synced(db: Session, post_ids: List[UUID], embedding_model: str, is_synced: bool = True,
+                        embedding_dimension: int = 384, batch_size: Optional[int] = None):
+    """Record the Pinecone sync state of each post's vector (one row per post)."""
+    batch_size = batch_size or settings.POST_INSERT_BATCH_SIZE
+    stmt = pg_insert(PineconeVector)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PineconeVector.post_id],
+        set_={
+            "pinecone_vector_id": stmt.excluded.pinecone_vector_id,
+            "embedding_model": stmt.excluded.embedding_model,
+            "embedding_dimension": stmt.excluded.embedding_dimension,
+            "is_synced": stmt.excluded.is_synced,
+            "synced_at": stmt.excluded.synced_at,
+        }
+    )
+    now = datetime.utcnow()
+    rows = [{
+        "id": uuid4(),
+        "post_id": post_id,
+        "pinecone_vector_id": str(post_id),
+        "embedding_model": embedding_model,
+        "embedding_dimension": embedding_dimension,
+        "is_synced": is_synced,
+        "synced_at": now if is_synced else None,
+    } for post_id in post_ids]
+    try:
+        for start in range(0, len(rows), batch_size):
+            db.execute(stmt, rows[start:start + batch_size])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise e
+
+def count_synced_vectors(db: Session, embedding_model: str) -> int:
+    return db.query(func.count(PineconeVector.id)).filter(
+        PineconeVector.embedding_model == embedding_model, PineconeVector.is_synced == True
+    ).scalar()
+
+# --- Vector Namespaces ---
+# The first namespace is the index's default ("") one, where vectors were
+# upserted before namespaces existed, so an upgraded deployment keeps its
+# vectors (and their sync state, see vector_sync_key) instead of re-upserting
+DEFAULT_VECTOR_NAMESPACE = ""
+
+def create_vector_namespace(db: Session, name: str, upload_id: Optional[UUID] = None,
+                            commit: bool = True) -> VectorNamespace:
+    db_obj = VectorNamespace(name=name, upload_id=upload_id)
+    db.merge(db_obj)
+    if commit:
+        db.commit()
+    return db_obj
+
+def get_write_vector_namespace(db: Session) -> str:
+    """Namespace new vectors go to: the newest one (DEFAULT_VECTOR_NAMESPACE until the first replace upload)."""
+    newest = db.query(VectorNamespace).order_by(VectorNamespace.created_at.desc()).first()
+    if newest is None:
+        newest = create_vector_namespace(db, DEFAULT_VECTOR_NAMESPACE)
+    return newest.name
+
+def get_query_vector_namespace(db: Session) -> Optional[str]:
+    """Namespace to search: the newest live one, else the newest one still filling."""
+    live = db.query(VectorNamespace).filter(VectorNamespace.live_at.isnot(None)) \
+        .order_by(VectorNamespace.live_at.desc()).first()
+    if live is not None:
+        return live.name
+    newest = db.query(VectorNamespace).order_by(VectorNamespace.created_at.desc()).first()
+    return newest.name if newest else None
+
+def mark_vector_namespace_live(db: Session, name: str) -> List[str]:
+    """Swap `name` in for queries. Returns the older namespaces it replaces."""
+    namespace = db.query(VectorNamespace).filter(VectorNamespace.name == name).first()
+    if namespace is None:
+        return []
+    if namespace.live_at is None:
+        namespace.live_at = datetime.utcnow()
+        db.commit()
+    stale = db.query(VectorNamespace.name).filter(
+        VectorNamespace.name != name, VectorNamespace.created_at <= namespace.created_at
+    ).all()
+    return [row.name for row in stale]
+
+def delete_vector_namespace(db: Session, name: str):
+    db.query(VectorNamespace).filter(VectorNamespace.name == name).delete()
+    db.commit()
+
 # --- Analysis Jobs ---
 def create_analysis_job(db: Session) -> AnalysisJob:
     db_obj = AnalysisJob()
@@ -69,6 +322,17 @@ def create_analysis_result(db: Session, job_id: UUID, analysis_type: str, result
     db.refresh(db_obj)
     return db_obj
 
+def upsert_analysis_result(db: Session, job_id: UUID, analysis_type: str, result_data: dict) -> AnalysisResult:
+    """Like create_analysis_result, but replaces the job's existing result of that type (safe to re-run)."""
+    db_obj = get_analysis_result(db, job_id, analysis_type)
+    if db_obj is None:
+        return create_analysis_result(db, job_id, analysis_type, result_data)
+    db_obj.result_data = result_data
+    db_obj.generated_at = datetime.utcnow()
+    db.commit()
+    db.refresh(db_obj)
+    return db_obj
+
 def get_analysis_results(db: Session, job_id: UUID) -> List[AnalysisResult]:
     return db.query(AnalysisResult).filter(AnalysisResult.analysis_job_id == job_id).all()
 
@@ -78,6 +342,87 @@ def get_analysis_result(db: Session, job_id: UUID, analysis_type: str) -> Option
         AnalysisResult.analysis_type == analysis_type
     ).first()
 
+# --- Stage Checkpoints ---
+CHECKPOINT_PREFIX = "checkpoint:"
+
+def save_stage_checkpoint(db: Session, job_id: UUID, stage: str, status: str, output: Any = None,
+                          error: Optional[str] = None, data_version: Optional[str] = None) -> AnalysisResult:
+    """
+    Record a pipeline stage's status ('completed' / 'failed') and, once
+    completed, its output, computed from the posts as of `data_version`.
+    """
+    return upsert_analysis_result(db, job_id, f"{CHECKPOINT_PREFIX}{stage}", {
+        "status": status,
+        "output": output,
+        "error": error,
+        "data_version": data_version,
+        "updated_at": datetime.utcnow().isoformat(),
+    })
+
+def get_stage_checkpoints(db: Session, job_id: UUID) -> Dict[str, Dict[str, Any]]:
+    """{stage_name: checkpoint_data} for every stage the job has checkpointed."""
+    rows = db.query(AnalysisResult).filter(
+        AnalysisResult.analysis_job_id == job_id,
+        AnalysisResult.analysis_type.startswith(CHECKPOINT_PREFIX)
+    ).all()
+    return {row.analysis_type[len(CHECKPOINT_PREFIX):]: row.result_data for row in rows}
+
+def get_analysis_jobs_by_status(db: Session, statuses: List[str]) -> List[AnalysisJob]:
+    """Jobs in any of `statuses`, oldest first (the analysis queue order)."""
+    return db.query(AnalysisJob).filter(
+        AnalysisJob.status.in_(statuses)
+    ).order_by(AnalysisJob.created_at.asc()).all()
+
+def delete_topics_for_job(db: Session, job_id: UUID):
+    topic_ids = db.query(Topic.id).filter(Topic.analysis_job_id == job_id)
+    db.query(TopicPost).filter(TopicPost.topic_id.in_(topic_ids)).delete(synchronize_session=False)
+    db.query(Topic).filter(Topic.analysis_job_id == job_id).delete(synchronize_session=False)
+    db.commit()
+
+# --- Topics ---
+def create_topics(db: Session, job_id: UUID, topics: List[Dict[str, Any]], batch_size: Optional[int] = None) -> List[UUID]:
+    """
+    Bulk insert the topics of a job and their post memberships.
+    Each topic dict has 'topic_name', 'post_ids' and optionally
+    'topic_description' / 'confidence_score'. Returns the new topic ids.
+    """
+    batch_size = batch_size or settings.POST_INSERT_BATCH_SIZE
+    topic_rows = []
+    membership_rows = []
+    for topic in topics:
+        topic_id = uuid4()
+        topic_rows.append({
+            "id": topic_id,
+            "analysis_job_id": job_id,
+            "topic_name": topic["topic_name"],
+            "topic_description": topic.get("topic_description"),
+            "confidence_score": topic.get("confidence_score"),
+            "post_count": len(topic["post_ids"]),
+        })
+        membership_rows.extend({"topic_id": topic_id, "post_id": post_id} for post_id in topic["post_ids"])
+    try:
+        if topic_rows:
+            db.execute(pg_insert(Topic), topic_rows)
+        for start in range(0, len(membership_rows), batch_size):
+            db.execute(pg_insert(TopicPost), membership_rows[start:start + batch_size])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise e
+    return [row["id"] for row in topic_rows]
+
+def get_topics_for_job(db: Session, job_id: UUID) -> List[Topic]:
+    return db.query(Topic).filter(Topic.analysis_job_id == job_id).order_by(Topic.post_count.desc()).all()
+
+def get_topic_posts(db: Session, topic_id: UUID, skip: int = 0, limit: int = 100) -> List[Post]:
+    return (
+        db.query(Post)
+        .join(TopicPost, TopicPost.post_id == Post.id)
+        .filter(TopicPost.topic_id == topic_id, Post.is_deleted == False)
+        .order_by(Post.watch_date.desc())
+        .offset(skip).limit(limit).all()
+    )
+
 # --- Conversation ---
 def create_conversation(db: Session, question: str, response: str, context_ids: list) -> Conversation:
     db_obj = Conversation(
@@ -93,23 +438,35 @@ def create_conversation(db: Session, question: str, response: str, context_ids:
 def get_all_conversations(db: Session, skip: int = 0, limit: int = 100) -> List[Conversation]:
     return db.query(Conversation).order_by(Conversation.created_at.asc()).offset(skip).limit(limit).all()
 
-def clear_all_data(db: Session):
+def get_upload_metadata(db: Session, upload_id: UUID) -> Optional[UploadMetadata]:
+    return db.query(UploadMetadata).filter(UploadMetadata.id == upload_id).first()
+
+def clear_all_data(db: Session, keep_upload_id: Optional[UUID] = None, commit: bool = True):
     """
     Clear all data from the database to start fresh for a new upload.
-    Deletes in order of dependency.
+    Deletes in order of dependency. `keep_upload_id` preserves the metadata
+    row of the upload that is about to be ingested. With commit=False the
+    deletes are left in the session's transaction for the caller to commit.
     """
     try:
         # Delete dependent tables first
         db.query(Conversation).delete()
+        db.query(TopicPost).delete()
         db.query(Topic).delete()
         db.query(AnalysisResult).delete()
         db.query(AnalysisJob).delete()
         
         # Delete core data
+        db.query(SentimentTimeseries).delete()
+        db.query(PineconeVector).delete()
         db.query(Post).delete()
-        db.query(UploadMetadata).delete()
+        uploads = db.query(UploadMetadata)
+        if keep_upload_id:
+            uploads = uploads.filter(UploadMetadata.id != keep_upload_id)
+        uploads.delete(synchronize_session=False)
         
-        db.commit()
+        if commit:
+            db.commit()
         return True
     except Exception as e:
         db.rollback()
@@ -0,0 +1,76 @@
+"""
+Postgres advisory locks that coordinate uploads and analysis jobs across
+API worker processes.
+
+A running ingest or analysis job holds a session-level lock keyed by its
+id on a connection of its own (lock_connection), so "is anyone working on
+it" survives neither the worker nor its connection: when a process dies,
+Postgres drops the lock. Decisions that depend on which uploads and jobs
+are active (queueing a job, accepting a replace upload) are made under
+lock_queue_state, a transaction-level lock released at commit/rollback.
+"""
+from typing import Optional, Set
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from config.database import engine
+from middleware.logger import logger
+
+# Two-int keys; the single-bigint keys of record_key() live in a separate
+# key space (pg_locks.objsubid 1 vs 2)
+_QUEUE_STATE_LOCK = (0x414A, 0)
+_SCHEMA_LOCK = (0x414A, 1)
+_SLOT_LOCK_CLASS = 0x414B
+
+def record_key(record_id: UUID) -> int:
+    return record_id.int & ((1 << 63) - 1)
+
+def lock_queue_state(db: Session):
+    """Serialize queue/upload decisions across workers until db commits or rolls back."""
+    db.execute(text("SELECT pg_advisory_xact_lock(:a, :b)"), {"a": _QUEUE_STATE_LOCK[0], "b": _QUEUE_STATE_LOCK[1]})
+
+def lock_schema(conn: Connection):
+    """Serialize schema creation/upgrades across workers until conn's transaction ends."""
+    conn.execute(text("SELECT pg_advisory_xact_lock(:a, :b)"), {"a": _SCHEMA_LOCK[0], "b": _SCHEMA_LOCK[1]})
+
+def lock_connection() -> Connection:
+    """A dedicated autocommit connection to hold session-level locks on."""
+    return engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+def try_lock_record(conn: Connection, record_id: UUID) -> bool:
+    return bool(conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": record_key(record_id)}).scalar())
+
+def unlock_record(conn: Connection, record_id: UUID):
+    conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": record_key(record_id)})
+
+def try_lock_slot(conn: Connection, slots: int) -> Optional[int]:
+    """Take the first free one of `slots` run slots; None if all are taken."""
+    for slot in range(slots):
+        if conn.execute(text("SELECT pg_try_advisory_lock(:a, :b)"), {"a": _SLOT_LOCK_CLASS, "b": slot}).scalar():
+            return slot
+    return None
+
+def release(conn: Connection):
+    """Drop every lock held on `conn` and close it."""
+    if conn.closed:
+        return
+    # Session-level locks would outlive close() on a pooled connection
+    try:
+        conn.execute(text("SELECT pg_advisory_unlock_all()"))
+        conn.close()
+    except Exception as e:
+        logger.warning(f"Dropping advisory lock connection: {e}")
+        conn.invalidate()
+        conn.close()
+
+def held_record_keys(db: Session) -> Set[int]:
+    """record_key() of every record some process currently holds a lock on."""
+    return {
+        (int(row.classid) << 32) | int(row.objid)
+        for row in db.execute(text(
+            "SELECT classid, objid FROM pg_locks WHERE locktype = 'advisory' AND objsubid = 1 AND granted"
+        ))
+    }
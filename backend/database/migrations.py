@@ -0,0 +1,39 @@
+"""
+In-place upgrades for databases created by an older version.
+
+create_all only creates missing tables; it never changes existing ones.
+These statements bring older tables up to date with models.py and are
+safe to run on every startup (each one is a no-op once applied).
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from middleware.logger import logger
+
+UPGRADE_STATEMENTS = [
+    # Incremental uploads: upload mode, failure reason and the upload that inserted each post
+    "ALTER TABLE upload_metadata ADD COLUMN IF NOT EXISTS upload_mode VARCHAR DEFAULT 'replace'",
+    "ALTER TABLE upload_metadata ADD COLUMN IF NOT EXISTS error_message TEXT",
+    "ALTER TABLE posts ADD COLUMN IF NOT EXISTS upload_id UUID REFERENCES upload_metadata (id)",
+    "CREATE INDEX IF NOT EXISTS ix_posts_upload_id ON posts (upload_id)",
+    # Keyset pagination over posts
+    "CREATE INDEX IF NOT EXISTS ix_posts_uploaded_at_id ON posts (uploaded_at, id)",
+    # Sentiment cache keyed by model version. Rows from before have no
+    # version to be reused under, so they are dropped and rescored
+    "ALTER TABLE sentiment_timeseries ADD COLUMN IF NOT EXISTS model_version VARCHAR",
+    "DELETE FROM sentiment_timeseries WHERE model_version IS NULL",
+    "ALTER TABLE sentiment_timeseries ALTER COLUMN model_version SET NOT NULL",
+    "ALTER TABLE sentiment_timeseries ALTER COLUMN date_bucket DROP NOT NULL",
+    "ALTER TABLE sentiment_timeseries ALTER COLUMN day_of_week DROP NOT NULL",
+    "ALTER TABLE sentiment_timeseries ALTER COLUMN hour_of_day DROP NOT NULL",
+    # Same name as the model's UniqueConstraint, whose index makes this a no-op on new databases
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_sentiment_post_model ON sentiment_timeseries (post_id, model_version)",
+    # Topic membership lives in topic_posts, which create_all adds. The old
+    # (nullable) topics.post_ids column is left in place, unused
+]
+
+def upgrade_schema(conn: Connection):
+    """Apply UPGRADE_STATEMENTS on `conn` (inside the caller's transaction)."""
+    for statement in UPGRADE_STATEMENTS:
+        conn.execute(text(statement))
+    logger.info("Database schema is up to date")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, JSON, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, JSON, Text, UniqueConstraint, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 import uuid
@@ -13,13 +13,17 @@ class UploadMetadata(Base):
     file_size = Column(Integer, nullable=False)
     total_posts_in_file = Column(Integer, default=0)
     upload_status = Column(String, default='parsing') # parsing, completed, failed
+    upload_mode = Column(String, default='replace') # replace, incremental
     uploaded_at = Column(DateTime, default=datetime.utcnow)
     posts_successfully_parsed = Column(Integer, default=0)
     posts_skipped = Column(Integer, default=0)
     parsed_at = Column(DateTime, nullable=True)
+    error_message = Column(Text, nullable=True)
 
 class Post(Base):
     __tablename__ = "posts"
+    # Keyset pagination order for streaming posts into the analysis pipeline
+    __table_args__ = (Index("ix_posts_uploaded_at_id", "uploaded_at", "id"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     platform = Column(String, default='youtube')
@@ -31,6 +35,7 @@ class Post(Base):
     content_hash = Column(String, unique=True, index=True, nullable=False)
     video_metadata = Column(JSONB, nullable=True) # Renamed from 'metadata'
     uploaded_at = Column(DateTime, default=datetime.utcnow)
+    upload_id = Column(UUID(as_uuid=True), ForeignKey("upload_metadata.id"), nullable=True, index=True) # Upload that first inserted this post
     is_deleted = Column(Boolean, default=False)
 
     sentiment_timeseries = relationship("SentimentTimeseries", back_populates="post")
@@ -38,14 +43,16 @@ class Post(Base):
 
 class SentimentTimeseries(Base):
     __tablename__ = "sentiment_timeseries"
+    __table_args__ = (UniqueConstraint("post_id", "model_version", name="uq_sentiment_post_model"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     post_id = Column(UUID(as_uuid=True), ForeignKey("posts.id"))
+    model_version = Column(String, nullable=False) # Scores are reused until the model changes
     sentiment_score = Column(Float, nullable=False)
     sentiment_label = Column(String, nullable=False)
-    date_bucket = Column(DateTime, nullable=False)
-    day_of_week = Column(String, nullable=False)
-    hour_of_day = Column(Integer, nullable=False)
+    date_bucket = Column(DateTime, nullable=True) # Day of watch_date; null for undated posts (e.g. subscriptions)
+    day_of_week = Column(String, nullable=True)
+    hour_of_day = Column(Integer, nullable=True)
 
     post = relationship("Post", back_populates="sentiment_timeseries")
 
@@ -62,6 +69,17 @@ class PineconeVector(Base):
 
     post = relationship("Post", back_populates="pinecone_vector")
 
+class VectorNamespace(Base):
+    __tablename__ = "vector_namespaces"
+
+    # Every replace upload syncs into a fresh namespace; queries keep using the
+    # newest live one until the new namespace is complete, then it is swapped
+    # in and the older ones are deleted
+    name = Column(String, primary_key=True)
+    upload_id = Column(UUID(as_uuid=True), nullable=True) # No FK: upload rows are cleared on replace
+    created_at = Column(DateTime, default=datetime.utcnow)
+    live_at = Column(DateTime, nullable=True) # Set once every post's vector is in it
+
 class AnalysisJob(Base):
     __tablename__ = "analysis_jobs"
 
@@ -95,11 +113,18 @@ class Topic(Base):
     topic_name = Column(String, nullable=False)
     topic_description = Column(String, nullable=True)
     confidence_score = Column(Float, nullable=True)
-    post_ids = Column(JSONB, nullable=True) # Array of post IDs belonging to this topic
-    post_count = Column(Integer, default=0)
+    post_count = Column(Integer, default=0) # Member posts live in topic_posts
 
     analysis_job = relationship("AnalysisJob", back_populates="topics")
 
+class TopicPost(Base):
+    __tablename__ = "topic_posts"
+    # The primary key serves topic -> posts lookups, the index post -> topics
+    __table_args__ = (Index("ix_topic_posts_post_id", "post_id"),)
+
+    topic_id = Column(UUID(as_uuid=True), ForeignKey("topics.id", ondelete="CASCADE"), primary_key=True)
+    post_id = Column(UUID(as_uuid=True), ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+
 class Conversation(Base):
     __tablename__ = "conversations"
 
@@ -0,0 +1,29 @@
+"""
+Gunicorn config for running several API workers that share model weights.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+The app and PRELOAD_MODELS are loaded once in the master and the workers
+are forked from it, so the weights are shared copy-on-write instead of
+every worker loading its own copy. `python -m benchmarks.preload_memory`
+measures what that saves.
+"""
+import gc
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# Read by the app too (config.settings), to split the model memory budget
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before the first fork
+    from services.warmup import preload_models
+    preload_models()
+    # Move everything allocated so far out of the collector's reach: the
+    # cyclic GC would otherwise write to those objects' headers in every
+    # worker and un-share the pages they live on
+    gc.freeze()
@@ -1,4 +1,5 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from config.settings import settings
 from middleware.logger import logger
@@ -33,15 +34,32 @@ def create_app() -> FastAPI:
         from config.database import init_db
         init_db()
         logger.info("Starting up Social Media Avatar Analyzer API...")
+        # Models load in the background; /ready reports when they are warm
+        from services.warmup import start_warmup
+        start_warmup()
+        # Every worker claims queued jobs from the database, including ones
+        # a dead worker or previous process left unfinished
+        from services.job_queue import job_queue
+        job_queue.start()
 
     @app.on_event("shutdown")
     async def shutdown_event():
+        from services.job_queue import job_queue
+        from services.executors import shutdown_executors
+        await job_queue.shutdown()
+        shutdown_executors()
         logger.info("Shutting down API...")
 
     @app.get("/health")
     async def health_check():
         return {"status": "healthy", "version": "1.0.0"}
 
+    @app.get("/ready")
+    async def readiness_check():
+        from services.warmup import readiness
+        state = readiness()
+        return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
     # Register Routes
     app.include_router(upload.router, tags=["Upload"])
     app.include_router(analyze.router, tags=["Analysis"])
@@ -1,5 +1,19 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator
+from utils.archive_reader import ZipArchiveReader
+from .columnar import PostColumns
+
+DEFAULT_BATCH_SIZE = 1000
+
+def batched(iterable: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """Yield successive lists of at most `batch_size` items from `iterable`."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
 
 class BaseParser(ABC):
     """
@@ -7,16 +21,28 @@ class BaseParser(ABC):
     """
     
     @abstractmethod
-    def parse(self, temp_path: str) -> List[Dict[str, Any]]:
+    def parse(self, archive: ZipArchiveReader) -> List[Dict[str, Any]]:
         """
-        Parse the data from the given temporary path (extracted zip directory).
+        Parse the data from the given uploaded archive.
         Returns a list of normalized post dictionaries.
         """
         pass
 
-    @abstractmethod
-    def cleanup(self, temp_path: str):
+    def check_archive(self, archive: ZipArchiveReader) -> Any:
         """
-        Clean up any temporary files or directories created during parsing.
+        Raise if the archive cannot be ingested (nothing supported in it,
+        over a size limit) before anything is written. The return value is
+        passed back to parse_stream as `plan`. The default accepts anything.
         """
-        pass
+        return None
+
+    def parse_stream(self, archive: ZipArchiveReader, batch_size: int = DEFAULT_BATCH_SIZE,
+                     plan: Any = None) -> Iterator[PostColumns]:
+        """
+        Parse the data lazily, yielding columnar batches of at most
+        `batch_size` normalized posts. Parsers that can read their input
+        incrementally should override this; the default just chunks `parse()`.
+        """
+        for batch in batched(self.parse(archive), batch_size):
+            yield PostColumns.from_rows(batch)
+
@@ -1,173 +1,284 @@
-import os
+import csv
 import datetime
-from typing import List, Dict, Any
-from .base_parser import BaseParser
-from utils.file_utils import read_json_file, cleanup_temp_files
+import io
+import json
+import multiprocessing
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from queue import Empty
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
+from .base_parser import BaseParser, DEFAULT_BATCH_SIZE, batched
+from config.settings import settings
+from utils.file_utils import peek_json_container, iter_json_items
+from utils.archive_reader import ZipArchiveReader, ArchiveLimitError
 from utils.hash_utils import generate_content_hash
+from .columnar import (
+    PostColumns, to_naive_utc, normalize_takeout_batch, normalize_custom_youtube_batch, normalize_custom_twitter_batch
+)
 from middleware.logger import logger
 
+# Member kinds understood by the parser
+WATCH_HISTORY = "watch_history"
+SEARCH_HISTORY = "search_history"
+COMMENTS = "comments"
+SUBSCRIPTIONS = "subscriptions"
+CUSTOM_JSON = "custom_json"
+
+_KNOWN_FILES = {
+    "watch-history.json": WATCH_HISTORY,
+    "search-history.json": SEARCH_HISTORY,
+    "comments.csv": COMMENTS,
+    "subscriptions.csv": SUBSCRIPTIONS,
+}
+
+# Queue messages sent back from parse workers
+_MSG_BATCH = "batch"
+_MSG_DONE = "done"
+_MSG_ERROR = "error"
+
+# Result queue handed to each parse worker process at start-up
+_worker_queue = None
+
+def _init_parse_worker(queue):
+    global _worker_queue
+    _worker_queue = queue
+
+def _parse_member_worker(zip_path: str, member: str, kind: str, batch_size: int) -> int:
+    """
+    Process-pool entry point: parse one archive member and push its
+    normalized posts onto the worker queue in batches.
+    """
+    queue = _worker_queue
+    count = 0
+    try:
+        with ZipArchiveReader(zip_path) as archive:
+            parser = YouTubeParser()
+            for batch in parser._iter_member_batches(archive, member, kind, batch_size):
+                count += len(batch)
+                queue.put((_MSG_BATCH, batch))
+        queue.put((_MSG_DONE, member))
+    except Exception as e:
+        queue.put((_MSG_ERROR, e))
+    return count
+
 class YouTubeParser(BaseParser):
-    def parse(self, temp_path: str) -> List[Dict[str, Any]]:
+    def parse(self, archive: ZipArchiveReader) -> List[Dict[str, Any]]:
         posts = []
+        for batch in self.parse_stream(archive):
+            posts.extend(batch.to_rows())
+        return posts
+
+    def check_archive(self, archive: ZipArchiveReader) -> List[Tuple[str, str]]:
+        """
+        Find the supported files and check the data they declare against
+        the archive's size limit. Returns them as (member_name, kind) pairs.
+        """
+        members = self.discover_members(archive)
+        if not members:
+            raise ValueError("No supported YouTube data found in the archive")
+        declared = sum(archive.member_size(name) for name, _ in members)
+        if declared > archive.max_total_size:
+            raise ArchiveLimitError(
+                f"Archive declares {declared} bytes of data, over the {archive.max_total_size} byte limit"
+            )
+        return members
+
+    def parse_stream(self, archive: ZipArchiveReader, batch_size: int = DEFAULT_BATCH_SIZE,
+                     plan: List[Tuple[str, str]] = None) -> Iterator[PostColumns]:
+        """
+        Stream normalized posts as columnar batches straight out of the
+        archive, without extracting it or loading whole files into memory.
+        Every supported file is parsed; large multi-file archives are spread
+        over a process pool and the results merged into one stream.
+        `plan` is check_archive's result, if it has already been called.
+        """
         try:
-            # Locate watch-history.json
-            # Locate watch-history.json or fallback to any JSON
-            watch_history_path = None
-            json_files = []
-            
-            for root, dirs, files in os.walk(temp_path):
-                for file in files:
-                    if file == "watch-history.json":
-                        watch_history_path = os.path.join(root, file)
-                        break
-                    if file.endswith(".json"):
-                        json_files.append(os.path.join(root, file))
-                if watch_history_path:
-                    break
-            
-            if not watch_history_path:
-                if json_files:
-                    watch_history_path = json_files[0]
-                    logger.info(f"watch-history.json not found, falling back to: {watch_history_path}")
-                else:
-                    logger.warning("No JSON file found in upload")
-                    return []
-
-            raw_data = read_json_file(watch_history_path)
-            
-            # Case 1: Standard Google Takeout (List)
-            if isinstance(raw_data, list):
-                logger.info(f"Detected Google Takeout format. Found {len(raw_data)} entries.")
-                return self._parse_takeout_format(raw_data)
-            
-            # Case 2: Custom/Scraped Format (Dict with 'captions', 'tweets')
-            elif isinstance(raw_data, dict):
-                logger.info("Detected Custom/Scraped format.")
-                all_posts = []
-                
-                # Parse YouTube (under 'captions')
-                if "captions" in raw_data and isinstance(raw_data["captions"], list):
-                    logger.info(f"Found {len(raw_data['captions'])} YouTube entries.")
-                    all_posts.extend(self._parse_custom_youtube(raw_data["captions"]))
-                    
-                # Parse Twitter (under 'tweets')
-                if "tweets" in raw_data and isinstance(raw_data["tweets"], list):
-                     logger.info(f"Found {len(raw_data['tweets'])} Twitter entries.")
-                     all_posts.extend(self._parse_custom_twitter(raw_data["tweets"]))
-                     
-                return all_posts
-            
+            members = plan if plan is not None else self.check_archive(archive)
+            declared = sum(archive.member_size(name) for name, _ in members)
+
+            workers = min(settings.PARSE_WORKERS, len(members))
+            if workers > 1 and declared >= settings.PARSE_PARALLEL_MIN_BYTES:
+                logger.info(f"Parsing {len(members)} files on {workers} worker processes")
+                yield from self._parse_parallel(archive, members, batch_size, workers)
             else:
-                logger.warning(f"Unknown JSON format: {type(raw_data)}")
-                return []
+                for member, kind in members:
+                    yield from self._iter_member_batches(archive, member, kind, batch_size)
 
         except Exception as e:
             logger.error(f"Error parsing YouTube data: {e}", exc_info=True)
             raise e
 
+    def discover_members(self, archive: ZipArchiveReader) -> List[Tuple[str, str]]:
+        """
+        Find every supported file in the archive in a single pass over its
+        index. Returns (member_name, kind) pairs.
+        """
+        members = []
+        list_json_files = []
+
+        for name in archive.names():
+            basename = posixpath.basename(name).lower()
+            kind = _KNOWN_FILES.get(basename)
+            if kind:
+                members.append((name, kind))
+            elif basename.endswith(".json"):
+                with archive.open(name) as f:
+                    container = peek_json_container(f)
+                # Custom/Scraped exports are objects with 'captions' / 'tweets'
+                if container == "dict":
+                    members.append((name, CUSTOM_JSON))
+                elif container == "list":
+                    list_json_files.append(name)
+
+        # Fall back to any activity-style JSON when there is no watch history
+        if not any(kind == WATCH_HISTORY for _, kind in members) and list_json_files:
+            logger.info(f"watch-history.json not found, falling back to: {list_json_files[0]}")
+            members.append((list_json_files[0], WATCH_HISTORY))
+
+        logger.info(f"Discovered {len(members)} supported files: {[kind for _, kind in members]}")
+        return members
+
+    def _parse_parallel(self, archive: ZipArchiveReader, members: List[Tuple[str, str]],
+                        batch_size: int, workers: int) -> Iterator[PostColumns]:
+        # Never fork the (multi-threaded) server process directly: workers
+        # could inherit locks held by other threads
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        ctx = multiprocessing.get_context(start_method)
+        # Bounded queue keeps memory flat when the consumer is slower than the workers
+        queue = ctx.Queue(maxsize=workers * 2)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_init_parse_worker, initargs=(queue,)) as pool:
+            futures = [
+                pool.submit(_parse_member_worker, archive.zip_path, member, kind, batch_size)
+                for member, kind in members
+            ]
+            pending = len(futures)
+            try:
+                while pending:
+                    try:
+                        msg_type, payload = queue.get(timeout=1.0)
+                    except Empty:
+                        # A worker process that died never reports back
+                        for future in futures:
+                            if future.done() and future.exception():
+                                raise future.exception()
+                        continue
+                    if msg_type == _MSG_BATCH:
+                        yield payload
+                    elif msg_type == _MSG_DONE:
+                        pending -= 1
+                    else:
+                        raise payload
+            finally:
+                for future in futures:
+                    future.cancel()
+                # Drain so workers blocked on a full queue can exit
+                while not all(future.done() for future in futures):
+                    try:
+                        queue.get(timeout=0.1)
+                    except Exception:
+                        pass
+
+    def _iter_member_batches(self, archive: ZipArchiveReader, member: str, kind: str,
+                             batch_size: int) -> Iterator[PostColumns]:
+        if kind in (COMMENTS, SUBSCRIPTIONS):
+            iter_rows = self._iter_comments_csv if kind == COMMENTS else self._iter_subscriptions_csv
+            with archive.open(member) as f:
+                rows = csv.DictReader(io.TextIOWrapper(f, encoding="utf-8-sig", newline=""))
+                for batch in batched(iter_rows(rows), batch_size):
+                    yield PostColumns.from_rows(batch)
+            return
+
+        with archive.open(member) as f:
+            container = peek_json_container(f)
+
+        # Case 1: Standard Google Takeout (List)
+        if container == "list":
+            logger.info(f"Detected Google Takeout format in {member}.")
+            content_type = "search" if kind == SEARCH_HISTORY else "video"
+            with archive.open(member) as f:
+                for raw in batched(iter_json_items(f, "item"), batch_size):
+                    yield normalize_takeout_batch(raw, content_type=content_type)
+
+        # Case 2: Custom/Scraped Format (Dict with 'captions', 'tweets')
+        elif container == "dict":
+            logger.info(f"Detected Custom/Scraped format in {member}.")
+
+            # Parse YouTube (under 'captions')
+            with archive.open(member) as f:
+                for raw in batched(iter_json_items(f, "captions.item"), batch_size):
+                    yield normalize_custom_youtube_batch(raw)
+
+            # Parse Twitter (under 'tweets')
+            with archive.open(member) as f:
+                for raw in batched(iter_json_items(f, "tweets.item"), batch_size):
+                    yield normalize_custom_twitter_batch(raw)
+
+        else:
+            logger.warning(f"Unknown JSON format in {member}")
+
     def _parse_takeout_format(self, raw_data: List[Dict]) -> List[Dict]:
-        posts = []
-        for entry in raw_data:
-            if "title" not in entry or "time" not in entry:
-                continue
-            
-            title = entry.get("title", "").replace("Watched ", "", 1)
-            title_url = entry.get("titleUrl", "")
-            video_id = None
-            if "v=" in title_url:
-                video_id = title_url.split("v=")[1]
-
-            channel_name = "Unknown"
-            if "subtitles" in entry and isinstance(entry["subtitles"], list) and len(entry["subtitles"]) > 0:
-                channel_name = entry["subtitles"][0].get("name", "Unknown")
-
-            watch_date = self._parse_iso_date(entry.get("time"))
-            if "Visited YouTube Music" in title:
-                continue
-
-            content_hash = generate_content_hash(title, channel_name, str(watch_date))
-
-            posts.append({
-                "platform": "youtube",
-                "platform_post_id": video_id,
-                "content_type": "video",
-                "title": title,
-                "channel_name": channel_name,
-                "watch_date": watch_date,
-                "content_hash": content_hash,
-                "video_metadata": {"original_url": title_url}
-            })
-        return posts
+        return normalize_takeout_batch(raw_data).to_rows()
 
     def _parse_custom_youtube(self, data: List[Dict]) -> List[Dict]:
-        posts = []
-        for entry in data:
-            title = entry.get("title", "")
-            if not title: continue
-            
-            url = entry.get("url", "")
-            video_id = entry.get("videoId")
-            channel_name = entry.get("author", "Unknown")
-            timestamp_str = entry.get("timestamp") # "09/02/2026, 16:23:49"
-            
-            watch_date = self._parse_custom_date(timestamp_str)
-            content_hash = generate_content_hash(title, channel_name, str(watch_date))
-            
-            posts.append({
+        return normalize_custom_youtube_batch(data).to_rows()
+
+    def _parse_custom_twitter(self, data: List[Dict]) -> List[Dict]:
+        return normalize_custom_twitter_batch(data).to_rows()
+
+    def _iter_comments_csv(self, rows: Iterable[Dict[str, str]]) -> Iterator[Dict]:
+        for row in rows:
+            row = {(key or "").strip().lower(): value for key, value in row.items()}
+            text = self._extract_comment_text(row.get("comment text", ""))
+            if not text: continue
+
+            video_id = row.get("video id") or None
+            comment_date = self._parse_iso_date(row.get("comment create timestamp") or "")
+            title = f"Commented: {text[:50]}..."
+            content_hash = generate_content_hash(text, "Commented", str(comment_date))
+            comment_date = to_naive_utc(comment_date)
+
+            yield {
                 "platform": "youtube",
                 "platform_post_id": video_id,
-                "content_type": "video",
+                "content_type": "comment",
                 "title": title,
-                "channel_name": channel_name,
-                "watch_date": watch_date,
+                "channel_name": "Commented",
+                "watch_date": comment_date,
                 "content_hash": content_hash,
-                "video_metadata": {"original_url": url}
-            })
-        return posts
+                "video_metadata": {"full_text": text, "comment_id": row.get("comment id")}
+            }
 
-    def _parse_custom_twitter(self, data: List[Dict]) -> List[Dict]:
-        posts = []
-        for entry in data:
-            text = entry.get("text", "")
-            if not text: continue
-            
-            action = entry.get("action", "Tweeted") # Liked, Tweeted
-            url = entry.get("url", "")
-            timestamp_str = entry.get("timestamp")
-            
-            watch_date = self._parse_custom_date(timestamp_str)
-            
-            # For tweets, title is the text (truncated if needed)
-            title = f"{action}: {text[:50]}..." 
-            content_hash = generate_content_hash(text, action, str(watch_date))
-            
-            posts.append({
-                "platform": "twitter",
-                "platform_post_id": None,
-                "content_type": "tweet",
-                "title": title, # Store full text in metadata or description if model allows, for now title is OK
-                "channel_name": action, # e.g. "Liked"
-                "watch_date": watch_date,
+    def _iter_subscriptions_csv(self, rows: Iterable[Dict[str, str]]) -> Iterator[Dict]:
+        for row in rows:
+            row = {(key or "").strip().lower(): value for key, value in row.items()}
+            channel_title = (row.get("channel title") or "").strip()
+            if not channel_title: continue
+
+            content_hash = generate_content_hash(channel_title, "Subscribed", None)
+
+            yield {
+                "platform": "youtube",
+                "platform_post_id": row.get("channel id") or None,
+                "content_type": "subscription",
+                "title": channel_title,
+                "channel_name": channel_title,
+                "watch_date": None,
                 "content_hash": content_hash,
-                "video_metadata": {"full_text": text, "url": url}
-            })
-        return posts
+                "video_metadata": {"channel_url": row.get("channel url", "")}
+            }
+
+    def _extract_comment_text(self, raw: str) -> str:
+        # Takeout stores comment text as JSON segments: {"text":"a"},{"text":"b"}
+        raw = (raw or "").strip()
+        try:
+            segments = json.loads(f"[{raw}]")
+            return "".join(seg.get("text", "") if isinstance(seg, dict) else str(seg) for seg in segments).strip()
+        except ValueError:
+            return raw
 
     def _parse_iso_date(self, date_str: str):
         try:
             return datetime.datetime.fromisoformat(date_str.replace("Z", "+00:00"))
         except:
             return None
-
-    def _parse_custom_date(self, date_str: str):
-        # Format: "09/02/2026, 16:23:49" -> DD/MM/YYYY, HH:MM:SS
-        try:
-            return datetime.datetime.strptime(date_str, "%d/%m/%Y, %H:%M:%S")
-        except Exception as e:
-            logger.warning(f"Failed to parse date {date_str}: {e}")
-            return None
-
-
-
-    def cleanup(self, temp_path: str):
-        cleanup_temp_files(temp_path)
@@ -1,32 +1,56 @@
-from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from uuid import UUID
 
 from config.database import get_db
 from database import crud
-from schemas.analysis_schema import AnalysisStartResponse, AnalysisResultResponse
-from services.analysis_service import run_analysis_pipeline
+from schemas.analysis_schema import (AnalysisStartResponse, AnalysisResultResponse, AnalysisQueueResponse,
+                                     JobTopicsResponse, TopicInfo, TopicPostsResponse, TopicPostInfo)
+from services.job_queue import job_queue, IngestInProgressError
 
 router = APIRouter()
 
 @router.post("/analyze", response_model=AnalysisStartResponse)
-async def start_analysis(
-    background_tasks: BackgroundTasks,
+async def start_analysis():
+    # Jobs run on the analysis queue with their own DB sessions; repeated
+    # requests join the job that is already queued or running
+    try:
+        job_id, coalesced = await job_queue.submit()
+    except IngestInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return AnalysisStartResponse(
+        message="Analysis already in progress" if coalesced else "Analysis started in background",
+        analysis_job_id=job_id,
+        status=await job_queue.job_status(job_id) or "pending",
+        coalesced=coalesced
+    )
+
+@router.get("/analyze/queue", response_model=AnalysisQueueResponse)
+async def get_analysis_queue():
+    return AnalysisQueueResponse(**await job_queue.status())
+
+@router.post("/analyze/{job_id}/retry", response_model=AnalysisStartResponse)
+async def retry_analysis(
+    job_id: UUID,
     db: Session = Depends(get_db)
 ):
-    # Check for existing in-progress job
-    # For MVP, we might just allow one global job or per user session if we had auth
-    # Let's just create a new one
-    
-    job = crud.create_analysis_job(db)
-    
-    # Run in background
-    background_tasks.add_task(run_analysis_pipeline, job.id, db)
-    
+    job = db.query(crud.models.AnalysisJob).filter(crud.models.AnalysisJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == 'completed':
+        raise HTTPException(status_code=409, detail="Job already completed")
+
+    # Completed stages are checkpointed; the retry resumes after them
+    try:
+        requeued = await job_queue.retry(job_id)
+    except IngestInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     return AnalysisStartResponse(
-        message="Analysis started in background",
-        analysis_job_id=job.id,
-        status="pending"
+        message="Analysis resumed from last checkpoint" if requeued else "Analysis already in progress",
+        analysis_job_id=job_id,
+        status=await job_queue.job_status(job_id) or "pending",
+        coalesced=not requeued
     )
 
 @router.get("/analyze/{job_id}", response_model=AnalysisResultResponse)
@@ -39,7 +63,15 @@ async def get_analysis_results(
         raise HTTPException(status_code=404, detail="Job not found")
         
     results = crud.get_analysis_results(db, job_id)
-    results_dict = {r.analysis_type: r.result_data for r in results}
+    results_dict = {}
+    stage_status = {}
+    for r in results:
+        if r.analysis_type.startswith(crud.CHECKPOINT_PREFIX):
+            stage = r.analysis_type[len(crud.CHECKPOINT_PREFIX):]
+            stage_status[stage] = {"status": r.result_data.get("status"), "error": r.result_data.get("error")}
+        else:
+            results_dict[r.analysis_type] = r.result_data
+    results_dict["stage_status"] = stage_status
     
     return AnalysisResultResponse(
         analysis_job_id=job.id,
@@ -48,3 +80,57 @@ async def get_analysis_results(
         completed_at=job.completed_at,
         results=results_dict
     )
+
+@router.get("/analyze/{job_id}/topics", response_model=JobTopicsResponse)
+async def get_analysis_topics(
+    job_id: UUID,
+    db: Session = Depends(get_db)
+):
+    job = db.query(crud.models.AnalysisJob).filter(crud.models.AnalysisJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return JobTopicsResponse(
+        analysis_job_id=job.id,
+        topics=[
+            TopicInfo(
+                topic_id=t.id,
+                topic_name=t.topic_name,
+                topic_description=t.topic_description,
+                confidence_score=t.confidence_score,
+                post_count=t.post_count or 0
+            )
+            for t in crud.get_topics_for_job(db, job_id)
+        ]
+    )
+
+@router.get("/analyze/topics/{topic_id}/posts", response_model=TopicPostsResponse)
+async def get_topic_posts(
+    topic_id: UUID,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    # Drill-down from a topic in the results to the posts clustered into it
+    topic = db.query(crud.models.Topic).filter(crud.models.Topic.id == topic_id).first()
+    if not topic:
+        raise HTTPException(status_code=404, detail="Topic not found")
+
+    posts = crud.get_topic_posts(db, topic_id, skip=skip, limit=limit)
+    return TopicPostsResponse(
+        topic_id=topic.id,
+        topic_name=topic.topic_name,
+        post_count=topic.post_count or 0,
+        skip=skip,
+        limit=limit,
+        posts=[
+            TopicPostInfo(
+                post_id=p.id,
+                title=p.title,
+                channel_name=p.channel_name,
+                content_type=p.content_type,
+                watch_date=p.watch_date
+            )
+            for p in posts
+        ]
+    )
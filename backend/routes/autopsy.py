@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from uuid import UUID
 
@@ -42,7 +43,7 @@ async def trigger_autopsy(
         raise HTTPException(status_code=404, detail="Job not found")
 
     try:
-        report = generate_autopsy_report(job_id, db)
+        report = await run_in_threadpool(generate_autopsy_report, job_id, db)
         return report
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
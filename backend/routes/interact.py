@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 import tempfile
 import os
@@ -19,19 +20,20 @@ async def ask_avatar(
 ):
     if not request.analysis_job_id:
         # Try to find the latest job if not provided
-        latest_job = crud.get_latest_analysis_job(db)
+        latest_job = await run_in_threadpool(crud.get_latest_analysis_job, db)
         if not latest_job:
             raise HTTPException(status_code=400, detail="No analysis found. Please upload data first.")
         job_id = latest_job.id
     else:
         job_id = request.analysis_job_id
     
-    # Get the text response
-    chat_response = process_chat_request(db, job_id, request.question, mode=request.mode)
+    # Get the text response (retrieval, LLM and TTS all block, so keep them
+    # off the event loop)
+    chat_response = await run_in_threadpool(process_chat_request, db, job_id, request.question, mode=request.mode)
     
     # Generate audio for the response
     try:
-        audio_url = voice_service.generate_speech(chat_response.avatar_response)
+        audio_url = await run_in_threadpool(voice_service.generate_speech, chat_response.avatar_response)
         chat_response.audio_url = audio_url
     except Exception as e:
         # Log but don't fail if TTS fails
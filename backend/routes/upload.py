@@ -1,17 +1,50 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+import zipfile
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
 from sqlalchemy.orm import Session
-from schemas.upload_schema import UploadResponse
-from services.upload_service import process_upload
+from uuid import UUID
+from schemas.upload_schema import UploadResponse, UploadStatusResponse
+from services.upload_service import process_upload, UPLOAD_MODES, UploadConflictError
 from config.database import get_db
+from database import crud
 
 router = APIRouter()
 
 @router.post("/upload", response_model=UploadResponse)
 async def upload_file(
     file: UploadFile = File(...),
+    mode: str = Form("replace"),
     db: Session = Depends(get_db)
 ):
     if not file.filename.endswith(".zip"):
         raise HTTPException(status_code=400, detail="Only .zip files are supported")
-        
-    return await process_upload(file, db)
+    if mode not in UPLOAD_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(UPLOAD_MODES)}")
+
+    try:
+        return await process_upload(file, db, mode=mode)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Uploaded file is not a valid zip archive")
+    except UploadConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/upload/{upload_id}", response_model=UploadStatusResponse)
+async def get_upload_status(
+    upload_id: UUID,
+    db: Session = Depends(get_db)
+):
+    upload = crud.get_upload_metadata(db, upload_id)
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    return UploadStatusResponse(
+        upload_id=upload.id,
+        file_name=upload.file_name,
+        status=upload.upload_status,
+        mode=upload.upload_mode,
+        uploaded_at=upload.uploaded_at,
+        parsed_at=upload.parsed_at,
+        total_found=upload.total_posts_in_file or 0,
+        posts_parsed=upload.posts_successfully_parsed or 0,
+        posts_skipped=upload.posts_skipped or 0,
+        error_message=upload.error_message
+    )
@@ -7,6 +7,18 @@ class AnalysisStartResponse(BaseModel):
     message: str
     analysis_job_id: UUID
     status: str
+    coalesced: bool = False # True when the request joined an already queued/running job
+
+class QueuedJobInfo(BaseModel):
+    job_id: UUID
+    queued_at: datetime
+    started_at: Optional[datetime]
+
+class AnalysisQueueResponse(BaseModel):
+    running: List[QueuedJobInfo]
+    queued: List[QueuedJobInfo]
+    queue_depth: int
+    max_concurrent: int
 
 class AnalysisResultResponse(BaseModel):
     analysis_job_id: UUID
@@ -14,3 +26,29 @@ class AnalysisResultResponse(BaseModel):
     created_at: datetime
     completed_at: Optional[datetime]
     results: Dict[str, Any]
+
+class TopicInfo(BaseModel):
+    topic_id: UUID
+    topic_name: str
+    topic_description: Optional[str]
+    confidence_score: Optional[float]
+    post_count: int
+
+class JobTopicsResponse(BaseModel):
+    analysis_job_id: UUID
+    topics: List[TopicInfo]
+
+class TopicPostInfo(BaseModel):
+    post_id: UUID
+    title: str
+    channel_name: Optional[str]
+    content_type: Optional[str]
+    watch_date: Optional[datetime]
+
+class TopicPostsResponse(BaseModel):
+    topic_id: UUID
+    topic_name: str
+    post_count: int
+    skip: int
+    limit: int
+    posts: List[TopicPostInfo]
@@ -1,7 +1,21 @@
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from uuid import UUID
+from datetime import datetime
 
 class UploadResponse(BaseModel):
     success: bool
     message: str
     data: Dict[str, Any]
+
+class UploadStatusResponse(BaseModel):
+    upload_id: UUID
+    file_name: str
+    status: str
+    mode: Optional[str]
+    uploaded_at: datetime
+    parsed_at: Optional[datetime]
+    total_found: int
+    posts_parsed: int
+    posts_skipped: int
+    error_message: Optional[str] = None
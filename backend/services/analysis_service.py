@@ -1,91 +1,301 @@
 from sqlalchemy.orm import Session
 from uuid import UUID
+from typing import Any, Dict
 import asyncio
+import numpy as np
 from datetime import datetime
 
+from config.database import SessionLocal
 from database import crud
-from ai_engine import sentiment, embeddings, clustering, summarizer, pinecone_client
+from ai_engine import sentiment, embeddings, clustering, summarizer
+from ai_engine.vector_index import get_vector_index, vector_sync_key
+from ai_engine.text_dedup import dedupe_texts, normalize_text, TextDeduplicator
+from ai_engine.embedding_store import get_embedding_store
+from services.pipeline import Stage, StageFailed, PipelineScheduler
+from services.executors import get_cpu_executor, run_io_bound
 from middleware.logger import logger
 from websocket.connection_manager import manager
 from websocket.events import WSMessage, ANALYSIS_STARTED, ANALYSIS_PROGRESS, ANALYSIS_COMPLETE
 
+# --- Stages ---
+# Each stage gets the job context and its dependencies' outputs, opens its own
+# DB session and stores its own results. Stages are module-level functions so
+# they can also be shipped to a process pool (ANALYSIS_EXECUTOR=process).
+# Posts are streamed in POST_FETCH_CHUNK_SIZE chunks of plain records, so
+# memory is bounded by the chunk size plus per-unique-title state.
+
+def _sentiment_stage(ctx: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Score posts without a cached sentiment for this model, then aggregate."""
+    scored_texts: Dict[str, Dict[str, Any]] = {}  # normalized title -> result, across chunks
+    total = positives = cached_count = 0
+    model_texts = 0
+    model_seconds = 0.0
+    fallback = False
+
+    with SessionLocal() as db:
+        for chunk in crud.iter_post_records(db):
+            cached = crud.get_post_sentiments(db, sentiment.MODEL_VERSION, post_ids=[p.id for p in chunk])
+            pending = [p for p in chunk if p.id not in cached]
+
+            new_texts = [p.title for p in pending if normalize_text(p.title) not in scored_texts]
+            pending_deduped = dedupe_texts(new_texts)
+            unique_sentiments, stats = sentiment.analyze_sentiment_batched(pending_deduped.unique_texts)
+            model_texts += stats["texts"]
+            model_seconds += stats["seconds"]
+            if stats["fallback"]:
+                # Neutral placeholders are neither cached nor counted as positive
+                fallback = True
+            else:
+                scored_texts.update(
+                    (normalize_text(text), result) for text, result in zip(pending_deduped.unique_texts, unique_sentiments)
+                )
+
+            scored = [
+                (p, scored_texts[normalize_text(p.title)]) for p in pending
+                if normalize_text(p.title) in scored_texts
+            ]
+            if scored:
+                crud.bulk_insert_sentiments(db, scored, sentiment.MODEL_VERSION)
+            cached.update((post.id, result) for post, result in scored)
+
+            total += len(chunk)
+            cached_count += len(chunk) - len(pending)
+            positives += sum(1 for p in chunk if cached.get(p.id, {}).get('label') == 'POSITIVE')
+
+        logger.info(f"Sentiment: {cached_count} cached, {total - cached_count} newly scored")
+        avg_sentiment = {
+            "positive_ratio": positives / total if total else 0.0,
+            "count": total,
+            "cached": cached_count,
+            "scored": total - cached_count,
+            "throughput": {
+                "texts": model_texts,
+                "seconds": round(model_seconds, 3),
+                "texts_per_second": round(model_texts / model_seconds, 1) if model_seconds > 0 else 0.0,
+                "fallback": fallback,
+            }
+        }
+        crud.upsert_analysis_result(db, ctx["job_id"], "sentiment_summary", avg_sentiment)
+    return avg_sentiment
+
+def _embeddings_stage(ctx: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Encode only posts missing from the local store, upsert only posts not
+    yet synced for this model into the current vector namespace. Once every
+    post is in it, that namespace is swapped in for queries and the ones it
+    replaces are deleted.
+    """
+    store = get_embedding_store(embeddings.MODEL_VERSION, embeddings.EMBEDDING_DIMENSION)
+    stored_texts: Dict[str, str] = {}  # normalized title -> content_hash of a stored vector
+    total = encoded = synced_count = 0
+    failed_count = 0
+    vector_index = get_vector_index()
+
+    with SessionLocal() as db:
+        namespace = crud.get_write_vector_namespace(db)
+        sync_key = vector_sync_key(embeddings.MODEL_VERSION, namespace)
+        for chunk in crud.iter_post_records(db):
+            total += len(chunk)
+            missing = set(store.missing([p.content_hash for p in chunk]))
+            for i, p in enumerate(chunk):
+                if i not in missing:
+                    stored_texts.setdefault(normalize_text(p.title), p.content_hash)
+
+            # Repeats of an already stored title reuse its vector
+            reuse = [chunk[i] for i in missing if normalize_text(chunk[i].title) in stored_texts]
+            if reuse:
+                store.add([p.content_hash for p in reuse],
+                          store.get([stored_texts[normalize_text(p.title)] for p in reuse]))
+
+            need = [chunk[i] for i in sorted(missing) if normalize_text(chunk[i].title) not in stored_texts]
+            if need:
+                need_deduped = dedupe_texts([p.title for p in need])
+                vectors = embeddings.generate_embeddings(need_deduped.unique_texts)
+                if len(vectors):
+                    store.add([p.content_hash for p in need], need_deduped.fan_out_array(vectors))
+                    encoded += len(need_deduped.unique_texts)
+                    for p in need:
+                        stored_texts.setdefault(normalize_text(p.title), p.content_hash)
+
+            synced = crud.get_synced_post_ids(db, sync_key, post_ids=[p.id for p in chunk])
+            to_sync = [p for p in chunk if p.id not in synced]
+            to_sync = [to_sync[i] for i in np.flatnonzero(store.lookup([p.content_hash for p in to_sync]) >= 0)]
+            if to_sync:
+                vectors = store.get([p.content_hash for p in to_sync])
+
+                # Prepare for the vector index (Pinecone or local)
+                index_vectors = []
+                for i, post in enumerate(to_sync):
+                    vector_list = vectors[i].tolist()
+                    metadata = {"title": post.title, "channel": post.channel_name, "date": str(post.watch_date)}
+                    index_vectors.append((str(post.id), vector_list, metadata))
+
+                result = vector_index.upsert_vectors(index_vectors, namespace=namespace)
+                failed = set(result.failed_ids)
+                for is_synced in (True, False):
+                    post_ids = [p.id for p in to_sync if (str(p.id) not in failed) == is_synced]
+                    if post_ids:
+                        crud.mark_vectors_synced(db, post_ids, sync_key, is_synced=is_synced,
+                                                 embedding_dimension=embeddings.EMBEDDING_DIMENSION)
+                synced_count += len(to_sync) - len(failed)
+                failed_count += len(failed)
+
+        # Swap the namespace in only when complete; failed vectors are retried
+        # on the next run and the previous namespace keeps serving meanwhile
+        if crud.count_synced_vectors(db, sync_key) >= total:
+            for stale in crud.mark_vector_namespace_live(db, namespace):
+                if vector_index.delete_namespace(stale):
+                    crud.delete_vector_namespace(db, stale)
+
+    logger.info(f"Embeddings: {total} posts, {encoded} texts newly encoded, {synced_count} synced to the vector "
+                f"index namespace '{namespace}', {failed_count} failed")
+    return {"encoded": encoded, "synced": synced_count, "failed": failed_count, "namespace": namespace}
+
+def _clustering_stage(ctx: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Dict]:
+    """
+    Cluster unique titles on the embeddings the embeddings stage cached.
+    Rewatches repeat the same title many times, so clustering runs once per
+    unique (normalized) title, weighted by how often it occurred.
+    """
+    deduper = TextDeduplicator()
+    representative_hashes = []
+    post_ids = []
+    post_texts = []
+
+    with SessionLocal() as db:
+        for chunk in crud.iter_post_records(db):
+            indices = deduper.add([p.title for p in chunk])
+            for p, idx in zip(chunk, indices.tolist()):
+                if idx == len(representative_hashes):
+                    representative_hashes.append(p.content_hash)
+            post_ids.extend(p.id for p in chunk)
+            post_texts.append(indices)
+
+        dedup_stats = deduper.stats()
+        crud.upsert_analysis_result(db, ctx["job_id"], "dedup_stats", dedup_stats)
+    logger.info(f"Deduplicated {dedup_stats['total_texts']} titles to {dedup_stats['unique_texts']} "
+                f"(ratio {dedup_stats['dedup_ratio']})")
+
+    store = get_embedding_store(embeddings.MODEL_VERSION, embeddings.EMBEDDING_DIMENSION)
+    vectors = store.get(representative_hashes) if not store.missing(representative_hashes) else None
+    if vectors is None:
+        logger.warning("Embeddings incomplete, clustering on TF-IDF instead")
+    clusters = clustering.cluster_posts(deduper.unique_texts, sample_weight=deduper.counts, embeddings=vectors)
+
+    # Fan unique-title labels back out to posts
+    unique_labels = np.full(len(deduper.unique_texts), -1, dtype=np.int64)
+    for cluster_id, data in clusters.items():
+        unique_labels[data['indices']] = cluster_id
+    post_labels = unique_labels[np.concatenate(post_texts)] if post_texts else unique_labels[:0]
+    post_ids = np.array(post_ids, dtype=object)
+
+    topics = []
+    for cluster_id, data in clusters.items():
+        topics.append({
+            "topic_name": f"Topic {cluster_id}", # Could use GPT to name these better
+            "topic_description": ", ".join(data['keywords']),
+            "confidence_score": 1.0,
+            "post_ids": post_ids[post_labels == cluster_id].tolist(),
+        })
+    with SessionLocal() as db:
+        # A retried job may have written topics before it was interrupted
+        crud.delete_topics_for_job(db, ctx["job_id"])
+        topic_ids = crud.create_topics(db, ctx["job_id"], topics)
+
+    # Memberships live in topic_posts; downstream stages only need the summary
+    # (string keys so the output survives a JSON checkpoint unchanged)
+    return {
+        str(cluster_id): {"topic_id": str(topic_id), "keywords": data['keywords'], "count": len(topic["post_ids"])}
+        for (cluster_id, data), topic, topic_id in zip(clusters.items(), topics, topic_ids)
+    }
+
+def _summary_stage(ctx: Dict[str, Any], inputs: Dict[str, Any]) -> str:
+    # Construct a prompt based on clusters
+    clusters = inputs["clustering"]
+    cluster_summary = "\n".join([f"Cluster {k}: {', '.join(v['keywords'])}" for k, v in clusters.items()])
+    summary_prompt = f"Analyze these video clusters from a user's watch history:\n{cluster_summary}\n\nWhat are the key behavioral patterns?"
+
+    # A Groq failure fails the stage (nothing is checkpointed), so the job
+    # can be retried from here
+    behavioral_summary = summarizer.generate_summary(summary_prompt, raise_errors=True)
+    with SessionLocal() as db:
+        crud.upsert_analysis_result(db, ctx["job_id"], "behavioral_summary", {"text": behavioral_summary})
+    return behavioral_summary
+
+def _persona_stage(ctx: Dict[str, Any], inputs: Dict[str, Any]) -> str:
+    persona_prompt = summarizer.generate_avatar_persona(inputs["summary"], raise_errors=True)
+    with SessionLocal() as db:
+        crud.upsert_analysis_result(db, ctx["job_id"], "avatar_persona", {"system_prompt": persona_prompt})
+    return persona_prompt
+
+ANALYSIS_STAGES = [
+    Stage("sentiment", _sentiment_stage, progress_message="Sentiment analysis complete"),
+    Stage("embeddings", _embeddings_stage, progress_message="Embeddings generated and synced"),
+    Stage("clustering", _clustering_stage, deps=("embeddings",), progress_message="Topic clustering complete"),
+    Stage("summary", _summary_stage, deps=("clustering",)),
+    Stage("persona", _persona_stage, deps=("summary",), progress_message="AI summaries generated"),
+]
+
 async def run_analysis_pipeline(job_id: UUID, db: Session):
     try:
         # 0. Notify Start
-        crud.update_analysis_job(db, job_id, status='in_progress', started_at=datetime.utcnow())
+        # Blocking DB work goes through the I/O pool so the event loop (and
+        # every other request/WebSocket) stays responsive while the job runs
+        await run_io_bound(crud.update_analysis_job, db, job_id, status='in_progress', started_at=datetime.utcnow(),
+                           error_message=None)
         await manager.broadcast(WSMessage(type=ANALYSIS_STARTED, data={"job_id": str(job_id)}))
-        
-        # 1. Fetch Data
-        posts = crud.get_all_posts(db)
-        if not posts:
+
+        # 1. Check Data (stages stream the posts themselves)
+        post_count = await run_io_bound(crud.count_posts, db)
+        if not post_count:
             logger.warning("No posts found for analysis.")
-            crud.update_analysis_job(db, job_id, status='failed', error_message="No posts to analyze")
+            await run_io_bound(crud.update_analysis_job, db, job_id, status='failed', error_message="No posts to analyze")
             return
+        logger.info(f"Starting analysis for {post_count} posts")
+
+        # 2. Run the stage DAG: sentiment overlaps embeddings -> clustering,
+        # the LLM summaries follow clustering. Every finished stage is
+        # checkpointed, so a retried or resumed job skips straight to the
+        # first stage that has not completed. A checkpoint computed before
+        # the latest upload changed the posts is stale and runs again
+        # (jobs are not started during an ingest, so the version read here
+        # holds for the whole run).
+        data_version = await run_io_bound(crud.get_data_version, db)
+        data_version = data_version.isoformat() if data_version else None
+        checkpoints = await run_io_bound(crud.get_stage_checkpoints, db, job_id)
+        completed = {
+            name: checkpoint["output"] for name, checkpoint in checkpoints.items()
+            if checkpoint.get("status") == "completed" and checkpoint.get("data_version") == data_version
+        }
+        stale = sorted(name for name, checkpoint in checkpoints.items()
+                       if checkpoint.get("status") == "completed" and name not in completed)
+        if stale:
+            logger.info(f"Job {job_id}: posts changed since {stale} completed, running them again")
+        if completed:
+            logger.info(f"Resuming job {job_id}, skipping completed stages: {sorted(completed)}")
+
+        async def on_stage_complete(stage: Stage, output: Any):
+            await run_io_bound(crud.save_stage_checkpoint, db, job_id, stage.name, "completed", output,
+                               data_version=data_version)
+            if stage.progress_message:
+                await manager.broadcast(WSMessage(type=ANALYSIS_PROGRESS, message=stage.progress_message))
+
+        context = {"job_id": job_id}
+        scheduler = PipelineScheduler(ANALYSIS_STAGES, executor=get_cpu_executor())
+        try:
+            run = await scheduler.run(context, on_stage_complete=on_stage_complete, skip=completed)
+        except StageFailed as e:
+            await run_io_bound(crud.save_stage_checkpoint, db, job_id, e.stage, "failed", error=str(e.error))
+            raise
+        timings = run.timings_dict()
+        timings["resumed_stages"] = sorted(completed)
+        await run_io_bound(crud.upsert_analysis_result, db, job_id, "stage_timings", timings)
 
-        titles = [p.title for p in posts]
-        logger.info(f"Starting analysis for {len(posts)} posts")
-
-        # 2. Sentiment Analysis
-        logger.info("Running sentiment analysis...")
-        sentiments = sentiment.analyze_sentiment(titles)
-        # Store sentiment results (simplified for MVP: just keeping aggregate stats/timeseries later)
-        # For now, let's just calculate average
-        pos_score = sum(1 for s in sentiments if s['label'] == 'POSITIVE') / len(sentiments)
-        avg_sentiment = {"positive_ratio": pos_score, "count": len(sentiments)}
-        crud.create_analysis_result(db, job_id, "sentiment_summary", avg_sentiment)
-        await manager.broadcast(WSMessage(type=ANALYSIS_PROGRESS, message="Sentiment analysis complete"))
-        
-        # 3. Embeddings & Pinecone
-        logger.info("Generating embeddings...")
-        vectors = embeddings.generate_embeddings(titles)
-        
-        # Prepare for Pinecone
-        pinecone_vectors = []
-        for i, post in enumerate(posts):
-            vector_list = vectors[i].tolist()
-            metadata = {"title": post.title, "channel": post.channel_name, "date": str(post.watch_date)}
-            pinecone_vectors.append((str(post.id), vector_list, metadata))
-        
-        success = pinecone_client.pinecone_client.upsert_vectors(pinecone_vectors)
-        if success:
-            logger.info("Embeddings uploaded to Pinecone")
-        await manager.broadcast(WSMessage(type=ANALYSIS_PROGRESS, message="Embeddings generated and synced"))
-
-        # 4. Clustering
-        logger.info("Running topic clustering...")
-        clusters = clustering.cluster_posts(titles)
-        # Save topics
-        for cluster_id, data in clusters.items():
-            db_topic = crud.models.Topic(
-                analysis_job_id=job_id,
-                topic_name=f"Topic {cluster_id}", # Could use GPT to name these better
-                confidence_score=1.0,
-                post_ids=data['indices'], # This needs to be mapped back to DB IDs if indices match 'posts' list order
-                post_count=data['count']
-            )
-            db.add(db_topic)
-        db.commit()
-        await manager.broadcast(WSMessage(type=ANALYSIS_PROGRESS, message="Topic clustering complete"))
-
-        # 5. Summarization (GPT-4)
-        logger.info("Generating AI summaries...")
-        # Construct a prompt based on clusters
-        cluster_summary = "\n".join([f"Cluster {k}: {', '.join(v['keywords'])}" for k, v in clusters.items()])
-        summary_prompt = f"Analyze these video clusters from a user's watch history:\n{cluster_summary}\n\nWhat are the key behavioral patterns?"
-        
-        behavioral_summary = summarizer.generate_summary(summary_prompt)
-        crud.create_analysis_result(db, job_id, "behavioral_summary", {"text": behavioral_summary})
-        
-        persona_prompt = summarizer.generate_avatar_persona(behavioral_summary)
-        crud.create_analysis_result(db, job_id, "avatar_persona", {"system_prompt": persona_prompt})
-        
-        await manager.broadcast(WSMessage(type=ANALYSIS_PROGRESS, message="AI summaries generated"))
-
-        # 6. Complete
-        crud.update_analysis_job(db, job_id, status='completed', completed_at=datetime.utcnow())
+        # 3. Complete
+        await run_io_bound(crud.update_analysis_job, db, job_id, status='completed', completed_at=datetime.utcnow())
         await manager.broadcast(WSMessage(type=ANALYSIS_COMPLETE, data={"job_id": str(job_id)}))
-        logger.info(f"Analysis job {job_id} completed successfully.")
+        logger.info(f"Analysis job {job_id} completed successfully in {run.wall_seconds:.1f}s.")
 
     except Exception as e:
         logger.error(f"Analysis job failed: {e}", exc_info=True)
-        crud.update_analysis_job(db, job_id, status='failed', error_message=str(e))
+        await run_io_bound(crud.update_analysis_job, db, job_id, status='failed', error_message=str(e))
@@ -5,7 +5,7 @@ from datetime import datetime
 from typing import Dict, Any
 
 from database import crud
-from ai_engine.summarizer import client, settings
+from ai_engine.summarizer import get_client, settings
 from middleware.logger import logger
 
 def generate_autopsy_report(job_id: UUID, db: Session) -> Dict[str, Any]:
@@ -30,6 +30,7 @@ def generate_autopsy_report(job_id: UUID, db: Session) -> Dict[str, Any]:
     # Format chat history
     chat_history_text = "\n".join([f"User: {c.user_question}\nAvatar: {c.avatar_response}" for c in conversations[-20:]]) # Last 20 interactions
     
+    client = get_client()
     if not client:
         return {
             "error": "LLM Client not initialized",
@@ -0,0 +1,60 @@
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from config.settings import settings
+from middleware.logger import logger
+
+EXECUTOR_KINDS = ("thread", "process")
+
+# Blocking I/O (DB queries, HTTP calls to Groq/Pinecone) from async code
+_io_executor = ThreadPoolExecutor(max_workers=settings.IO_WORKERS, thread_name_prefix="io")
+
+# Model inference, clustering and other CPU-heavy analysis work
+_cpu_executor: Optional[Executor] = None
+_cpu_lock = threading.Lock()
+
+def mp_context():
+    """
+    Start method for worker processes. Never fork the (multi-threaded)
+    server process directly: children could inherit locks held by other
+    threads. forkserver also avoids re-importing the app in every worker.
+    """
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(start_method)
+
+def get_cpu_executor() -> Executor:
+    """
+    Shared pool for CPU-bound stages, chosen by ANALYSIS_EXECUTOR:
+    'thread' (default) keeps models loaded once in the server process and
+    relies on torch/numpy releasing the GIL; 'process' isolates stages in
+    worker processes, each loading its own copy of the models.
+    """
+    global _cpu_executor
+    with _cpu_lock:
+        if _cpu_executor is None:
+            kind = settings.ANALYSIS_EXECUTOR
+            if kind not in EXECUTOR_KINDS:
+                raise ValueError(f"ANALYSIS_EXECUTOR must be one of {EXECUTOR_KINDS}, got '{kind}'")
+            if kind == "process":
+                _cpu_executor = ProcessPoolExecutor(max_workers=settings.ANALYSIS_STAGE_WORKERS, mp_context=mp_context())
+            else:
+                _cpu_executor = ThreadPoolExecutor(max_workers=settings.ANALYSIS_STAGE_WORKERS,
+                                                   thread_name_prefix="analysis")
+            logger.info(f"Analysis executor: {kind} pool with {settings.ANALYSIS_STAGE_WORKERS} workers")
+        return _cpu_executor
+
+async def run_io_bound(fn: Callable, *args: Any, **kwargs: Any) -> Any:
+    """Run blocking I/O on the I/O pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, functools.partial(fn, *args, **kwargs))
+
+def shutdown_executors():
+    global _cpu_executor
+    with _cpu_lock:
+        if _cpu_executor is not None:
+            _cpu_executor.shutdown(wait=False, cancel_futures=True)
+            _cpu_executor = None
+    _io_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,239 @@
+import asyncio
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy.engine import Connection
+
+from config.settings import settings
+from config.database import SessionLocal
+from database import crud, locks
+from services.executors import run_io_bound
+from services.analysis_service import run_analysis_pipeline
+from middleware.logger import logger
+
+class IngestInProgressError(Exception):
+    """Raised when a replace upload is still being ingested (it deletes all jobs when it starts)."""
+
+class AnalysisJobQueue:
+    """
+    Analysis job queue shared by every API worker process, with the
+    analysis_jobs table as the queue.
+
+    Submitting creates a 'pending' job, or joins an equivalent one, under
+    locks.lock_queue_state, so requests landing on different workers cannot
+    both create a job (nor race a replace upload, see upload_service). Every process runs a dispatcher that
+    claims jobs by taking a session-level advisory lock on the job and
+    holding it, on a connection of its own, until the job finishes. At most
+    ANALYSIS_MAX_CONCURRENT_JOBS jobs run across all workers, because a
+    dispatcher first has to take one of that many slot locks.
+
+    Every job analyzes the whole post table, so a new request is coalesced
+    onto a job that would produce the same result: any pending job (jobs
+    are not started while an upload is being ingested, so a pending job
+    always sees the latest data), or a running job that started after the
+    latest upload finished, provided no ingest is in progress. So at most
+    one new job is ever waiting; retried jobs queue alongside it.
+
+    When a worker dies its connection closes and Postgres releases its
+    locks, so the job it was running ('in_progress' but unclaimed) is
+    resumed by whichever worker's dispatcher sees it first (with
+    RESUME_INTERRUPTED_JOBS).
+    """
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max_concurrent
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._running: Dict[UUID, asyncio.Task] = {}
+
+    def start(self):
+        """Start this process's dispatcher (idempotent)."""
+        # Created lazily so everything binds to the server's running loop
+        if self._dispatcher is None:
+            self._wake = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch(), name="analysis-dispatcher")
+
+    async def submit(self) -> Tuple[UUID, bool]:
+        """
+        Queue an analysis job, or join an equivalent one.
+        Returns (job_id, coalesced).
+        """
+        self.start()
+        job_id, coalesced = await run_io_bound(_submit_job)
+        if coalesced:
+            logger.info(f"Analysis request coalesced onto job {job_id}")
+        else:
+            logger.info(f"Analysis job {job_id} queued")
+            self._wake.set()
+        return job_id, coalesced
+
+    async def retry(self, job_id: UUID) -> bool:
+        """
+        Re-queue an existing job; it resumes from its last checkpoint.
+        Returns False if the job is already queued or running.
+        """
+        self.start()
+        requeued = await run_io_bound(_retry_job, job_id)
+        if requeued:
+            self._wake.set()
+        return requeued
+
+    async def job_status(self, job_id: UUID) -> Optional[str]:
+        return await run_io_bound(_job_status, job_id)
+
+    async def _dispatch(self):
+        while True:
+            self._wake.clear()
+            try:
+                while True:
+                    claim = await run_io_bound(_claim_next_job, self.max_concurrent,
+                                               settings.RESUME_INTERRUPTED_JOBS)
+                    if claim is None:
+                        break
+                    job_id, conn = claim
+                    self._running[job_id] = asyncio.create_task(self._run(job_id, conn), name=f"analysis-{job_id}")
+            except Exception as e:
+                logger.error(f"Analysis dispatcher failed to claim a job: {e}", exc_info=True)
+            # Woken by a local submit/finish; jobs submitted on other workers
+            # (or freed slots) are noticed on the next poll
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.ANALYSIS_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, job_id: UUID, conn: Connection):
+        logger.info(f"Analysis job {job_id} claimed by this worker")
+        db = SessionLocal()
+        try:
+            await run_analysis_pipeline(job_id, db)
+        except Exception as e:
+            logger.error(f"Analysis worker crashed on job {job_id}: {e}", exc_info=True)
+        finally:
+            db.close()
+            await run_io_bound(locks.release, conn)
+            self._running.pop(job_id, None)
+            self._wake.set()
+
+    async def status(self) -> Dict:
+        running, queued = await run_io_bound(_queue_snapshot)
+        return {
+            "running": running,
+            "queued": queued,
+            "queue_depth": len(queued),
+            "max_concurrent": self.max_concurrent,
+        }
+
+    async def shutdown(self):
+        tasks = list(self._running.values()) + ([self._dispatcher] if self._dispatcher else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._dispatcher = None
+        self._running = {}
+
+def _submit_job() -> Tuple[UUID, bool]:
+    with SessionLocal() as db:
+        # Serializes submissions across workers until the commit below
+        locks.lock_queue_state(db)
+        _check_no_replace_ingest(db)
+        existing = _find_equivalent_job(db)
+        if existing:
+            db.commit() # ends the transaction and its lock
+            return existing, True
+        return crud.create_analysis_job(db).id, False
+
+def _check_no_replace_ingest(db):
+    if any(upload.upload_mode == 'replace' for upload in crud.get_active_uploads(db)):
+        db.commit()
+        raise IngestInProgressError("An upload is still being processed; analyze once it has finished")
+
+def _find_equivalent_job(db) -> Optional[UUID]:
+    pending = crud.get_analysis_jobs_by_status(db, ["pending"])
+    if pending:
+        return pending[0].id
+    running = crud.get_analysis_jobs_by_status(db, ["in_progress"])
+    # While posts are still being ingested a running job cannot have seen
+    # them all, whenever it started
+    if running and not crud.get_active_uploads(db):
+        # started_at is reset on every (re)run, which also discards the
+        # checkpoints older than the data version, so a job that started
+        # after it runs every stage on the current posts
+        data_version = crud.get_data_version(db)
+        for job in running:
+            if data_version is None or (job.started_at and job.started_at >= data_version):
+                return job.id
+    return None
+
+def _retry_job(job_id: UUID) -> bool:
+    with SessionLocal() as db:
+        locks.lock_queue_state(db)
+        _check_no_replace_ingest(db)
+        status = _status_of(db, job_id)
+        if status in (None, 'pending') or (status == 'in_progress' and job_id in _claimed_job_ids(db)):
+            db.commit()
+            return False
+        crud.update_analysis_job(db, job_id, status='pending', error_message=None, completed_at=None)
+        return True
+
+def _job_status(job_id: UUID) -> Optional[str]:
+    with SessionLocal() as db:
+        return _status_of(db, job_id)
+
+def _claim_next_job(max_concurrent: int, include_interrupted: bool) -> Optional[Tuple[UUID, Connection]]:
+    """
+    Take a free run slot and the oldest claimable job on a dedicated
+    connection; both locks live as long as that connection holds them.
+    """
+    statuses = ['pending', 'in_progress'] if include_interrupted else ['pending']
+    conn = locks.lock_connection()
+    try:
+        if locks.try_lock_slot(conn, max_concurrent) is None:
+            locks.release(conn)
+            return None
+        with SessionLocal(bind=conn) as db:
+            # Analyzing a half-ingested upload would be stale as soon as it
+            # finished; queued jobs wait for the ingest instead
+            if crud.get_active_uploads(db):
+                locks.release(conn)
+                return None
+            for job_id in [job.id for job in crud.get_analysis_jobs_by_status(db, statuses)]:
+                if not locks.try_lock_record(conn, job_id):
+                    continue # claimed by another worker
+                # It may have finished between the select and the lock
+                db.expire_all()
+                if _status_of(db, job_id) in statuses:
+                    return job_id, conn
+                locks.unlock_record(conn, job_id)
+        locks.release(conn)
+        return None
+    except Exception:
+        locks.release(conn)
+        raise
+
+def _status_of(db, job_id: UUID) -> Optional[str]:
+    job = db.query(crud.models.AnalysisJob).filter(crud.models.AnalysisJob.id == job_id).first()
+    return job.status if job else None
+
+def _claimed_job_ids(db) -> Set[UUID]:
+    """Unfinished jobs some worker currently holds the advisory lock on."""
+    jobs = crud.get_analysis_jobs_by_status(db, ['pending', 'in_progress'])
+    if not jobs:
+        return set()
+    held = locks.held_record_keys(db)
+    return {job.id for job in jobs if locks.record_key(job.id) in held}
+
+def _queue_snapshot() -> Tuple[List[Dict], List[Dict]]:
+    with SessionLocal() as db:
+        claimed = _claimed_job_ids(db)
+        running = [
+            {"job_id": job.id, "queued_at": job.created_at, "started_at": job.started_at}
+            for job in crud.get_analysis_jobs_by_status(db, ['in_progress']) if job.id in claimed
+        ]
+        queued = [
+            {"job_id": job.id, "queued_at": job.created_at, "started_at": None}
+            for job in crud.get_analysis_jobs_by_status(db, ['pending'])
+        ]
+        return running, queued
+
+# Singleton instance
+job_queue = AnalysisJobQueue(max_concurrent=settings.ANALYSIS_MAX_CONCURRENT_JOBS)
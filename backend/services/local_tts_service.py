@@ -1,39 +1,47 @@
 import os
-import soundfile as sf
-import torch
 import uuid
 from pathlib import Path
 from config.settings import settings
+from ai_engine.model_registry import model_registry
 from middleware.logger import logger
 
-# Global instance
-_f5_model = None
+# Loaded through the model registry, which unloads it again when idle and
+# memory is needed (it is the largest of the local models)
+def _load_f5_model():
+    from f5_tts.api import F5TTS
+    logger.info("Loading Local F5-TTS Model (this may take time)...")
+    # Initialize F5TTS. It might download weights to HF_HOME automatically.
+    # We assume the user has set HF_HOME via instructions if they want it on E:
+    model = F5TTS()
+    logger.info("Local F5-TTS Model Loaded successfully.")
+    return model
 
-def get_f5_model():
-    global _f5_model
-    if _f5_model:
-        return _f5_model
-        
+model_registry.register("f5_tts", _load_f5_model, size_hint_mb=1500)
+
+def is_loaded() -> bool:
+    return model_registry.is_loaded("f5_tts")
+
+def _acquire_f5_model():
+    """Hold the model (pair with model_registry.release), or None if it cannot load."""
     try:
-        from f5_tts.api import F5TTS
-        logger.info("Loading Local F5-TTS Model (this may take time)...")
-        # Initialize F5TTS. It might download weights to HF_HOME automatically.
-        # We assume the user has set HF_HOME via instructions if they want it on E:
-        _f5_model = F5TTS() 
-        logger.info("Local F5-TTS Model Loaded successfully.")
+        return model_registry.acquire("f5_tts")
     except ImportError:
         logger.error("F5-TTS package not found. Please install it manually.")
-        return None
     except Exception as e:
         logger.error(f"Failed to load F5-TTS: {e}")
-        return None
-    return _f5_model
+    return None
+
+def get_f5_model():
+    model = _acquire_f5_model()
+    if model is not None:
+        model_registry.release("f5_tts")
+    return model
 
 def generate_audio_local(text: str, ref_audio_path: str = None, ref_text: str = "") -> str:
     """
     Generate audio using local F5-TTS.
     """
-    model = get_f5_model()
+    model = _acquire_f5_model()
     if not model:
         logger.warning("F5-TTS model not available. Skipping generation.")
         return ""
@@ -70,6 +78,7 @@ def generate_audio_local(text: str, ref_audio_path: str = None, ref_text: str =
         )
         
         # Save to file
+        import soundfile as sf
         sf.write(output_path, wav, sr)
         logger.info(f"Generated audio saved to {output_path}")
         
@@ -80,3 +89,5 @@ def generate_audio_local(text: str, ref_audio_path: str = None, ref_text: str =
     except Exception as e:
         logger.error(f"Local F5-TTS Generation Error: {e}")
         return ""
+    finally:
+        model_registry.release("f5_tts")
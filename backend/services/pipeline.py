@@ -0,0 +1,158 @@
+import asyncio
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from middleware.logger import logger
+
+class StageFailed(Exception):
+    """A stage raised; `stage` names it and the original error is the cause."""
+
+    def __init__(self, stage: str, error: BaseException):
+        super().__init__(f"Stage '{stage}' failed: {error}")
+        self.stage = stage
+        self.error = error
+
+@dataclass
+class Stage:
+    """
+    One node of the analysis DAG. `fn` receives the shared context dict plus
+    the outputs of its dependencies ({dep_name: output}) and returns its own
+    output. It runs on an executor thread, so it must not touch the event
+    loop or a DB session owned by another thread.
+    """
+    name: str
+    fn: Callable[[Dict[str, Any], Dict[str, Any]], Any]
+    deps: Tuple[str, ...] = ()
+    progress_message: Optional[str] = None
+
+@dataclass
+class StageTiming:
+    wall_seconds: float
+    # CPU time of the whole process while the stage ran, so it includes the
+    # stage's native threads (torch, BLAS); stages running in parallel in the
+    # same process each count the others' CPU time too
+    cpu_seconds: float
+    started_at: float   # seconds since the pipeline started
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "wall_seconds": round(self.wall_seconds, 3),
+            "cpu_seconds": round(self.cpu_seconds, 3),
+            "started_at": round(self.started_at, 3),
+        }
+
+@dataclass
+class PipelineRun:
+    outputs: Dict[str, Any] = field(default_factory=dict)
+    timings: Dict[str, StageTiming] = field(default_factory=dict)
+    wall_seconds: float = 0.0
+
+    def timings_dict(self) -> Dict[str, Any]:
+        return {
+            "stages": {name: timing.to_dict() for name, timing in self.timings.items()},
+            "total_wall_seconds": round(self.wall_seconds, 3),
+            "sum_stage_wall_seconds": round(sum(t.wall_seconds for t in self.timings.values()), 3),
+        }
+
+class PipelineScheduler:
+    """
+    Runs a DAG of stages, starting every stage as soon as all of its
+    dependencies have finished, so independent stages overlap on the
+    executor and total latency tends towards the critical path.
+    """
+
+    def __init__(self, stages: Sequence[Stage], executor: Optional[Executor] = None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.executor = executor
+        self._validate(stages)
+
+    def _validate(self, stages: Sequence[Stage]):
+        if len(self.stages) != len(stages):
+            raise ValueError("Duplicate stage names")
+        for stage in stages:
+            unknown = [dep for dep in stage.deps if dep not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages: {unknown}")
+        stage_order(stages)
+
+    async def run(self, context: Dict[str, Any],
+                  on_stage_complete: Optional[Callable[[Stage, Any], Awaitable[None]]] = None,
+                  skip: Optional[Dict[str, Any]] = None) -> PipelineRun:
+        """
+        Execute the DAG. `skip` maps stage names to outputs that are already
+        known; those stages are treated as finished without running.
+        The first failing stage cancels everything not yet started; once the
+        running stages have drained (and been reported as complete) it is
+        raised as StageFailed.
+        """
+        loop = asyncio.get_running_loop()
+        run = PipelineRun(outputs=dict(skip or {}))
+        pipeline_start = time.perf_counter()
+        pending = {name: stage for name, stage in self.stages.items() if name not in run.outputs}
+        running: Dict[asyncio.Future, Stage] = {}
+        error: Optional[StageFailed] = None
+
+        def start_ready():
+            for name in list(pending):
+                stage = pending[name]
+                if all(dep in run.outputs for dep in stage.deps):
+                    del pending[name]
+                    inputs = {dep: run.outputs[dep] for dep in stage.deps}
+                    future = loop.run_in_executor(
+                        self.executor, _run_timed, stage, context, inputs, pipeline_start
+                    )
+                    running[future] = stage
+
+        start_ready()
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    output, timing = future.result()
+                except Exception as e:
+                    logger.error(f"Stage '{stage.name}' failed: {e}")
+                    if error is None:
+                        error = StageFailed(stage.name, e)
+                    continue
+                run.outputs[stage.name] = output
+                run.timings[stage.name] = timing
+                logger.info(f"Stage '{stage.name}' finished in {timing.wall_seconds:.2f}s "
+                            f"(cpu {timing.cpu_seconds:.2f}s)")
+                if on_stage_complete:
+                    await on_stage_complete(stage, output)
+            if error is None:
+                start_ready()
+
+        run.wall_seconds = time.perf_counter() - pipeline_start
+        if error is not None:
+            raise error from error.error
+        return run
+
+def _run_timed(stage: Stage, context: Dict[str, Any], inputs: Dict[str, Any],
+               pipeline_start: float) -> Tuple[Any, StageTiming]:
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    output = stage.fn(context, inputs)
+    timing = StageTiming(
+        wall_seconds=time.perf_counter() - wall_start,
+        cpu_seconds=time.process_time() - cpu_start,
+        started_at=wall_start - pipeline_start,
+    )
+    return output, timing
+
+def stage_order(stages: Sequence[Stage]) -> List[str]:
+    """A topological order of the stages; raises ValueError on a cycle."""
+    remaining = {stage.name: set(stage.deps) for stage in stages}
+    order = []
+    while remaining:
+        ready = sorted(name for name, deps in remaining.items() if not deps)
+        if not ready:
+            raise ValueError(f"Stage dependency cycle among: {sorted(remaining)}")
+        order.extend(ready)
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return order
@@ -29,7 +29,8 @@ def build_conversation_context(db: Session, job_id: UUID, query: str) -> str:
         context_parts.append(f"\nUSER BEHAVIORAL SUMMARY:\n{summary_text}")
         
     # 2. RAG - Find relevant posts
-    relevant_items = embeddings_retriever.search_relevant_posts(query, top_k=3)
+    namespace = crud.get_query_vector_namespace(db)
+    relevant_items = embeddings_retriever.search_relevant_posts(query, top_k=3, namespace=namespace)
     
     if relevant_items:
         evidence_text = "\nRELEVANT WATCH HISTORY (Use as evidence):\n"
@@ -1,95 +1,234 @@
+import asyncio
+import functools
 import os
-import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from uuid import uuid4
+from typing import Optional, Tuple
+from uuid import UUID, uuid4
+from sqlalchemy.engine import Connection
 
-from utils.file_utils import save_temp_file, extract_zip, detect_file_type
+from config.settings import settings
+from config.database import SessionLocal
+from utils.file_utils import save_temp_file, detect_file_type
+from utils.archive_reader import ZipArchiveReader
 from parsers.parser_factory import ParserFactory
-from database import crud
+from database import crud, locks
 from schemas.upload_schema import UploadResponse
 from middleware.logger import logger
 from websocket.connection_manager import manager
-from websocket.events import WSMessage, UPLOAD_COMPLETE
-from ai_engine.pinecone_client import pinecone_client
+from websocket.events import (
+    WSMessage, UPLOAD_STARTED, UPLOAD_PROGRESS, PARSING_PROGRESS, UPLOAD_COMPLETE, UPLOAD_FAILED
+)
 
-async def process_upload(file: UploadFile, db: Session) -> UploadResponse:
-    temp_zip_path = None
-    extracted_path = None
-    
+UPLOAD_MODES = ("replace", "incremental")
+
+class UploadConflictError(Exception):
+    """Raised when an upload would clash with an ingest or analysis job that is still active."""
+
+# Ingest runs here so blocking unzip/parse/DB work never touches the event loop
+_ingest_executor = ThreadPoolExecutor(max_workers=settings.UPLOAD_WORKERS, thread_name_prefix="ingest")
+
+async def process_upload(file: UploadFile, db: Session, mode: str = "replace") -> UploadResponse:
+    """
+    Persist the upload and hand it to a background ingest job.
+    Returns immediately with the upload id, which doubles as the job id.
+    """
+    # 1. Save Upload (the only copy we write; the archive is streamed from here)
+    temp_zip_path = await run_in_threadpool(save_temp_file, file, file.filename)
+    file_size = os.path.getsize(temp_zip_path)
+    logger.info(f"File saved to {temp_zip_path}, size: {file_size}")
+
+    if not zipfile.is_zipfile(temp_zip_path):
+        os.remove(temp_zip_path)
+        raise zipfile.BadZipFile(f"{file.filename} is not a zip archive")
+
+    # 2. Create Metadata Record (upload_status='parsing' until the job finishes)
     try:
-        # 0. Cleanup Old Data (Fresh Start)
-        logger.info("Clearing old data for fresh upload...")
-        crud.clear_all_data(db)
-        pinecone_client.clear_index()
-        logger.info("Old data cleared.")
-
-        # 1. Save Upload
-        temp_zip_path = save_temp_file(file, file.filename)
-        file_size = os.path.getsize(temp_zip_path)
-        logger.info(f"File saved to {temp_zip_path}, size: {file_size}")
-
-        # 2. Extract
-        extracted_path = extract_zip(temp_zip_path)
-        logger.info(f"File extracted to {extracted_path}")
-
-        # 3. Detect Type
-        file_type = detect_file_type(extracted_path)
-        logger.info(f"Detected file type: {file_type}")
+        upload_id, lock_conn = await run_in_threadpool(_register_upload, file.filename, file_size, mode)
+    except UploadConflictError:
+        os.remove(temp_zip_path)
+        raise
+
+    await manager.broadcast(WSMessage(type=UPLOAD_STARTED, data={"upload_id": str(upload_id), "mode": mode}))
+
+    loop = asyncio.get_running_loop()
+    try:
+        future = loop.run_in_executor(_ingest_executor, run_ingest_job, upload_id, temp_zip_path, mode, loop, lock_conn)
+    except RuntimeError as e: # executor already shut down
+        await run_in_threadpool(_fail_upload, upload_id, temp_zip_path, lock_conn, str(e))
+        raise
+    future.add_done_callback(functools.partial(_on_ingest_done, upload_id, temp_zip_path, lock_conn, loop))
 
-        # 4. Create Metadata Record
-        metadata = crud.create_upload_metadata(db, file.filename, file_size)
+    return UploadResponse(
+        success=True,
+        message="Upload accepted. Processing in background.",
+        data={"upload_id": str(upload_id), "status": "parsing", "mode": mode}
+    )
 
-        # 5. Parse
+def _register_upload(file_name: str, file_size: int, mode: str) -> Tuple[UUID, Connection]:
+    """
+    Create the upload's metadata row, locked for its ingest job on the
+    returned connection (see database/locks.py).
+
+    A replace upload deletes every post, upload and analysis job when its
+    ingest starts, so it is refused while another upload is being ingested
+    or a job is queued or running; an incremental upload is refused while
+    a replace upload is being ingested. The check and the insert happen
+    under the queue-state lock, so two workers cannot both pass it.
+    """
+    upload_id = uuid4()
+    lock_conn = locks.lock_connection()
+    try:
+        with SessionLocal() as db:
+            locks.lock_queue_state(db)
+            active_uploads = crud.get_active_uploads(db)
+            if mode == "replace":
+                held = locks.held_record_keys(db)
+                active_jobs = [
+                    job for job in crud.get_analysis_jobs_by_status(db, ['pending', 'in_progress'])
+                    # An unclaimed in_progress job only counts if it is going to be resumed
+                    if job.status == 'pending' or locks.record_key(job.id) in held or settings.RESUME_INTERRUPTED_JOBS
+                ]
+                conflict = ("another upload is still being processed" if active_uploads
+                            else "an analysis job is queued or running" if active_jobs else None)
+            else:
+                conflict = ("a replace upload is still being processed"
+                            if any(upload.upload_mode == "replace" for upload in active_uploads) else None)
+            if conflict:
+                db.commit() # keeps stale uploads marked failed, ends the lock
+                raise UploadConflictError(f"Cannot start the upload ({mode} mode): {conflict}")
+
+            # Lock the row before committing it, so nobody sees it unlocked
+            locks.try_lock_record(lock_conn, upload_id)
+            crud.create_upload_metadata(db, file_name, file_size, upload_mode=mode, upload_id=upload_id)
+        return upload_id, lock_conn
+    except Exception:
+        locks.release(lock_conn)
+        raise
+
+def _on_ingest_done(upload_id: UUID, temp_zip_path: str, lock_conn: Connection,
+                    loop: asyncio.AbstractEventLoop, future: asyncio.Future):
+    # run_ingest_job handles its own errors; this catches it never running
+    # (cancelled at shutdown) or failing inside that handling
+    if future.cancelled():
+        error = "Ingest cancelled"
+    elif future.exception() is not None:
+        error = str(future.exception())
+        logger.error(f"Ingest job for upload {upload_id} crashed: {error}", exc_info=future.exception())
+    else:
+        return
+    loop.run_in_executor(None, _fail_upload, upload_id, temp_zip_path, lock_conn, error)
+
+def _fail_upload(upload_id: UUID, temp_zip_path: str, lock_conn: Connection, error: str):
+    try:
+        with SessionLocal() as db:
+            crud.update_upload_metadata(db, upload_id, upload_status='failed', error_message=error)
+    except Exception as e:
+        logger.error(f"Could not mark upload {upload_id} failed: {e}")
+    finally:
+        locks.release(lock_conn)
+        if os.path.exists(temp_zip_path):
+            os.remove(temp_zip_path)
+
+def _clear_previous_data(db: Session, upload_id: UUID):
+    """Stage the replace upload's deletes in `db`'s transaction; the first insert commits them."""
+    logger.info("Clearing old data for fresh upload...")
+    crud.clear_all_data(db, keep_upload_id=upload_id, commit=False)
+    # Vectors go to a fresh namespace; the current one keeps serving
+    # queries until the next analysis has filled the new one
+    crud.create_vector_namespace(db, f"upload-{upload_id}", upload_id=upload_id, commit=False)
+
+def run_ingest_job(upload_id: UUID, temp_zip_path: str, mode: str, loop: asyncio.AbstractEventLoop,
+                   lock_conn: Optional[Connection] = None):
+    """
+    Background ingest: index the archive, parse it and bulk insert posts,
+    reporting progress over the WebSocket. Runs in a worker thread with its
+    own DB session; `lock_conn` holds the upload's lock until it finishes.
+    """
+    db = SessionLocal()
+    archive = None
+
+    def notify(event_type: str, data: dict = None, message: str = None):
+        manager.broadcast_threadsafe(WSMessage(type=event_type, data=data, message=message), loop)
+
+    try:
+        # 1. Index the archive (members are streamed on demand, never extracted)
+        archive = ZipArchiveReader(temp_zip_path)
+        logger.info(f"Indexed {len(archive.names())} archive members")
+
+        # 2. Detect Type and check the archive before touching existing data
+        file_type = detect_file_type(archive)
+        logger.info(f"Detected file type: {file_type}")
         parser = ParserFactory.get_parser(file_type)
-        parsed_posts = parser.parse(extracted_path)
-        logger.info(f"Parser returned {len(parsed_posts)} posts")
-        
-        # 6. Deduplicate & Insert
+        plan = parser.check_archive(archive)
+        notify(UPLOAD_PROGRESS, {"upload_id": str(upload_id), "stage": "parsing", "file_type": file_type},
+               "Archive indexed, parsing")
+
+        # 3. Parse, Deduplicate & Insert (batch by batch to keep memory flat).
+        # A replace upload clears the old data in the same transaction as its
+        # first insert, so an archive that fails before yielding any post
+        # leaves the existing data as it was. Incremental uploads keep
+        # existing posts and vectors and only add content hashes we haven't
+        # seen yet.
+        clear_pending = mode == "replace"
+        total_found = 0
         new_count = 0
         skipped_count = 0
-        
-        for post_data in parsed_posts:
-            existing = crud.get_post_by_hash(db, post_data["content_hash"])
-            if existing:
-                skipped_count += 1
-            else:
-                crud.create_post(db, post_data)
-                new_count += 1
-                
-        # 7. Update Metadata
-        crud.update_upload_metadata(db, metadata.id, 
-                                    total_posts_in_file=len(parsed_posts),
+
+        for batch in parser.parse_stream(archive, batch_size=settings.UPLOAD_BATCH_SIZE, plan=plan):
+            if clear_pending and len(batch):
+                notify(UPLOAD_PROGRESS, {"upload_id": str(upload_id), "stage": "clearing"}, "Clearing previous data")
+                _clear_previous_data(db, upload_id)
+                clear_pending = False
+            total_found += len(batch)
+            inserted, skipped = crud.bulk_insert_posts(db, batch, upload_id=upload_id)
+            new_count += inserted
+            skipped_count += skipped
+            notify(PARSING_PROGRESS, {
+                "upload_id": str(upload_id),
+                "total_found": total_found,
+                "posts_parsed": new_count,
+                "posts_skipped": skipped_count
+            })
+        logger.info(f"Parser returned {total_found} posts")
+        if clear_pending:
+            raise ValueError("No posts found in the archive; the existing data was kept")
+
+        # 4. Update Metadata
+        crud.update_upload_metadata(db, upload_id,
+                                    total_posts_in_file=total_found,
                                     posts_successfully_parsed=new_count,
                                     posts_skipped=skipped_count,
-                                    upload_status='completed')
-        
-        # 8. Notify WebSocket
+                                    upload_status='completed',
+                                    parsed_at=datetime.utcnow())
+
+        # 5. Notify WebSocket
         stats = {
+            "upload_id": str(upload_id),
+            "mode": mode,
             "posts_parsed": new_count,
             "posts_skipped": skipped_count,
-            "total_found": len(parsed_posts)
+            "total_found": total_found
         }
-        await manager.broadcast(WSMessage(type=UPLOAD_COMPLETE, data=stats))
-
-        return UploadResponse(
-            success=True,
-            message=f"Successfully processed {new_count} new posts.",
-            data=stats
-        )
+        notify(UPLOAD_COMPLETE, stats)
+        logger.info(f"Upload {upload_id} ingested: {new_count} new posts.")
 
     except Exception as e:
         logger.error(f"Upload processing failed: {e}", exc_info=True)
-        if 'metadata' in locals():
-             crud.update_upload_metadata(db, metadata.id, upload_status='failed')
-        raise e
-        
+        db.rollback()
+        crud.update_upload_metadata(db, upload_id, upload_status='failed', error_message=str(e))
+        notify(UPLOAD_FAILED, {"upload_id": str(upload_id)}, str(e))
+
     finally:
         # Cleanup
-        if temp_zip_path and os.path.exists(temp_zip_path):
+        if archive:
+            archive.close()
+        if os.path.exists(temp_zip_path):
             os.remove(temp_zip_path)
-        if extracted_path and os.path.exists(extracted_path):
-            try:
-                shutil.rmtree(extracted_path)
-            except Exception:
-                pass
+        db.close()
+        if lock_conn is not None:
+            locks.release(lock_conn)
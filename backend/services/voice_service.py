@@ -12,23 +12,30 @@ for ffmpeg_path in ffmpeg_paths:
         os.environ["PATH"] = ffmpeg_path + os.pathsep + os.environ.get("PATH", "")
         break
 
-import whisper
 from pathlib import Path
 from config.settings import settings
+from ai_engine.model_registry import model_registry
 from middleware.logger import logger
 
-# Load Whisper model once at startup (base model for speed/memory balance)
-_whisper_model = None
+# Loaded through the model registry on first transcription (base model for
+# speed/memory balance) and unloaded again when idle and memory is needed;
+# whisper itself is imported then too, it pulls in torch
+def _load_whisper_model():
+    import whisper
+    logger.info("Loading Whisper 'base' model...")
+    model = whisper.load_model("base")
+    logger.info("Whisper model loaded successfully.")
+    return model
+
+model_registry.register("whisper", _load_whisper_model, size_hint_mb=300)
+
+def is_loaded() -> bool:
+    return model_registry.is_loaded("whisper")
 
 def get_whisper_model():
     """Lazy load the Whisper model."""
-    global _whisper_model
-    if _whisper_model is None:
-        logger.info("Loading Whisper 'base' model...")
-        _whisper_model = whisper.load_model("base")
-        logger.info("Whisper model loaded successfully.")
-    return _whisper_model
-
+    with model_registry.use("whisper") as model:
+        return model
 
 def transcribe_audio(file_path: str) -> str:
     """
@@ -41,8 +48,8 @@ def transcribe_audio(file_path: str) -> str:
         Transcribed text string.
     """
     try:
-        model = get_whisper_model()
-        result = model.transcribe(file_path)
+        with model_registry.use("whisper") as model:
+            result = model.transcribe(file_path)
         text = result.get("text", "").strip()
         logger.info(f"Transcription successful: '{text[:50]}...'")
         return text
@@ -0,0 +1,116 @@
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+from config.settings import settings
+from ai_engine import sentiment, embeddings
+from ai_engine.model_registry import model_registry
+from ai_engine.pinecone_client import pinecone_client
+from services import voice_service, local_tts_service
+from middleware.logger import logger
+
+# name -> (is_loaded, load). Models and clients are built lazily on first
+# use; warm-up just makes that first use happen in the background after
+# the server is already accepting requests.
+WARMUP_TARGETS: Dict[str, Tuple[Callable[[], bool], Callable[[], object]]] = {
+    "sentiment": (sentiment.is_loaded, sentiment.get_analyzer),
+    "embeddings": (embeddings.is_loaded, embeddings.get_model),
+    "whisper": (voice_service.is_loaded, voice_service.get_whisper_model),
+    "f5_tts": (local_tts_service.is_loaded, local_tts_service.get_f5_model),
+    "pinecone": (pinecone_client.is_connected, lambda: pinecone_client.index),
+}
+
+# Local models that can be loaded before forking. Pinecone is left out on
+# purpose: a client with open connections must not be shared across fork.
+_PRELOADABLE = ("sentiment", "embeddings", "whisper", "f5_tts")
+
+_state: Dict[str, Dict] = {}
+_state_lock = threading.Lock()
+_thread = None
+
+def warmup_targets() -> List[str]:
+    names = [name.strip() for name in settings.WARMUP_MODELS.split(",") if name.strip()]
+    unknown = [name for name in names if name not in WARMUP_TARGETS]
+    if unknown:
+        raise ValueError(f"WARMUP_MODELS has unknown entries {unknown}; expected any of {sorted(WARMUP_TARGETS)}")
+    return names
+
+def warm_up(names: List[str]):
+    """Load the given models one after another, recording time and errors."""
+    for name in names:
+        is_loaded, load = WARMUP_TARGETS[name]
+        if is_loaded():
+            continue
+        _set_state(name, status="loading")
+        start = time.perf_counter()
+        try:
+            load()
+            if not is_loaded():
+                raise RuntimeError("not available")
+        except Exception as e:
+            logger.error(f"Warm-up of {name} failed: {e}")
+            _set_state(name, status="failed", error=str(e), seconds=round(time.perf_counter() - start, 2))
+            continue
+        seconds = round(time.perf_counter() - start, 2)
+        _set_state(name, status="ready", seconds=seconds)
+        logger.info(f"Warmed up {name} in {seconds}s")
+
+def start_warmup():
+    """Warm up WARMUP_MODELS on a daemon thread; returns immediately."""
+    global _thread
+    names = warmup_targets()
+    if not names or (_thread is not None and _thread.is_alive()):
+        return
+    for name in names:
+        _set_state(name, status="pending")
+    _thread = threading.Thread(target=warm_up, args=(names,), name="model-warmup", daemon=True)
+    _thread.start()
+
+def preload_models() -> List[str]:
+    """
+    Load PRELOAD_MODELS in the current process and pin them in the model
+    registry. Meant for the gunicorn master before it forks workers (see
+    gunicorn.conf.py), so every worker shares the weights copy-on-write.
+    Only loads weights: no inference runs here, so no torch/OpenMP thread
+    pools exist yet when the master forks.
+    """
+    names = [name.strip() for name in settings.PRELOAD_MODELS.split(",") if name.strip()]
+    unknown = [name for name in names if name not in _PRELOADABLE]
+    if unknown:
+        raise ValueError(f"PRELOAD_MODELS has unknown entries {unknown}; expected any of {list(_PRELOADABLE)}")
+    for name in names:
+        start = time.perf_counter()
+        model_registry.pin(name)
+        _set_state(name, status="ready", seconds=round(time.perf_counter() - start, 2))
+    if names:
+        logger.info(f"Preloaded {', '.join(names)} ({model_registry.stats()['used_mb']} MB) before forking workers")
+    return names
+
+def readiness() -> Dict:
+    """
+    Which models are warm, with their size and load time from the model
+    registry. ready is True once every model in WARMUP_MODELS has loaded
+    (an idle model the registry has evicted since still counts); models
+    outside that list are reported but load on first use.
+    """
+    registry = model_registry.stats()
+    models = {}
+    for name, (is_loaded, _) in WARMUP_TARGETS.items():
+        with _state_lock:
+            state = dict(_state.get(name, {}))
+        if is_loaded():
+            state["status"] = "ready"
+        elif state.get("status") == "ready":
+            # Unloaded by the registry since; loads again on first use
+            state = {"status": "evicted"}
+        models[name] = {"loaded": is_loaded(), "status": state.pop("status", "cold"), **state,
+                        **registry["models"].get(name, {})}
+    return {
+        "ready": all(models[name]["status"] in ("ready", "evicted") for name in warmup_targets()),
+        "memory": {key: registry[key] for key in ("budget_mb", "used_mb", "budgeted_mb", "rss_mb")},
+        "models": models,
+    }
+
+def _set_state(name: str, **fields):
+    with _state_lock:
+        _state[name] = fields
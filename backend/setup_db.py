@@ -5,8 +5,7 @@ import os
 # Add the current directory to sys.path to make imports work
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from config.database import engine, Base
-from database import models # Import models to register them with Base
+from config.database import init_db as create_and_upgrade_tables
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,7 +14,7 @@ logger = logging.getLogger(__name__)
 def init_db():
     try:
         logger.info("Creating database tables...")
-        Base.metadata.create_all(bind=engine)
+        create_and_upgrade_tables()
         logger.info("Database tables created successfully!")
     except Exception as e:
         logger.error(f"Error creating database tables: {e}")
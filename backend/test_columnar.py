@@ -0,0 +1,61 @@
+import datetime
+
+from parsers.columnar import normalize_takeout_batch, normalize_custom_youtube_batch
+from utils.hash_utils import generate_content_hash
+
+TAKEOUT_TIMES = [
+    "2024-02-09T16:23:49.123Z",
+    "2024-02-09T16:23:49Z",
+    "2024-02-09T16:23:49.1Z",
+    "2024-02-09T16:23:49.123456789Z",
+    "2024-02-09T16:23:49.000Z",
+    "2024-02-09T16:23Z",
+    "2024-02-09Z",
+    "2024-02-09T16:23:49+01:00",
+    "garbage",
+]
+
+def _row_wise_date(date_str):
+    # How the row-wise parser read Takeout timestamps
+    try:
+        return datetime.datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+    except Exception:
+        return None
+
+def _takeout_entry(i, time):
+    return {"title": f"Watched Video {i}", "time": time, "titleUrl": "https://www.youtube.com/watch?v=abc",
+            "subtitles": [{"name": "Channel"}]}
+
+def _expected_hash(i, time):
+    return generate_content_hash(f"Video {i}", "Channel", str(_row_wise_date(time)))
+
+def test_takeout_hashes_match_row_wise_parser():
+    entries = [_takeout_entry(i, time) for i, time in enumerate(TAKEOUT_TIMES)]
+    columns = normalize_takeout_batch(entries)
+    assert list(columns.content_hash) == [_expected_hash(i, time) for i, time in enumerate(TAKEOUT_TIMES)]
+
+def test_takeout_hashes_do_not_depend_on_batch():
+    # A value numpy cannot parse sends the whole batch down the fallback path
+    for i, time in enumerate(TAKEOUT_TIMES):
+        columns = normalize_takeout_batch([_takeout_entry(i, time)])
+        assert columns.content_hash[0] == _expected_hash(i, time), time
+
+def test_takeout_dates_are_naive_utc():
+    columns = normalize_takeout_batch([_takeout_entry(0, "2024-02-09T16:23:49+01:00"),
+                                       _takeout_entry(1, "2024-02-09Z")])
+    assert list(columns.watch_date) == [datetime.datetime(2024, 2, 9, 15, 23, 49), datetime.datetime(2024, 2, 9)]
+
+def test_custom_hashes_match_row_wise_parser():
+    stamps = ["09/02/2026, 16:23:49", "31/02/2026, 16:23:49", "9/2/2026, 16:23:49", None]
+    entries = [{"title": f"t{i}", "author": "a", "timestamp": stamp} for i, stamp in enumerate(stamps)]
+
+    def row_wise(stamp):
+        try:
+            return datetime.datetime.strptime(stamp, "%d/%m/%Y, %H:%M:%S")
+        except Exception:
+            return None
+
+    columns = normalize_custom_youtube_batch(entries)
+    assert list(columns.content_hash) == [
+        generate_content_hash(f"t{i}", "a", str(row_wise(stamp))) for i, stamp in enumerate(stamps)
+    ]
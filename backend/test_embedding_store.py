@@ -0,0 +1,88 @@
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+from ai_engine.embedding_store import EmbeddingStore
+
+DIM = 8
+
+def _vectors(n, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+def test_add_get_and_missing(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "model", DIM)
+    vectors = _vectors(3)
+    assert store.add(["a", "b", "c"], vectors) == 3
+    # Known hashes are not appended again
+    assert store.add(["b", "d"], _vectors(2, seed=1)) == 1
+    assert len(store) == 4
+    np.testing.assert_array_equal(store.get(["c", "a"]), vectors[[2, 0]])
+    assert store.missing(["a", "x", "d", "y"]) == [1, 3]
+    with pytest.raises(KeyError):
+        store.get(["a", "x"])
+
+def test_reload_from_disk(tmp_path):
+    vectors = _vectors(2)
+    EmbeddingStore(str(tmp_path), "model", DIM).add(["a", "b"], vectors)
+    reopened = EmbeddingStore(str(tmp_path), "model", DIM)
+    np.testing.assert_array_equal(reopened.get(["b"]), vectors[[1]])
+
+def test_refresh_sees_other_writer(tmp_path):
+    reader = EmbeddingStore(str(tmp_path), "model", DIM)
+    EmbeddingStore(str(tmp_path), "model", DIM).add(["a"], _vectors(1))
+    assert reader.missing(["a"]) == [0]
+    reader.refresh()
+    assert reader.missing(["a"]) == []
+
+def test_add_appends_only_the_delta(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "model", DIM)
+    store.add([f"{i:064x}" for i in range(100)], _vectors(100))
+    ids_size = os.path.getsize(store.ids_path)
+    store.add([f"{i:064x}" for i in range(98, 102)], _vectors(4, seed=1))
+    assert os.path.getsize(store.ids_path) - ids_size == 2 * 65
+    assert os.path.getsize(store.vectors_path) == 102 * DIM * 4
+
+def test_torn_append_is_ignored_and_cut_off(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "model", DIM)
+    vectors = _vectors(3)
+    store.add(["a", "b"], vectors[:2])
+    # A crash after writing a vector and half of its hash
+    with open(store.vectors_path, "ab") as f:
+        f.write(vectors[2].tobytes())
+    with open(store.ids_path, "ab") as f:
+        f.write(b"c")
+    reopened = EmbeddingStore(str(tmp_path), "model", DIM)
+    assert len(reopened) == 2
+    assert reopened.add(["c"], vectors[2:]) == 1
+    np.testing.assert_array_equal(EmbeddingStore(str(tmp_path), "model", DIM).get(["c", "a"]), vectors[[2, 0]])
+
+def test_legacy_id_map_is_migrated(tmp_path):
+    vectors = _vectors(2)
+    vectors.tofile(tmp_path / "model.f32")
+    np.save(tmp_path / "model.ids.npy", np.array(["a", "b"], dtype="<U64"))
+    store = EmbeddingStore(str(tmp_path), "model", DIM)
+    np.testing.assert_array_equal(store.get(["b", "a"]), vectors[[1, 0]])
+    assert not (tmp_path / "model.ids.npy").exists()
+
+def _add_rows(directory, worker, rounds):
+    store = EmbeddingStore(directory, "model", DIM)
+    for i in range(rounds):
+        hashes = [f"p{worker}-{i}-{j}" for j in range(5)]
+        store.add(hashes, np.full((5, DIM), worker * 1000 + i, dtype=np.float32))
+
+def test_concurrent_processes_keep_every_row(tmp_path):
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_add_rows, args=(str(tmp_path), k, 40)) for k in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    store = EmbeddingStore(str(tmp_path), "model", DIM)
+    assert len(store) == 3 * 40 * 5
+    for k in range(3):
+        got = store.get([f"p{k}-{i}-0" for i in range(40)])
+        np.testing.assert_array_equal(got[:, 0], [k * 1000 + i for i in range(40)])
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+from database import crud
+from services import job_queue
+
+NOW = datetime(2024, 5, 1, 12, 0)
+
+def _job(status, started_at=None):
+    return SimpleNamespace(id=uuid4(), status=status, started_at=started_at)
+
+@pytest.fixture
+def state(monkeypatch):
+    state = SimpleNamespace(jobs=[], active_uploads=[], latest_upload=None)
+    monkeypatch.setattr(crud, "get_analysis_jobs_by_status",
+                        lambda db, statuses: [job for job in state.jobs if job.status in statuses])
+    monkeypatch.setattr(crud, "get_active_uploads", lambda db: state.active_uploads)
+    monkeypatch.setattr(crud, "get_latest_upload_metadata", lambda db: state.latest_upload)
+    return state
+
+def _upload(parsed_at):
+    return SimpleNamespace(parsed_at=parsed_at, uploaded_at=parsed_at - timedelta(minutes=5))
+
+def test_nothing_queued(state):
+    state.jobs = [_job("completed"), _job("failed")]
+    assert job_queue._find_equivalent_job(None) is None
+
+def test_pending_job_is_joined(state):
+    pending = _job("pending")
+    state.jobs = [pending, _job("in_progress", NOW)]
+    state.active_uploads = [object()]
+    assert job_queue._find_equivalent_job(None) == pending.id
+
+def test_running_job_on_current_data_is_joined(state):
+    running = _job("in_progress", NOW)
+    state.jobs = [running]
+    state.latest_upload = _upload(NOW - timedelta(minutes=1))
+    assert job_queue._find_equivalent_job(None) == running.id
+
+def test_running_job_on_stale_data_is_not_joined(state):
+    state.jobs = [_job("in_progress", NOW)]
+    state.latest_upload = _upload(NOW + timedelta(minutes=1))
+    assert job_queue._find_equivalent_job(None) is None
+
+def test_running_job_during_ingest_is_not_joined(state):
+    state.jobs = [_job("in_progress", NOW)]
+    state.latest_upload = _upload(NOW - timedelta(minutes=1))
+    state.active_uploads = [object()]
+    assert job_queue._find_equivalent_job(None) is None
+
+def test_running_job_without_uploads_is_joined(state):
+    running = _job("in_progress", NOW)
+    state.jobs = [running]
+    assert job_queue._find_equivalent_job(None) == running.id
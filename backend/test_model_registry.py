@@ -0,0 +1,83 @@
+import pytest
+
+from ai_engine import model_registry as registry_module
+from ai_engine.model_registry import ModelRegistry
+
+MB = 1024 ** 2
+
+class _Model:
+    def __init__(self, name):
+        self.name = name
+
+@pytest.fixture
+def registry(monkeypatch):
+    # Sizes come from the hints below, not from the RSS of this process
+    monkeypatch.setattr(registry_module, "_rss_bytes", lambda: 0)
+    registry = ModelRegistry(budget_bytes=250 * MB)
+    for name, size in (("a", 100), ("b", 100), ("c", 100)):
+        registry.register(name, lambda name=name: _Model(name), size_hint_mb=size)
+    return registry
+
+def _loaded(registry):
+    return {name for name, model in registry.stats()["models"].items() if model["loaded"]}
+
+def _set_size(registry, name, size_mb):
+    # Without a torch model the registry measures 0 bytes; fake the measurement
+    registry._entry(name).size_bytes = size_mb * MB
+
+def _load(registry, name):
+    with registry.use(name) as model:
+        _set_size(registry, name, 100)
+        return model
+
+def test_least_recently_used_idle_model_is_evicted(registry):
+    _load(registry, "a")
+    _load(registry, "b")
+    _load(registry, "a") # b is now the least recently used
+    _load(registry, "c")
+    assert _loaded(registry) == {"a", "c"}
+    assert registry.stats()["models"]["b"]["evictions"] == 1
+
+def test_models_in_use_are_not_evicted(registry):
+    held_a = registry.acquire("a")
+    _set_size(registry, "a", 100)
+    held_b = registry.acquire("b")
+    _set_size(registry, "b", 100)
+    _load(registry, "c") # over budget: a and b are both held
+    assert _loaded(registry) == {"a", "b", "c"}
+    assert registry.stats()["models"]["a"]["refcount"] == 1
+    assert not registry.unload("b")
+
+    registry.release("a")
+    registry.release("b")
+    assert registry.stats()["models"]["a"]["refcount"] == 0
+    assert registry.unload("b")
+    assert registry.acquire("a") is held_a
+    registry.release("a")
+    # b was unloaded once released, so the next user gets a fresh instance
+    assert registry.acquire("b") is not held_b
+    registry.release("b")
+
+def test_release_does_not_go_negative(registry):
+    _load(registry, "a")
+    registry.release("a")
+    assert registry.stats()["models"]["a"]["refcount"] == 0
+
+def test_pinned_models_are_kept_and_not_budgeted(registry):
+    registry.pin("a")
+    _set_size(registry, "a", 100)
+    _load(registry, "b")
+    _load(registry, "c")
+    # a is shared with the other workers, so only b and c count: both fit
+    assert _loaded(registry) == {"a", "b", "c"}
+    assert registry.budgeted_bytes() == 200 * MB
+    assert not registry.unload("a")
+
+def test_default_budget_is_split_across_workers(monkeypatch):
+    monkeypatch.setattr(registry_module.settings, "MODEL_MEMORY_BUDGET_MB", 0)
+    monkeypatch.setattr(registry_module.settings, "WEB_CONCURRENCY", 1)
+    single = registry_module._default_budget_bytes()
+    monkeypatch.setattr(registry_module.settings, "WEB_CONCURRENCY", 4)
+    assert registry_module._default_budget_bytes() == single // 4
+    monkeypatch.setattr(registry_module.settings, "MODEL_MEMORY_BUDGET_MB", 300)
+    assert registry_module._default_budget_bytes() == 300 * MB
@@ -0,0 +1,143 @@
+import multiprocessing
+
+import numpy as np
+
+from config.settings import settings
+from ai_engine.vector_index import LocalVectorIndex, LocalVectorBackend
+
+DIM = 16
+
+def _clustered(n, seed=0, topics=20):
+    structure = np.random.default_rng(123)
+    centres = structure.standard_normal((topics, DIM)).astype(np.float32)
+    rng = np.random.default_rng(seed)
+    return centres[rng.integers(0, topics, n)] + 0.1 * rng.standard_normal((n, DIM)).astype(np.float32)
+
+def _upsert(index, vectors, prefix="v", start=0):
+    result = index.upsert_vectors([(f"{prefix}{start + i}", v.tolist(), {"n": start + i}) for i, v in enumerate(vectors)])
+    assert result and result.upserted == len(vectors)
+
+def test_exact_query_and_metadata(tmp_path):
+    index = LocalVectorIndex(str(tmp_path), DIM)
+    vectors = _clustered(50)
+    _upsert(index, vectors)
+    matches = index.query(vectors[7].tolist(), top_k=3)
+    assert matches[0].id == "v7"
+    assert matches[0].metadata == {"n": 7}
+    assert abs(matches[0].score - 1.0) < 1e-5
+    assert [m.score for m in matches] == sorted((m.score for m in matches), reverse=True)
+
+def test_overwrite_known_id_and_reload(tmp_path):
+    index = LocalVectorIndex(str(tmp_path), DIM)
+    vectors = _clustered(20)
+    _upsert(index, vectors)
+    replacement = -vectors[0]
+    index.upsert_vectors([("v3", replacement.tolist(), {"n": "new"})])
+    assert len(index) == 20
+
+    reloaded = LocalVectorIndex(str(tmp_path), DIM)
+    assert len(reloaded) == 20
+    top = reloaded.query(replacement.tolist(), top_k=1)[0]
+    assert (top.id, top.metadata) == ("v3", {"n": "new"})
+
+def test_ivf_recall_against_exact(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_INDEX_EXACT_MAX", 500)
+    monkeypatch.setattr(settings, "VECTOR_INDEX_NPROBE", 8)
+    vectors = _clustered(3000)
+    index = LocalVectorIndex(str(tmp_path), DIM)
+    for start in range(0, len(vectors), 1000):
+        _upsert(index, vectors[start:start + 1000], start=start)
+    assert index._snapshot.centroids is not None
+
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = _clustered(50, seed=1)
+    hits = 0
+    for q in queries:
+        q = q / np.linalg.norm(q)
+        expected = {f"v{i}" for i in np.argsort(-(normalized @ q))[:10]}
+        hits += len(expected & {m.id for m in index.query(q.tolist(), top_k=10)})
+    assert hits / (10 * len(queries)) >= 0.8
+
+    # Reload keeps the trained IVF index
+    reloaded = LocalVectorIndex(str(tmp_path), DIM)
+    assert reloaded._snapshot.centroids is not None
+    assert reloaded.query(vectors[42].tolist(), top_k=1)[0].id == "v42"
+
+def test_ivf_upserts_after_training(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_INDEX_EXACT_MAX", 500)
+    monkeypatch.setattr(settings, "VECTOR_INDEX_NPROBE", 8)
+    vectors = _clustered(1200)
+    index = LocalVectorIndex(str(tmp_path), DIM)
+    _upsert(index, vectors[:1000])
+    _upsert(index, vectors[1000:1100], start=1000)
+    assert len(index._snapshot.tail_rows) == 100
+    # Overwriting a row that is in the list blocks must not return it twice
+    # or with its old vector
+    index.upsert_vectors([("v3", (-vectors[0]).tolist(), {"n": "new"})])
+    assert index._snapshot.listed_stale[3]
+    top = index.query((-vectors[0]).tolist(), top_k=3)
+    assert (top[0].id, top[0].metadata) == ("v3", {"n": "new"})
+    assert [m.id for m in top].count("v3") == 1
+    assert "v3" not in {m.id for m in index.query(vectors[3].tolist(), top_k=3)}
+    assert index.query(vectors[1050].tolist(), top_k=1)[0].id == "v1050"
+
+    # Another process's view catches up with the same result
+    other = LocalVectorIndex(str(tmp_path), DIM)
+    _upsert(index, vectors[1100:], start=1100)
+    index.upsert_vectors([("v5", (-vectors[1]).tolist(), {})])
+    assert other.query(vectors[1150].tolist(), top_k=1)[0].id == "v1150"
+    assert other.query((-vectors[1]).tolist(), top_k=1)[0].id == "v5"
+    assert len(other) == 1200
+
+def test_legacy_files_are_migrated(tmp_path):
+    vectors = _clustered(3)
+    (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32).tofile(tmp_path / "vectors.f32")
+    np.save(tmp_path / "ids.npy", np.array(["a", "b", "c"], dtype="<U64"))
+    index = LocalVectorIndex(str(tmp_path), DIM)
+    assert index.query(vectors[1].tolist(), top_k=1)[0].id == "b"
+    assert not (tmp_path / "ids.npy").exists()
+
+def test_backend_namespaces(tmp_path):
+    backend = LocalVectorBackend(str(tmp_path), DIM)
+    vectors = _clustered(10)
+    backend.upsert_vectors([("a", vectors[0].tolist(), {})], namespace="one")
+    backend.upsert_vectors([("b", vectors[1].tolist(), {})], namespace="two")
+    assert [m.id for m in backend.query(vectors[0].tolist(), top_k=5, namespace="one")] == ["a"]
+    assert backend.delete_namespace("one")
+    assert backend.query(vectors[0].tolist(), namespace="one") == []
+    assert backend.query(vectors[0].tolist(), namespace="missing") == []
+    assert [m.id for m in backend.query(vectors[1].tolist(), namespace="two")] == ["b"]
+
+def test_backend_default_namespace_is_the_legacy_index(tmp_path):
+    vectors = _clustered(10)
+    # Written before namespaces existed: straight into the directory
+    _upsert(LocalVectorIndex(str(tmp_path), DIM), vectors[:2])
+    backend = LocalVectorBackend(str(tmp_path), DIM)
+    backend.upsert_vectors([("n", vectors[5].tolist(), {})], namespace="upload-1")
+    assert backend.query(vectors[1].tolist(), top_k=1, namespace="")[0].id == "v1"
+    assert backend.query(vectors[1].tolist(), top_k=1)[0].id == "v1"
+    # Deleting it leaves the namespaces stored underneath alone
+    assert backend.delete_namespace("")
+    assert backend.query(vectors[1].tolist(), namespace="") == []
+    assert [m.id for m in backend.query(vectors[5].tolist(), namespace="upload-1")] == ["n"]
+
+def _upsert_rows(directory, worker, rounds):
+    index = LocalVectorIndex(directory, DIM)
+    for i in range(rounds):
+        vectors = _clustered(5, seed=worker * 1000 + i)
+        _upsert(index, vectors, prefix=f"w{worker}-", start=i * 5)
+
+def test_concurrent_processes_keep_every_row(tmp_path):
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_upsert_rows, args=(str(tmp_path), k, 30)) for k in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    index = LocalVectorIndex(str(tmp_path), DIM)
+    assert len(index) == 3 * 30 * 5
+    for k in range(3):
+        vector = _clustered(5, seed=k * 1000 + 29)[4]
+        assert index.query(vector.tolist(), top_k=1)[0].id == f"w{k}-149"
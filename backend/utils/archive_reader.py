@@ -0,0 +1,125 @@
+import io
+import zipfile
+from typing import BinaryIO, Dict, List, Optional
+
+from config.settings import settings
+
+
+class ArchiveLimitError(ValueError):
+    """Raised when an archive member decompresses past the configured limits."""
+    pass
+
+
+class _LimitedMemberStream(io.RawIOBase):
+    """
+    Raw stream over a zip member that counts decompressed bytes as they are
+    read and aborts once the per-member or whole-archive budget is exceeded.
+    Declared sizes in the central directory can lie, so this is the check
+    that actually protects us from zip bombs.
+    """
+
+    def __init__(self, archive: "ZipArchiveReader", name: str, raw: BinaryIO):
+        self._archive = archive
+        self._name = name
+        self._raw = raw
+        self._read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._raw.read(len(buffer))
+        n = len(data)
+        self._read += n
+        self._archive._account(self._name, self._read)
+        buffer[:n] = data
+        return n
+
+    def close(self):
+        try:
+            self._raw.close()
+        finally:
+            super().close()
+
+
+class ZipArchiveReader:
+    """
+    Read-only view over an uploaded zip archive.
+
+    The central directory is indexed once on open; members are then looked up
+    by name and streamed straight out of the archive, so nothing is ever
+    extracted to disk.
+    """
+
+    def __init__(self, zip_path: str,
+                 max_member_size: Optional[int] = None,
+                 max_total_size: Optional[int] = None):
+        self.zip_path = zip_path
+        self.max_member_size = max_member_size or settings.MAX_ARCHIVE_MEMBER_BYTES
+        self.max_total_size = max_total_size or settings.MAX_ARCHIVE_TOTAL_BYTES
+
+        self._zip = zipfile.ZipFile(zip_path, 'r')
+        self._members: Dict[str, zipfile.ZipInfo] = {}
+        self._by_basename: Dict[str, List[str]] = {}
+        self._dirs = set()
+        for info in self._zip.infolist():
+            parts = info.filename.rstrip("/").split("/")
+            self._dirs.update(parts[:-1])
+            if info.is_dir():
+                self._dirs.add(parts[-1])
+                continue
+            self._members[info.filename] = info
+            self._by_basename.setdefault(parts[-1], []).append(info.filename)
+
+        # Bytes streamed per member (max over re-opens) for the total budget
+        self._consumed: Dict[str, int] = {}
+        self._total_consumed = 0
+
+    def __enter__(self) -> "ZipArchiveReader":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._zip.close()
+
+    def names(self) -> List[str]:
+        return list(self._members)
+
+    def has_directory(self, dir_name: str) -> bool:
+        return dir_name in self._dirs
+
+    def find(self, basename: str) -> Optional[str]:
+        """Return the first member whose file name equals `basename`."""
+        matches = self._by_basename.get(basename)
+        return matches[0] if matches else None
+
+    def member_size(self, name: str) -> int:
+        return self._members[name].file_size
+
+    def open(self, name: str) -> BinaryIO:
+        """Open a member for streaming, enforcing decompressed-size limits."""
+        info = self._members.get(name)
+        if info is None:
+            raise KeyError(f"No member named {name!r} in archive")
+        if info.file_size > self.max_member_size:
+            raise ArchiveLimitError(
+                f"{name} declares {info.file_size} bytes, over the {self.max_member_size} byte limit"
+            )
+        raw = self._zip.open(info, 'r')
+        return io.BufferedReader(_LimitedMemberStream(self, name, raw), buffer_size=64 * 1024)
+
+    def _account(self, name: str, read_so_far: int):
+        if read_so_far > self.max_member_size:
+            raise ArchiveLimitError(
+                f"{name} exceeded the {self.max_member_size} byte decompressed size limit"
+            )
+        previous = self._consumed.get(name, 0)
+        if read_so_far > previous:
+            self._consumed[name] = read_so_far
+            self._total_consumed += read_so_far - previous
+            if self._total_consumed > self.max_total_size:
+                raise ArchiveLimitError(
+                    f"Archive exceeded the {self.max_total_size} byte decompressed size limit"
+                )
@@ -1,10 +1,20 @@
 import os
 import shutil
-import zipfile
 import json
 import uuid
 import tempfile
-from typing import List, Dict, Any
+from contextlib import contextmanager
+from typing import List, Dict, Any, BinaryIO, Callable, Iterator, Optional, Tuple
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, single process only
+    fcntl = None
 
 def save_temp_file(file_obj, filename: str) -> str:
     """
@@ -22,47 +32,126 @@ def save_temp_file(file_obj, filename: str) -> str:
         
     return file_path
 
-def extract_zip(zip_path: str) -> str:
-    """
-    Extract a zip file to a temporary directory.
-    Returns the path to the extracted directory.
-    """
-    extract_path = os.path.join(os.path.dirname(zip_path), f"extracted_{uuid.uuid4().hex}")
-    os.makedirs(extract_path, exist_ok=True)
-    
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_path)
-        
-    return extract_path
-
 def read_json_file(file_path: str) -> Dict[str, Any] | List[Any]:
     """Read and parse a JSON file."""
     with open(file_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
-def cleanup_temp_files(path: str):
+def peek_json_container(file_obj: BinaryIO) -> Optional[str]:
     """
-    Recursively invalidates and removes a file or directory.
+    Return 'list' or 'dict' depending on the top-level JSON container,
+    reading only up to the first non-whitespace byte of the stream.
     """
-    try:
-        if os.path.isfile(path):
-            os.remove(path)
-        elif os.path.isdir(path):
-            shutil.rmtree(path)
-    except Exception as e:
-        print(f"Error cleaning up temp files at {path}: {e}")
+    while True:
+        char = file_obj.read(1)
+        if not char:
+            return None
+        if char.isspace():
+            continue
+        if char == b'[':
+            return "list"
+        if char == b'{':
+            return "dict"
+        return None
 
-def detect_file_type(extracted_path: str) -> str:
+def iter_json_items(file_obj: BinaryIO, prefix: str = "item") -> Iterator[Any]:
     """
-    Detect the type of data based on directory structure.
+    Lazily yield the JSON values found under `prefix` (ijson prefix syntax,
+    e.g. 'item' for a top-level array or 'captions.item' for a nested one)
+    from a binary stream. Memory stays flat regardless of file size when
+    ijson is installed.
+    """
+    if ijson is None:
+        # Fallback: load the whole document and walk the prefix manually
+        data = json.load(file_obj)
+        for key in prefix.split(".")[:-1]:
+            data = data.get(key, []) if isinstance(data, dict) else []
+        if isinstance(data, list):
+            yield from data
+        return
+
+    yield from ijson.items(file_obj, prefix, use_float=True)
+
+def detect_file_type(archive) -> str:
+    """
+    Detect the type of data based on the archive's directory structure.
     Currently supports: 'youtube'
     """
     # Simple heuristic: Look for 'YouTube' folder or specific JSON names
-    for root, dirs, files in os.walk(extracted_path):
-        if "YouTube" in dirs: # Takeout structure often has a top-level YouTube folder
-             return "youtube"
-        if "watch-history.json" in files:
-            return "youtube"
-            
+    if archive.has_directory("YouTube"): # Takeout structure often has a top-level YouTube folder
+        return "youtube"
+    if archive.find("watch-history.json"):
+        return "youtube"
+
     # Default to YouTube for this MVP if strictly ambiguous but has JSONs
     return "youtube"
+
+@contextmanager
+def exclusive_file_lock(lock_path: str):
+    """
+    Hold an exclusive flock on `lock_path` (created if missing) for the
+    duration of the block. Serializes writers across processes (analysis
+    worker processes, gunicorn workers); pair with a threading.Lock for
+    threads of the same process.
+    """
+    with open(lock_path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def file_version(path: str) -> Optional[tuple]:
+    """
+    (inode, mtime, size) of `path`, None if it does not exist. Files that
+    are only ever replaced by rename change inode on every write, so this
+    tells another process's update apart even within one mtime tick.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+def write_atomic(path: str, write: Callable[[BinaryIO], None]):
+    """
+    Write a file through `write(f)` into a uniquely named temp file in the
+    same directory, then rename it over `path`.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def read_log_lines(path: str, offset: int = 0) -> Tuple[List[str], int]:
+    """
+    Complete lines of an append-only text log from byte `offset` on.
+    Returns (lines, offset just past the last complete line); a torn last
+    line from an interrupted append is left for the next writer to cut off.
+    """
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], 0
+    end = data.rfind(b"\n") + 1
+    return data[:end].decode("utf-8").splitlines(), offset + end
+
+def append_log_lines(path: str, lines: List[str], offset: int) -> int:
+    """
+    Append `lines` to a text log whose committed content ends at `offset`,
+    dropping anything past it first. Returns the new end offset.
+    """
+    data = "".join(line + "\n" for line in lines).encode("utf-8")
+    with open(path, "ab") as f:
+        f.truncate(offset)
+        f.write(data)
+    return offset + len(data)
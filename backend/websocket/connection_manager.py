@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import WebSocket
 from typing import List
 from middleware.logger import logger
@@ -36,4 +37,15 @@ class ConnectionManager:
         for conn in to_remove:
             self.disconnect(conn)
 
+    def broadcast_threadsafe(self, message: WSMessage, loop: asyncio.AbstractEventLoop):
+        """Schedule a broadcast on `loop` from a worker thread (fire-and-forget)."""
+        if loop.is_closed():
+            return
+        coro = self.broadcast(message)
+        try:
+            asyncio.run_coroutine_threadsafe(coro, loop)
+        except RuntimeError as e:
+            coro.close()
+            logger.warning(f"Could not schedule WS broadcast: {e}")
+
 manager = ConnectionManager()
@@ -6,6 +6,7 @@ UPLOAD_STARTED = "upload_started"
 UPLOAD_PROGRESS = "upload_progress"
 UPLOAD_COMPLETE = "upload_complete"
 PARSING_PROGRESS = "parsing_progress"
+UPLOAD_FAILED = "upload_failed"
 
 ANALYSIS_STARTED = "analysis_started"
 ANALYSIS_PROGRESS = "analysis_progress"
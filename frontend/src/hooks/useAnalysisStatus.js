@@ -18,6 +18,18 @@ export const useAnalysisStatus = () => {
                 setStatus('uploading');
                 setStatusMessage('Upload started...');
                 break;
+            case 'upload_progress':
+                setStatus('uploading');
+                setStatusMessage(message || 'Processing upload...');
+                break;
+            case 'parsing_progress':
+                setStatus('uploading');
+                setStatusMessage(`Parsed ${data?.total_found ?? 0} entries...`);
+                break;
+            case 'upload_failed':
+                setStatus('failed');
+                setStatusMessage(message || 'Upload failed.');
+                break;
             case 'upload_complete':
                 setStatus('analyzing_pending'); // Ready to analyze
                 setStatusMessage('Upload complete. Ready to analyze.');
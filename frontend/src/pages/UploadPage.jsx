@@ -10,6 +10,8 @@ const UploadPage = () => {
     const [glitchState, setGlitchState] = useState(false);
     const [transitioning, setTransitioning] = useState(false);
     const [binaryText, setBinaryText] = useState("");
+    // 'replace' starts over with this file; 'incremental' adds its new posts to the existing ones
+    const [uploadMode, setUploadMode] = useState('replace');
     const fileInputRef = useRef(null);
 
     // Glitch Effect Loop
@@ -53,13 +55,17 @@ const UploadPage = () => {
     const handleUpload = async (file) => {
         setIsUploading(true);
         try {
-            const response = await uploadService.uploadFile(file);
+            const response = await uploadService.uploadFile(file, undefined, uploadMode);
             if (response.success) {
+                await uploadService.waitForCompletion(response.data.upload_id);
                 // Fade out transition
                 setTimeout(() => navigate('/analysis'), 500);
             }
         } catch (error) {
-            setUploadError('Upload failed. Connection severed.');
+            // Rejected uploads carry the server's reason; failed ingests (size
+            // limits, unreadable archives) throw the status error_message
+            const reason = error.response?.data?.detail || (!error.isAxiosError && error.message);
+            setUploadError(reason ? `Upload failed. ${reason}` : 'Upload failed. Connection severed.');
             setTransitioning(false); // Reset on error
             setBinaryText("");
         } finally {
@@ -128,6 +134,28 @@ const UploadPage = () => {
                     />
                 </div>
 
+                {/* Upload Mode */}
+                <div className="mt-8 flex items-center gap-6 text-xs font-light tracking-widest uppercase">
+                    {[['replace', 'Replace'], ['incremental', 'Append']].map(([mode, label]) => (
+                        <button
+                            key={mode}
+                            type="button"
+                            onClick={() => setUploadMode(mode)}
+                            disabled={isUploading || transitioning}
+                            className={`pb-1 border-b transition-colors duration-300 ${uploadMode === mode
+                                ? 'text-white border-white/60'
+                                : 'text-neutral-500 border-transparent hover:text-neutral-300'}`}
+                        >
+                            {label}
+                        </button>
+                    ))}
+                </div>
+                <p className="mt-3 text-xs font-light tracking-wider text-neutral-500">
+                    {uploadMode === 'replace'
+                        ? 'Replaces everything uploaded before'
+                        : 'Adds new history to what is already uploaded'}
+                </p>
+
                 {/* Error Message */}
                 {uploadError && (
                     <p className="mt-8 text-red-500 font-mono text-sm tracking-widest animate-pulse">
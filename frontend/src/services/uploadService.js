@@ -2,9 +2,10 @@ import apiClient from './apiClient';
 import { ENDPOINTS } from '../config/api';
 
 export const uploadService = {
-    uploadFile: async (file, onProgress) => {
+    uploadFile: async (file, onProgress, mode = 'replace') => {
         const formData = new FormData();
         formData.append('file', file);
+        formData.append('mode', mode); // 'replace' or 'incremental'
 
         const response = await apiClient.post(ENDPOINTS.UPLOAD, formData, {
             headers: {
@@ -18,5 +19,20 @@ export const uploadService = {
             },
         });
         return response.data;
+    },
+
+    getStatus: async (uploadId) => {
+        const response = await apiClient.get(`${ENDPOINTS.UPLOAD}/${uploadId}`);
+        return response.data;
+    },
+
+    // Ingest runs in the background; poll until it finishes
+    waitForCompletion: async (uploadId, intervalMs = 1000) => {
+        while (true) {
+            const status = await uploadService.getStatus(uploadId);
+            if (status.status === 'completed') return status;
+            if (status.status === 'failed') throw new Error(status.error_message || 'Upload processing failed');
+            await new Promise((resolve) => setTimeout(resolve, intervalMs));
+        }
     }
 };